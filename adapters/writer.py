@@ -4,11 +4,13 @@ import time
 from datetime import datetime, timezone
 try:
     from common.logger import get_logger
+    from common.zstd_frames import ZST_SUFFIX, ZstdFrameWriter
 except Exception:
-    import os
     import sys
-    sys.path.append(os.getcwd())
+    # running as a script: make the repo root (parent of adapters/) importable
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
     from common.logger import get_logger  # type: ignore
+    from common.zstd_frames import ZST_SUFFIX, ZstdFrameWriter  # type: ignore
 
 logger = get_logger(__name__)
 
@@ -16,6 +18,14 @@ logger = get_logger(__name__)
 def write_jsonl(output_path, records_iter):
     out = Path(output_path)
     out.parent.mkdir(parents=True, exist_ok=True)
+    if out.name.endswith(ZST_SUFFIX):
+        # *.jsonl.zst: independent zstd frames + .idx sidecar (see common/zstd_frames.py)
+        with ZstdFrameWriter(out) as f:
+            for rec in records_iter:
+                if "ts" not in rec:
+                    rec["ts"] = datetime.now(timezone.utc).isoformat()
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+        return
     with out.open("a", encoding="utf-8") as f:
         for rec in records_iter:
             if "ts" not in rec:
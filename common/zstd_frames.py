@@ -0,0 +1,209 @@
+"""Seekable, zstd-compressed JSONL hot files.
+
+A ``*.jsonl.zst`` file is a concatenation of independent zstd frames, each
+holding whole lines (about ``frame_bytes`` of uncompressed JSONL). A sidecar
+``*.jsonl.zst.idx`` has one JSON line per frame::
+
+    {"offset": 0, "length": 81234, "lines": 4120, "min_ts": "...", "max_ts": "..."}
+
+(``min_ts``/``max_ts`` as UTC ISO strings; naive ``ts`` values are taken as UTC)
+
+so readers can skip frames outside a time range without decompressing them.
+Any zstd tool can still decompress the whole file (``zstd -dc``).
+"""
+import io
+import json
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Optional dependency: zstandard
+try:
+    import zstandard  # type: ignore
+    HAS_ZSTD = True
+except Exception:
+    HAS_ZSTD = False
+
+ZST_SUFFIX = ".zst"
+INDEX_SUFFIX = ".idx"
+_TS_RE = re.compile(rb'"ts"\s*:\s*"([^"]+)"')
+
+
+def _require_zstd():
+    if not HAS_ZSTD:
+        raise RuntimeError("zstandard is required for *.jsonl.zst hot files (pip install zstandard)")
+
+
+def index_path(path) -> Path:
+    p = Path(path)
+    return p.with_name(p.name + INDEX_SUFFIX)
+
+
+def _parse_ts(s):
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _utc_iso(dt) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class ZstdFrameWriter:
+    """Append-only file object that emits one independent zstd frame per ~``frame_bytes``.
+
+    ``write()`` buffers; a frame (and its index entry) is written once the
+    buffer reaches ``frame_bytes``, on ``flush()`` and on ``close()``. Only
+    whole lines are ever placed in a frame, so callers must write complete
+    lines. ``flush()`` is the commit point of the hot writer: everything
+    written so far is then in a complete, indexed frame (readable by the
+    batcher, and durable after an fsync of ``fileno()``); frames are
+    therefore at most ``frame_bytes`` and at least one group commit.
+    With ``fsync=True`` the last frame is fsynced on ``close()``.
+    """
+
+    def __init__(self, path, frame_bytes: int = 1 << 20, level: int = 3, fsync: bool = False):
+        _require_zstd()
+        self.path = Path(path)
+        self.frame_bytes = max(1, int(frame_bytes))
+        self.fsync = fsync
+        self._cctx = zstandard.ZstdCompressor(level=level)
+        self._fh = self.path.open("ab")
+        self._idx = index_path(self.path).open("a", encoding="utf-8")
+        self._buf = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        if len(self._buf) >= self.frame_bytes:
+            self._cut_frame()
+        return len(data)
+
+    def flush(self):
+        if self._buf:
+            self._cut_frame()
+        self._fh.flush()
+        self._idx.flush()
+        if self.fsync:
+            os.fsync(self._idx.fileno())  # the caller fsyncs the data file (fileno())
+
+    def fileno(self) -> int:
+        return self._fh.fileno()
+
+    def close(self):
+        if self._buf:
+            self._cut_frame()
+        if self.fsync:
+            self.flush()
+            os.fsync(self._fh.fileno())
+        self._fh.close()
+        self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _cut_frame(self):
+        raw = bytes(self._buf)
+        self._buf = bytearray()
+        frame = self._cctx.compress(raw)
+        offset = self._fh.seek(0, os.SEEK_END)
+        self._fh.write(frame)
+        # compared as instants, not strings: offsets and fractional seconds do not sort byte-wise
+        ts = [dt for dt in (_parse_ts(t.decode("utf-8", "replace")) for t in _TS_RE.findall(raw)) if dt is not None]
+        entry = {
+            "offset": offset,
+            "length": len(frame),
+            "lines": raw.count(b"\n"),
+            "min_ts": _utc_iso(min(ts)) if ts else None,
+            "max_ts": _utc_iso(max(ts)) if ts else None,
+        }
+        self._idx.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def read_index(path) -> list:
+    """Frame entries from the sidecar index, or ``[]`` when there is none."""
+    ip = index_path(path)
+    if not ip.exists():
+        return []
+    out = []
+    with ip.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line))
+    return out
+
+
+def _frame_in_range(entry: dict, start, end) -> bool:
+    lo, hi = _parse_ts(entry.get("min_ts")), _parse_ts(entry.get("max_ts"))
+    if lo is None or hi is None:
+        return True
+    if start is not None and hi < start:
+        return False
+    if end is not None and lo > end:
+        return False
+    return True
+
+
+def iter_zst_lines(path, start=None, end=None):
+    """Yield decoded text lines from a ``*.jsonl.zst`` file.
+
+    With ``start``/``end`` (aware datetimes or ISO strings) and an index,
+    frames entirely outside the range are skipped unread. Pruning is per
+    frame, so lines just outside the range may still be yielded.
+    """
+    _require_zstd()
+    if isinstance(start, str):
+        start = _parse_ts(start)
+    if isinstance(end, str):
+        end = _parse_ts(end)
+    dctx = zstandard.ZstdDecompressor()
+    entries = read_index(path) if (start is not None or end is not None) else []
+    with Path(path).open("rb") as f:
+        if not entries:
+            reader = dctx.stream_reader(f, read_across_frames=True)
+            yield from io.TextIOWrapper(reader, encoding="utf-8")
+            return
+        indexed_end = 0
+        for e in entries:
+            indexed_end = max(indexed_end, e["offset"] + e["length"])
+            if not _frame_in_range(e, start, end):
+                continue
+            f.seek(e["offset"])
+            raw = dctx.decompress(f.read(e["length"]))
+            for line in io.BytesIO(raw):
+                yield line.decode("utf-8")
+        # frames appended after the index was last written (should not happen, but never lose data)
+        f.seek(indexed_end)
+        reader = dctx.stream_reader(f, read_across_frames=True)
+        yield from io.TextIOWrapper(reader, encoding="utf-8")
+
+
+def iter_frames_from(path, offset: int = 0, end: int = None):
+    """Yield ``(frame_end_offset, raw_bytes)`` for indexed frames starting in ``[offset, end)``.
+
+    Only frames with an index entry are returned: the entry is written after
+    its frame, so a frame still being written is never read half-way.
+    """
+    _require_zstd()
+    dctx = zstandard.ZstdDecompressor()
+    with Path(path).open("rb") as f:
+        for e in read_index(path):
+            if e["offset"] < offset or (end is not None and e["offset"] >= end):
+                continue
+            f.seek(e["offset"])
+            yield e["offset"] + e["length"], dctx.decompress(f.read(e["length"]))
+
+
+def iter_text_lines(path, start=None, end=None):
+    """Yield text lines from a plain ``*.jsonl`` or a framed ``*.jsonl.zst`` file."""
+    if str(path).endswith(ZST_SUFFIX):
+        yield from iter_zst_lines(path, start=start, end=end)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from f
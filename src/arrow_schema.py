@@ -0,0 +1,161 @@
+# src/arrow_schema.py
+import datetime
+import functools
+import json
+import pathlib
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+_AVRO_PRIMITIVES = {
+    "string": pa.string(),
+    "long": pa.int64(),
+    "int": pa.int32(),
+    "double": pa.float64(),
+    "float": pa.float32(),
+    "boolean": pa.bool_(),
+    "bytes": pa.binary(),
+}
+_AVRO_LOGICAL = {
+    "timestamp-millis": pa.timestamp("ms", tz="UTC"),
+    "timestamp-micros": pa.timestamp("us", tz="UTC"),
+}
+_JSON_TYPES = {
+    "string": pa.string(),
+    "number": pa.float64(),
+    "integer": pa.int64(),
+    "boolean": pa.bool_(),
+}
+
+def _avro_type(t):
+    if isinstance(t, list):  # union: ["null", X] -> nullable X
+        branches = [b for b in t if b != "null"]
+        if len(branches) != 1:
+            raise ValueError(f"unsupported Avro union {t!r}")
+        return _avro_type(branches[0])
+    if isinstance(t, dict):
+        if t.get("logicalType") in _AVRO_LOGICAL:
+            return _AVRO_LOGICAL[t["logicalType"]]
+        if t.get("type") == "enum":
+            return _DICT
+        return _avro_type(t["type"])
+    if t not in _AVRO_PRIMITIVES:
+        raise ValueError(f"unsupported Avro type {t!r}")
+    return _AVRO_PRIMITIVES[t]
+
+def avro_to_arrow(doc: dict, dictionary=()) -> pa.Schema:
+    """Arrow schema for an Avro record; enums and ``dictionary`` columns are dictionary-encoded."""
+    fields = []
+    for f in doc["fields"]:
+        t = _avro_type(f["type"])
+        fields.append(pa.field(f["name"], _DICT if f["name"] in dictionary and t == pa.string() else t))
+    return pa.schema(fields)
+
+def json_schema_to_arrow(doc: dict, dictionary=()) -> pa.Schema:
+    """Arrow schema for a flat JSON Schema object.
+
+    ``format: date-time`` strings become ``timestamp[ms, UTC]`` (as in the Avro
+    twin); enums and ``dictionary`` columns are dictionary-encoded.
+    """
+    fields = []
+    for name, prop in doc.get("properties", {}).items():
+        ptype = prop.get("type")
+        if isinstance(ptype, list):  # ["string", "null"]
+            ptype = next(p for p in ptype if p != "null")
+        if ptype == "string" and prop.get("format") == "date-time":
+            t = pa.timestamp("ms", tz="UTC")
+        elif ptype == "string" and ("enum" in prop or name in dictionary):
+            t = _DICT
+        elif ptype in _JSON_TYPES:
+            t = _JSON_TYPES[ptype]
+        else:
+            raise ValueError(f"unsupported JSON Schema type {ptype!r} for {name!r}")
+        fields.append(pa.field(name, t))
+    return pa.schema(fields)
+
+@functools.lru_cache(maxsize=None)
+def load_arrow_schema(path: str, dictionary: tuple = ()) -> pa.Schema:
+    """Load ``*.avsc`` or ``*.schema.json`` as an Arrow schema (cached per process)."""
+    doc = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    if str(path).endswith(".avsc"):
+        return avro_to_arrow(doc, dictionary)
+    return json_schema_to_arrow(doc, dictionary)
+
+def json_read_schema(schema: pa.Schema) -> pa.Schema:
+    """Explicit schema for Arrow's JSON reader: declared scalar types, with
+    timestamps and dictionaries read as strings and cast afterwards."""
+    return pa.schema([
+        pa.field(f.name, pa.string() if pa.types.is_timestamp(f.type) or pa.types.is_dictionary(f.type) else f.type)
+        for f in schema
+    ])
+
+def _parse_ts(v):
+    if isinstance(v, datetime.datetime):
+        dt = v
+    else:
+        try:
+            dt = datetime.datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
+
+def _coerce_scalar(v, t: pa.DataType):
+    if v is None:
+        return None
+    if pa.types.is_timestamp(t):
+        return _parse_ts(v)
+    try:
+        return pa.scalar(v).cast(t.value_type if pa.types.is_dictionary(t) else t).as_py()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+
+def cast_column(col, t: pa.DataType):
+    """Vectorized cast; values that cannot be converted become null (per-value path)."""
+    try:
+        if pa.types.is_timestamp(t) and (pa.types.is_string(col.type) or pa.types.is_timestamp(col.type)):
+            # parse at full precision, then truncate to the declared unit
+            if pa.types.is_string(col.type):
+                col = pc.cast(col, pa.timestamp("ns", tz="UTC"))
+            return pc.cast(col, t, safe=False)
+        return pc.cast(col, t)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        values = [_coerce_scalar(v, t) for v in col.to_pylist()]
+        return pc.cast(pa.array(values, t.value_type if pa.types.is_dictionary(t) else t), t)
+
+_WARNED_MISSING = set()
+
+def conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Cast ``table`` to the declared ``schema``.
+
+    Declared columns come first, in schema order, with missing ones as nulls
+    (warned about once per process and column: usually a schema mapped to
+    the wrong stream); undeclared columns are kept as inferred after them.
+    """
+    cols, fields = [], []
+    for f in schema:
+        if f.name in table.column_names:
+            col = table[f.name]
+            cols.append(col if col.type == f.type else cast_column(col, f.type))
+        else:
+            key = (tuple(schema.names), f.name)
+            if table.num_rows and key not in _WARNED_MISSING:
+                _WARNED_MISSING.add(key)
+                print(f"[schema] WARNING declared column {f.name!r} is missing from the input; written as nulls")
+            cols.append(pa.nulls(table.num_rows, f.type))
+        fields.append(pa.field(f.name, f.type))
+    for name in table.column_names:
+        if schema.get_field_index(name) < 0:
+            cols.append(table[name])
+            fields.append(table.schema.field(name))
+    return pa.Table.from_arrays(cols, schema=pa.schema(fields))
+
+def type_runs(rows: list):
+    """Split ``rows`` (dicts) into consecutive runs without conflicting value types per key."""
+    runs, types, cur = [], {}, []
+    for rec in rows:
+        if any(v is not None and types.setdefault(k, type(v)) is not type(v) for k, v in rec.items()):
+            runs.append(cur)
+            cur, types = [], {k: type(v) for k, v in rec.items() if v is not None}
+        cur.append(rec)
+    return runs + [cur]
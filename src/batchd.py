@@ -0,0 +1,145 @@
+# src/batchd.py
+import datetime
+import pathlib
+import signal
+import threading
+import time
+import zoneinfo
+import yaml
+from .batcher import run_batcher
+
+# Optional dependency: inotify_simple (Linux); without it the hot dir is polled
+try:
+    import inotify_simple  # type: ignore
+    HAS_INOTIFY = True
+except Exception:
+    HAS_INOTIFY = False
+
+FREQUENCIES = ("hourly", "daily", "manual")
+HOT_SUFFIXES = (".jsonl", ".zst", ".pbr")
+
+def next_run(now: datetime.datetime, frequency: str, tz, grace: datetime.timedelta):
+    """Next scheduled run after ``now`` (aware): the next hour or local midnight plus
+    ``grace`` for late records; ``None`` for ``manual``."""
+    local = now.astimezone(tz)
+    if frequency == "hourly":
+        base, step = local.replace(minute=0, second=0, microsecond=0), datetime.timedelta(hours=1)
+    elif frequency == "daily":
+        base, step = local.replace(hour=0, minute=0, second=0, microsecond=0), datetime.timedelta(days=1)
+    else:
+        return None
+    due = base + grace
+    return due if due > local else base + step + grace
+
+def completed_until(now: datetime.datetime) -> datetime.datetime:
+    """Start of the current UTC hour: everything stamped before it belongs to a complete hour."""
+    return now.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+class _HotDirWatcher:
+    """Wake-ups for closed or rotated hot files.
+
+    With inotify, ``CLOSE_WRITE``/``MOVED_TO`` on a hot file (the collector
+    closes a file when it rotates or evicts it) counts as an event;
+    partition directories created later are watched too. Without it,
+    the hot dir is listed every ``poll_s`` and a new hot file (a rotation)
+    counts as an event.
+    """
+
+    def __init__(self, hot_dir: pathlib.Path, poll_s: float = 30):
+        self.hot_dir = hot_dir
+        self.poll_s = float(poll_s)
+        self._inotify = None
+        self._dirs = {}
+        self._known = set() if HAS_INOTIFY else self._listing()
+        self._next_poll = time.monotonic() + self.poll_s
+        if HAS_INOTIFY:
+            self._inotify = inotify_simple.INotify()
+            for d in [hot_dir, *(p for p in hot_dir.rglob("*") if p.is_dir())]:
+                self._watch(d)
+
+    def _watch(self, d: pathlib.Path):
+        f = inotify_simple.flags
+        wd = self._inotify.add_watch(d, f.CLOSE_WRITE | f.MOVED_TO | f.CREATE)
+        self._dirs[wd] = d
+
+    def _listing(self) -> set:
+        return {p for p in self.hot_dir.rglob("*") if p.name.endswith(HOT_SUFFIXES)}
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to ``timeout`` seconds; True if a hot file was closed or rotated."""
+        if self._inotify is None:
+            time.sleep(max(0.0, timeout))
+            if time.monotonic() < self._next_poll:
+                return False
+            self._next_poll = time.monotonic() + self.poll_s
+            known, self._known = self._known, self._listing()
+            return bool(self._known - known)
+        hit = False
+        f = inotify_simple.flags
+        for ev in self._inotify.read(timeout=int(max(0.0, timeout) * 1000)):
+            path = self._dirs.get(ev.wd, self.hot_dir) / ev.name
+            if ev.mask & f.ISDIR:
+                if ev.mask & f.CREATE:
+                    self._watch(path)
+            elif ev.mask & (f.CLOSE_WRITE | f.MOVED_TO) and ev.name.endswith(HOT_SUFFIXES):
+                hit = True
+        return hit
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+def run_batchd(config_path: str, jobs: int = None):
+    """Resident batcher: run ``batch`` on the ``batch.frequency`` cadence and when hot files close.
+
+    Runs once at start to catch up, then at every hour (``hourly``) or local
+    midnight in ``batch.timezone`` (``daily``), ``batch.grace_s`` after the
+    boundary, and ``batch.debounce_s`` after a hot file was closed or rotated
+    (inotify when ``inotify_simple`` is installed, else polling every
+    ``batch.poll_s``). ``manual`` only runs on such events or on SIGHUP.
+    Each run batches rows stamped before the current UTC hour only; the
+    incremental checkpoints mean data already batched is never read again.
+    SIGTERM/SIGINT stop the daemon after the current run.
+    """
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    bc = cfg.get("batch", {}) or {}
+    frequency = bc.get("frequency", "hourly")
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"batch.frequency must be one of {FREQUENCIES}, got {frequency!r}")
+    tz = zoneinfo.ZoneInfo(bc.get("timezone", "UTC"))
+    grace = datetime.timedelta(seconds=float(bc.get("grace_s", 60)))
+    debounce = float(bc.get("debounce_s", 30))
+    hot_dir = pathlib.Path(cfg["storage"]["hot_dir"])
+    hot_dir.mkdir(parents=True, exist_ok=True)
+
+    stop = threading.Event()
+    wake = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGHUP, lambda signum, frame: wake.set())
+
+    watcher = _HotDirWatcher(hot_dir, poll_s=bc.get("poll_s", 30))
+    print(f"[batchd] {frequency} in {tz.key}, watching {hot_dir} ({'inotify' if HAS_INOTIFY else 'polling'})")
+    try:
+        while not stop.is_set():
+            wake.clear()
+            now = datetime.datetime.now(datetime.timezone.utc)
+            until = completed_until(now)
+            print("[batchd] batching rows before", until.isoformat())
+            try:
+                run_batcher(config_path, jobs=jobs, until=until)
+            except Exception as e:  # keep the daemon alive; the next run retries from the checkpoints
+                print("[batchd] ERROR:", e)
+
+            due = next_run(datetime.datetime.now(datetime.timezone.utc), frequency, tz, grace)
+            while not stop.is_set() and not wake.is_set():
+                remaining = 1.0 if due is None else (due - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                if remaining <= 0:
+                    break
+                if watcher.wait(min(remaining, 1.0)):
+                    stop.wait(debounce)  # let the writer finish closing/rotating its other files
+                    break
+    finally:
+        watcher.close()
+    print("[batchd] stopped")
@@ -1,64 +1,591 @@
 # src/batcher.py
+import concurrent.futures
 import pathlib
 import json
 import datetime
+import io
+import os
 import re
-import pandas as pd
+import resource
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
 import pyarrow.parquet as pq
 import yaml
+from common.zstd_frames import iter_frames_from, iter_text_lines, read_index
+from .arrow_schema import conform_table, json_read_schema, load_arrow_schema, type_runs
+from .catalog import epoch_ms, refresh_catalog
+from .checkpoints import CheckpointStore, batches_lock
+from .pbstream import encode_delimited, read_delimited, temperature_table
+from .rollups import DEFAULT_DEVICE_KEYS, DEFAULT_METRICS, write_rollups
 
-# Matches telemetry.YYYY-MM-DD.jsonl
-PATTERN = re.compile(r"^(?P<prefix>\w+)\.(?P<date>\d{4}-\d{2}-\d{2})\.jsonl$")
+# Matches telemetry.YYYY-MM-DD.jsonl, collector worker shards telemetry.YYYY-MM-DD.wN.jsonl
+# and the zstd-framed variants (*.jsonl.zst)
+PATTERN = re.compile(r"^(?P<stem>(?P<prefix>\w+)\.(?P<date>\d{4}-\d{2}-\d{2})(?:\.w(?P<shard>\d+))?)\.jsonl(?:\.zst)?$")
 
-def _iter_jsonl(path: pathlib.Path):
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if not s:
-                continue
-            try:
-                yield json.loads(s)
-            except Exception:
-                continue
+# Length-delimited TemperatureReading streams: telemetry.YYYY-MM-DD[.wN].pbr
+PBR_PATTERN = re.compile(r"^(?P<stem>(?P<prefix>\w+)\.(?P<date>\d{4}-\d{2}-\d{2})(?:\.w(?P<shard>\d+))?)\.pbr$")
+
+_TS_RE = re.compile(rb'"ts"\s*:\s*"([^"]+)"')
+
+# Arrow JSON reader block; a single line longer than this falls back to the per-line parser
+_JSON_BLOCK_BYTES = 16 << 20
+
+def _iter_jsonl(path: pathlib.Path, start=None, end=None):
+    """Yield records from a hot file; for *.jsonl.zst, frames outside [start, end] are skipped."""
+    for line in iter_text_lines(path, start=start, end=end):
+        s = line.strip()
+        if not s:
+            continue
+        try:
+            yield json.loads(s)
+        except Exception:
+            continue
 
 def _ts_to_parts(ts_iso: str):
     try:
         dt = datetime.datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(datetime.timezone.utc)
     except Exception:
         dt = datetime.datetime.utcnow()
     return dt.strftime("%Y-%m-%d"), dt.strftime("%H")
 
-def run_batcher(config_path: str):
+def _part_name(stem: str, inode: int, offset: int, seq: int = 0) -> str:
+    # one part file per (hot file incarnation, task start offset, file of the hour within
+    # the task): reruns after a crash rewrite the same names instead of duplicating rows
+    return f"{stem}.{inode:x}-{offset:012d}{f'-{seq}' if seq else ''}.parquet"
+
+def _conform(table: pa.Table, schema: pa.Schema):
+    """``table`` cast to ``schema`` (missing columns as nulls), or ``None`` if it does not fit."""
+    try:
+        if not pa.unify_schemas([schema, table.schema]).equals(schema):
+            return None
+        cols = [table[f.name] if f.name in table.column_names else pa.nulls(table.num_rows, f.type) for f in schema]
+        return pa.Table.from_arrays(cols, schema=schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+
+class _HourParts:
+    """Open ``ParquetWriter`` per hour partition of one batch task, fed in bounded row groups.
+
+    Slices added for an hour are buffered until it has ``row_group_rows`` rows,
+    or until all buffers together exceed ``buffer_bytes`` (then every hour is
+    flushed), and are written as one row group to that hour's ``*.inprogress``
+    file. ``close()`` finishes the files and renames them into place. Files
+    are named after the task's start offset; if the schema drifts, the next
+    file of that hour gets a sequence suffix (``-1``, ``-2``, ...), so every
+    file of a task has its own, deterministic name.
+    With ``rollups`` (``{"batches_dir", "dir", "metrics", "device_keys"}``) each finished file
+    is also rolled up (``src/rollups.py``).
+    """
+
+    def __init__(self, out_root: pathlib.Path, stem: str, inode: int, start: int,
+                 row_group_rows: int = 100000, buffer_bytes: int = 64 << 20, compression: str = "zstd",
+                 rollups: dict = None):
+        self.out_root = out_root
+        self.stem = stem
+        self.inode = inode
+        self.start = start
+        self.row_group_rows = max(1, int(row_group_rows))
+        self.buffer_bytes = max(1, int(buffer_bytes))
+        self.compression = compression
+        self.rollups = rollups
+        self._bufs = {}   # (date, hour) -> [tables, rows]
+        self._files = {}  # (date, hour) -> [writer, tmp_path, final_path]
+        self._opened = {}  # (date, hour) -> files opened so far
+        self._buffered = 0
+        self.rows = 0
+
+    def add(self, d: str, h: str, table: pa.Table):
+        buf = self._bufs.get((d, h))
+        if buf is not None:
+            try:
+                pa.unify_schemas([t.schema for t in buf[0]] + [table.schema], promote_options="permissive")
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                self._flush((d, h))  # conflicting types cannot share a row group
+        buf = self._bufs.setdefault((d, h), [[], 0])
+        buf[0].append(table)
+        buf[1] += table.num_rows
+        self._buffered += table.nbytes
+        if buf[1] >= self.row_group_rows:
+            self._flush((d, h))
+        if self._buffered > self.buffer_bytes:
+            for key in list(self._bufs):
+                self._flush(key)
+
+    def close(self) -> int:
+        for key in list(self._bufs):
+            self._flush(key)
+        for key in list(self._files):
+            self._finish(key)
+        return self.rows
+
+    def _flush(self, key):
+        tables, rows = self._bufs.pop(key)
+        self._buffered -= sum(t.nbytes for t in tables)
+        table = pa.concat_tables(tables, promote_options="permissive")
+        f = self._files.get(key)
+        if f is not None:
+            fitted = _conform(table, f[0].schema)
+            if fitted is None:
+                # schema drift: finish this file and continue in a new one
+                self._finish(key)
+                f = None
+            else:
+                table = fitted
+        if f is None:
+            d, h = key
+            seq = self._opened.get(key, 0)
+            final = self.out_root / f"date={d}" / f"hour={h}" / _part_name(self.stem, self.inode, self.start, seq)
+            final.parent.mkdir(parents=True, exist_ok=True)
+            tmp = final.with_name(final.name + ".inprogress")
+            f = self._files[key] = [pq.ParquetWriter(tmp, table.schema, compression=self.compression), tmp, final]
+            self._opened[key] = seq + 1
+        f[0].write_table(table, row_group_size=table.num_rows)
+        self.rows += rows
+
+    def _finish(self, key):
+        writer, tmp, final = self._files.pop(key)
+        writer.close()
+        os.replace(tmp, final)
+        print("[batcher] wrote", final)
+        if self.rollups:
+            write_rollups(final, self.rollups["batches_dir"], self.rollups["dir"], self.rollups["metrics"],
+                          self.rollups["device_keys"])
+
+def _complete_end(path: pathlib.Path, start: int) -> int:
+    """Offset just past the last newline at or after ``start`` (``start`` if there is none)."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > start:
+            lo = max(start, pos - 65536)
+            f.seek(lo)
+            i = f.read(pos - lo).rfind(b"\n")
+            if i >= 0:
+                return lo + i + 1
+            pos = lo
+    return start
+
+def _line_before(line: bytes, until_ms: int) -> bool:
+    m = _TS_RE.search(line)
+    ts = epoch_ms(m.group(1).decode("utf-8", "replace")) if m else None
+    return ts is None or ts < until_ms
+
+def _cut_before(path: pathlib.Path, start: int, end: int, until_ms: int) -> int:
+    """End of the last line in ``[start, end)`` stamped before ``until_ms`` (or without a ts).
+
+    The lines after it (the hour still being filled) are left for a later run.
+    Only the tail is read: the window grows backwards from ``end`` until it
+    holds such a line.
+    """
+    window = 1 << 16
+    with path.open("rb") as f:
+        while True:
+            lo = max(start, end - window)
+            f.seek(lo)
+            buf = f.read(end - lo)
+            base = lo
+            if lo > start:  # drop the partial first line
+                nl = buf.find(b"\n")
+                base, buf = (lo + nl + 1, buf[nl + 1:]) if nl >= 0 else (end, b"")
+            cut, pos = None, base
+            for line in buf.splitlines(keepends=True):
+                pos += len(line)
+                if _line_before(line, until_ms):
+                    cut = pos
+            if cut is not None:
+                return cut
+            if lo == start:
+                return start
+            window *= 2
+
+def _chunk_ranges(path: pathlib.Path, start: int, chunk_bytes: int, until_ms: int = None):
+    """Split the complete data appended since ``start`` into ``(start, end)`` byte ranges.
+
+    Plain files are cut at the first newline after every ``chunk_bytes``; *.jsonl.zst
+    files at indexed frame boundaries. Boundaries depend only on ``start`` and the
+    file content, so a rerun over a grown file reproduces the earlier chunks.
+    With ``until_ms`` the data ends before the trailing lines (or, for *.jsonl.zst,
+    the first frame) stamped at or after it.
+    """
+    ranges = []
+    if path.name.endswith(".zst"):
+        lo = hi = None
+        for e in read_index(path):
+            if e["offset"] < start:
+                continue
+            if until_ms is not None and (epoch_ms(e.get("max_ts")) or 0) >= until_ms:
+                break
+            if lo is None:
+                lo = e["offset"]
+            hi = e["offset"] + e["length"]
+            if hi - lo >= chunk_bytes:
+                ranges.append((lo, hi))
+                lo = None
+        if lo is not None:
+            ranges.append((lo, hi))
+        return ranges
+    end = _complete_end(path, start)
+    if until_ms is not None and end > start:
+        end = _cut_before(path, start, end, until_ms)
+    lo = start
+    with path.open("rb") as f:
+        while end - lo > chunk_bytes:
+            f.seek(lo + chunk_bytes)
+            hi = lo + chunk_bytes + len(f.readline())
+            if hi >= end:
+                break
+            ranges.append((lo, hi))
+            lo = hi
+    if lo < end:
+        ranges.append((lo, end))
+    return ranges
+
+def _iter_blocks(path: pathlib.Path, start: int, end: int, block_bytes: int):
+    """Yield ``(offset, jsonl_bytes)`` blocks of about ``block_bytes`` covering ``[start, end)``.
+
+    Plain blocks end on a newline (a longer line makes its block longer);
+    *.jsonl.zst blocks are whole decompressed frames.
+    """
+    if path.name.endswith(".zst"):
+        first, raws, size, prev = None, [], 0, start
+        for off_end, raw in iter_frames_from(path, start, end):
+            first = prev if first is None else first
+            prev = off_end
+            raws.append(raw)
+            size += len(raw)
+            if size >= block_bytes:
+                yield first, b"".join(raws)
+                first, raws, size = None, [], 0
+        if raws:
+            yield first, b"".join(raws)
+        return
+    with path.open("rb") as f:
+        pos = start
+        while pos < end:
+            f.seek(pos)
+            data = f.read(min(block_bytes, end - pos))
+            if pos + len(data) < end:
+                cut = data.rfind(b"\n") + 1
+                data = data[:cut] if cut else data + f.readline()
+            yield pos, data
+            pos += len(data)
+
+def _hour_keys(ts: pa.Array, date: str) -> pa.Array:
+    """``YYYY-MM-DDTHH`` (UTC) per row; rows without a timestamp go to ``{date}T00``."""
+    keys = pc.strftime(ts, format="%Y-%m-%dT%H")
+    return pc.fill_null(keys, f"{date}T00")
+
+def _split_by_hour(table: pa.Table, keys: pa.Array):
+    """Yield ``(date, hour, table)`` per hour key with one stable sort and zero-copy slices."""
+    order = pc.sort_indices(keys)
+    table, keys = table.take(order), keys.take(order)
+    pos = 0
+    for item in pc.value_counts(keys):  # first-seen order == sorted order here
+        key, n = item["values"].as_py(), item["counts"].as_py()
+        d, h = key.split("T")
+        yield d, h, table.slice(pos, n)
+        pos += n
+
+def _parse_jsonl_arrow(data: bytes, schema: pa.Schema = None):
+    """Bulk-parse JSONL with Arrow's reader; ``None`` if the block needs the per-line path.
+
+    ``ts`` is read as a string and parsed separately as a UTC timestamp; with
+    a declared ``schema`` its scalar columns are read with their types instead
+    of being inferred. A malformed line, a line larger than the read block, a
+    value not matching the declared type or an unparsable/naive ``ts`` sends
+    the whole block to the tolerant per-line path.
+    """
+    read_schema = json_read_schema(schema) if schema is not None else pa.schema([])
+    if read_schema.get_field_index("ts") < 0:
+        read_schema = read_schema.append(pa.field("ts", pa.string()))
+    try:
+        table = pa_json.read_json(
+            io.BytesIO(data),
+            read_options=pa_json.ReadOptions(block_size=_JSON_BLOCK_BYTES),
+            parse_options=pa_json.ParseOptions(explicit_schema=read_schema, unexpected_field_behavior="infer"),
+        )
+        ts = pc.cast(table["ts"], pa.timestamp("us", tz="UTC"))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError):
+        return None
+    return table, ts
+
+def _parse_jsonl_rows(data: bytes, date: str) -> list:
+    """Per-line fallback: skips malformed lines; naive timestamps are taken as UTC.
+
+    Returns ``[(table, hour_keys), ...]``: one segment normally, several when a
+    column changes type within the block (each then fits its own schema).
+    """
+    rows, keys = [], []
+    for line in data.split(b"\n"):
+        s = line.strip()
+        if not s:
+            continue
+        try:
+            rec = json.loads(s)
+        except Exception:
+            continue
+        ts = rec.get("ts")
+        d, h = _ts_to_parts(ts) if ts else (date, "00")
+        rows.append(rec)
+        keys.append(f"{d}T{h}")
+    try:
+        return [(pa.Table.from_pylist(rows), pa.array(keys, pa.string()))]
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    out, pos = [], 0
+    for run in type_runs(rows):
+        out.append((pa.Table.from_pylist(run), pa.array(keys[pos:pos + len(run)], pa.string())))
+        pos += len(run)
+    return out
+
+def _parse_block(data: bytes, date: str, schema: pa.Schema = None) -> list:
+    """``[(table, hour_keys), ...]`` for a JSONL block: Arrow bulk parse, else per line.
+
+    With a declared ``schema`` every table is cast to it.
+    """
+    parsed = _parse_jsonl_arrow(data, schema)
+    if parsed is None:
+        segments = _parse_jsonl_rows(data, date)
+    else:
+        table, ts = parsed
+        if schema is not None and schema.get_field_index("ts") >= 0 and pa.types.is_timestamp(schema.field("ts").type):
+            table = table.set_column(table.schema.get_field_index("ts"), "ts", ts)  # already parsed: no second cast
+        segments = [(table, _hour_keys(ts, date))]
+    if schema is not None:
+        segments = [(conform_table(table, schema), keys) for table, keys in segments]
+    return segments
+
+def _load_schema(spec):
+    """Declared schema for a ``(path, dictionary_columns)`` spec, or ``None`` to infer."""
+    return load_arrow_schema(spec[0], tuple(spec[1])) if spec else None
+
+def _batch_jsonl(jfile: pathlib.Path, stem: str, date: str, start: int, end: int, inode: int,
+                 out_root: pathlib.Path, limits: dict, schema_spec=None):
+    schema = _load_schema(schema_spec)
+    parts = _HourParts(out_root, stem, inode, start, limits["row_group_rows"], limits["buffer_bytes"],
+                       rollups=limits.get("rollups"))
+    for _, data in _iter_blocks(jfile, start, end, limits["read_block_bytes"]):
+        for table, keys in _parse_block(data, date, schema):
+            for d, h, part in _split_by_hour(table, keys):
+                parts.add(d, h, part)
+    return end, parts.close()
+
+def _batch_pbr(pfile: pathlib.Path, stem: str, date: str, start: int, end, inode: int,
+               out_root: pathlib.Path, limits: dict, schema_spec=None):
+    """Decode new protobuf frames straight into Arrow columns and split them by hour.
+
+    Frame boundaries are only known by scanning, so a .pbr file is one task and
+    ``end`` is where the last complete frame stops, or with ``limits["until_ms"]``
+    the first frame stamped at or after it.
+    """
+    schema = _load_schema(schema_spec)
+    # .pbr in the name keeps it distinct from the same day's JSONL output
+    parts = _HourParts(out_root, stem + ".pbr", inode, start, limits["row_group_rows"], limits["buffer_bytes"],
+                       rollups=limits.get("rollups"))
+    pos = start
+    invalid = 0
+    while True:
+        frames, nxt = read_delimited(pfile, pos, max_bytes=limits["read_block_bytes"])
+        if nxt == pos:
+            break
+        bad = []
+        table = temperature_table(frames, bad)
+        until_ms = limits.get("until_ms")
+        if until_ms is not None:
+            late = pc.index(pc.greater_equal(table["ts"], pa.scalar(until_ms, table["ts"].type)), True).as_py()
+            if late >= 0:
+                skipped = set(bad)
+                first_late = [i for i in range(len(frames)) if i not in skipped][late]  # row -> frame
+                table = table.slice(0, late)
+                nxt = pos + sum(len(encode_delimited(fr)) for fr in frames[:first_late])
+                bad = [i for i in bad if i < first_late]
+        invalid += len(bad)
+        keys = _hour_keys(table["ts"], date)
+        if schema is not None:
+            table = conform_table(table, schema)
+        for d, h, part in _split_by_hour(table, keys):
+            parts.add(d, h, part)
+        if table.num_rows < len(frames) - len(bad):
+            pos = nxt
+            break
+        pos = nxt
+    if invalid:
+        print(f"[batcher] {pfile.name}: skipped {invalid} undecodable frame(s)")
+    return pos, parts.close()
+
+def _run_task(task):
+    """Process-pool entry point: ``(rel, fn_name, args) -> (rel, end, rows)``."""
+    rel, fn_name, args = task
+    end, rows = _BATCH_FNS[fn_name](*args)
+    return rel, end, rows
+
+_BATCH_FNS = {"jsonl": _batch_jsonl, "pbr": _batch_pbr}
+
+def _schema_path(schemas: dict, part_dir: pathlib.Path, prefix: str):
+    """Schema file for a hot file: by its ``topic=`` partition value, else by file prefix."""
+    for seg in part_dir.parts:
+        if seg.startswith("topic=") and seg[len("topic="):] in schemas:
+            return schemas[seg[len("topic="):]]
+    return schemas.get(prefix)
+
+def _drop_legacy_outputs(out_root: pathlib.Path, stem: str):
+    # outputs of the former full-rewrite batcher ({stem}.parquet) would duplicate the
+    # part files of a first incremental pass from offset 0
+    for old in list(out_root.glob(f"date=*/hour=*/{stem}.parquet")) + list(out_root.glob(f"date=*/hour=*/{stem}.pbr.parquet")):
+        old.unlink()
+        print("[batcher] removed legacy", old)
+
+def run_batcher(config_path: str, jobs: int = None, until=None):
+    """Incrementally convert hot files into ``date=/hour=`` Parquet part files.
+
+    A checkpoint per hot file (inode + byte offset, ``{batches_dir}/_checkpoints.json``)
+    records how far it has been batched. Each run only parses the complete
+    lines/frames appended since then and adds new part files to the affected
+    hour partitions; nothing already written is rewritten. Files that have not
+    grown are skipped after a ``stat()``. The catalog (``src/catalog.py``) is
+    refreshed at the end of every run.
+
+    New data is split into tasks per file and per ``batch.chunk_bytes`` chunk;
+    with ``jobs`` > 1 (default ``batch.jobs``) they run in a process pool. Each
+    chunk writes its own part file named after its start offset, so the output
+    is the same for any number of jobs, and a file's checkpoint only advances
+    once all of its chunks are written.
+
+    ``batch.schemas`` maps a hot file's ``topic=`` partition or file prefix to
+    a declared schema (``*.avsc`` or ``*.schema.json``); its output columns are
+    cast to it, with ``batch.dictionary_columns`` dictionary-encoded. Files
+    without a schema keep inferred types.
+
+    With ``until`` (an aware datetime or ISO string) rows stamped at or after
+    it are left in the hot files for a later run (``batchd`` passes the start
+    of the current hour so only completed hours are batched).
+
+    With ``batch.rollups.enabled`` every new part file is also aggregated per
+    device and minute/hour into ``batch.rollups.dir`` (see ``src/rollups.py``);
+    the device is the first ``batch.rollups.device_key`` column present
+    (default ``device_id``, then ``source``).
+    """
     with open(config_path, "r") as f:
         cfg = yaml.safe_load(f)
+    bc = cfg.get("batch", {}) or {}
+    jobs = max(1, int(jobs or bc.get("jobs", 1)))
+    chunk_bytes = max(1, int(bc.get("chunk_bytes", 64 << 20)))
+    limits = {
+        "read_block_bytes": max(1, int(bc.get("read_block_bytes", 8 << 20))),
+        "row_group_rows": int(bc.get("row_group_rows", 100000)),
+        "buffer_bytes": int(bc.get("buffer_bytes", 64 << 20)),
+        "until_ms": epoch_ms(until),
+    }
+
+    schemas = bc.get("schemas") or {}
+    dictionary = list(bc.get("dictionary_columns") or [])
+    for path in schemas.values():
+        if path:
+            load_arrow_schema(path, tuple(dictionary))  # fail early on a bad schema file
 
     hot_dir = pathlib.Path(cfg["storage"]["hot_dir"])
     batches_dir = pathlib.Path(cfg["storage"]["batches_dir"])
     batches_dir.mkdir(parents=True, exist_ok=True)
+    rc = bc.get("rollups") or {}
+    if rc.get("enabled"):
+        device_key = rc.get("device_key") or DEFAULT_DEVICE_KEYS
+        limits["rollups"] = {
+            "batches_dir": batches_dir,
+            "dir": pathlib.Path(rc.get("dir", "data/rollups")),
+            "metrics": tuple(rc.get("metrics") or DEFAULT_METRICS),
+            "device_keys": (device_key,) if isinstance(device_key, str) else tuple(device_key),
+        }
+    with batches_lock(batches_dir):
+        _run_batches(hot_dir, batches_dir, jobs, chunk_bytes, limits, schemas, dictionary)
+        refresh_catalog(batches_dir)
+
+def _run_batches(hot_dir, batches_dir, jobs, chunk_bytes, limits, schemas, dictionary):
+    store = CheckpointStore(batches_dir / "_checkpoints.json")
 
-    files = list(hot_dir.glob("*.jsonl"))
+    # hot files may sit in site=/device=/topic=/ partitions (collector.partitioning);
+    # their relative directory is kept above date=/hour= in the batch layout
+    files = list(hot_dir.rglob("*.jsonl")) + list(hot_dir.rglob("*.jsonl.zst")) + list(hot_dir.rglob("*.pbr"))
     if not files:
-        print("[batcher] no JSONL files found in", hot_dir)
+        print("[batcher] no JSONL/PBR files found in", hot_dir)
         return
 
-    for jfile in files:
-        m = PATTERN.match(jfile.name)
+    tasks, pending = [], {}
+    skipped = 0
+    for hfile in sorted(files):
+        is_pbr = hfile.suffix == ".pbr"
+        m = (PBR_PATTERN if is_pbr else PATTERN).match(hfile.name)
         if not m:
             continue
+        rel = str(hfile.relative_to(hot_dir))
+        st = hfile.stat()
+        start = store.offset_for(rel, st.st_ino, st.st_size)
+        ranges = [(start, None)] if is_pbr else _chunk_ranges(hfile, start, chunk_bytes, limits["until_ms"])
+        if start >= st.st_size or not ranges:
+            skipped += 1  # unchanged, or only an incomplete trailing line/frame so far
+            continue
+
+        out_root = batches_dir / hfile.parent.relative_to(hot_dir)
+        schema_path = _schema_path(schemas, hfile.parent.relative_to(hot_dir), m.group("prefix"))
+        schema_spec = (schema_path, dictionary) if schema_path else None
+        if rel not in store:
+            _drop_legacy_outputs(out_root, m.group("stem"))
+        print("[batcher] processing", rel, f"from byte {start} in {len(ranges)} chunk(s)")
+        pending[rel] = {"inode": st.st_ino, "start": start, "end": start, "left": len(ranges)}
+        for lo, hi in ranges:
+            args = (hfile, m.group("stem"), m.group("date"), lo, hi, st.st_ino, out_root, limits, schema_spec)
+            tasks.append((rel, "pbr" if is_pbr else "jsonl", args))
+
+    processed = rows = failed = 0
+
+    def done(rel, end, n):
+        nonlocal processed, skipped, rows
+        p = pending[rel]
+        p["end"] = max(p["end"], end)
+        p["left"] -= 1
+        rows += n
+        if p["left"] or p.get("error"):
+            return
+        if p["end"] == p["start"]:
+            skipped += 1
+            return
+        store.update(rel, p["inode"], p["end"])
+        store.save()  # after the parts are in place: a crash in between only redoes this file
+        processed += 1
+
+    def fail(rel, e):
+        # the file keeps its checkpoint and is retried on the next run; its part files are
+        # named by start offset, so chunks already written are simply rewritten then (the
+        # compactor leaves parts at or beyond a file's checkpoint alone until that happens)
+        nonlocal failed
+        p = pending[rel]
+        p["left"] -= 1
+        if not p.get("error"):
+            failed += 1
+            p["error"] = e
+            print("[batcher] ERROR processing", rel, f"{type(e).__name__}: {e}")
+
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                result = _run_task(task)
+            except Exception as e:
+                fail(task[0], e)
+                continue
+            done(*result)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            futures = {pool.submit(_run_task, t): t[0] for t in tasks}
+            for fut in concurrent.futures.as_completed(futures):
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    fail(futures[fut], e)
+                    continue
+                done(*result)
 
-        print("[batcher] processing", jfile.name)
-        buckets = {}
-        for rec in _iter_jsonl(jfile):
-            ts = rec.get("ts")
-            d, h = _ts_to_parts(ts) if ts else (m.group("date"), "00")
-            buckets.setdefault((d, h), []).append(rec)
-
-        for (d, h), rows in buckets.items():
-            df = pd.DataFrame(rows)
-            part_dir = batches_dir / f"date={d}" / f"hour={h}"
-            part_dir.mkdir(parents=True, exist_ok=True)
-            out = part_dir / (jfile.stem + ".parquet")
-            table = pa.Table.from_pandas(df, preserve_index=False)
-            pq.write_table(table, out)
-            print("[batcher] wrote", out)
+    peak_mb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024  # ru_maxrss is in KiB on Linux
+    print(f"[batcher] done: {processed} files processed, {skipped} unchanged, {failed} failed, {rows} rows, "
+          f"peak RSS {peak_mb:.0f} MB")
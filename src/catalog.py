@@ -0,0 +1,155 @@
+# src/catalog.py
+import datetime
+import pathlib
+import re
+import sqlite3
+import pyarrow.parquet as pq
+
+CATALOG = "_catalog.sqlite"
+
+_HOUR_DIR = re.compile(r"date=(\d{4}-\d{2}-\d{2})/hour=(\d{2})")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,     -- relative to batches_dir
+    partition TEXT NOT NULL,   -- relative directory, e.g. date=2025-08-19/hour=04
+    prefix TEXT NOT NULL,      -- stream: telemetry, decisions, ...
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    min_ts INTEGER,            -- epoch ms (UTC)
+    max_ts INTEGER,
+    min_device TEXT,
+    max_device TEXT
+);
+CREATE INDEX IF NOT EXISTS files_ts ON files (min_ts, max_ts);
+CREATE INDEX IF NOT EXISTS files_partition ON files (partition);
+"""
+
+def epoch_ms(v):
+    """Epoch milliseconds for an aware/naive (UTC) datetime or ISO string; ``None`` if unparsable."""
+    if v is None:
+        return None
+    if isinstance(v, str):
+        try:
+            v = datetime.datetime.fromisoformat(v.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(v, datetime.datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=datetime.timezone.utc)
+        return int(v.timestamp() * 1000)
+    return None
+
+def _column_range(meta, name: str):
+    """(min, max) of a column over all row groups from footer statistics, or (None, None)."""
+    try:
+        idx = meta.schema.names.index(name)
+    except ValueError:
+        return None, None
+    lo = hi = None
+    for i in range(meta.num_row_groups):
+        st = meta.row_group(i).column(idx).statistics
+        if st is None or not st.has_min_max:
+            return None, None  # one group without stats: the range is unknown
+        lo = st.min if lo is None else min(lo, st.min)
+        hi = st.max if hi is None else max(hi, st.max)
+    return lo, hi
+
+def _hour_bounds(partition: str):
+    m = _HOUR_DIR.search(partition)
+    if not m:
+        return None, None
+    start = datetime.datetime.strptime(f"{m.group(1)} {m.group(2)}", "%Y-%m-%d %H").replace(tzinfo=datetime.timezone.utc)
+    lo = int(start.timestamp() * 1000)
+    return lo, lo + 3600 * 1000 - 1
+
+class Catalog:
+    """SQLite index of the Parquet files in ``batches_dir`` (``{batches_dir}/_catalog.sqlite``).
+
+    One row per file with its partition, row count and min/max ``ts`` (epoch
+    ms) and ``device_id`` taken from the footer once, when the file is first
+    seen. Without ``ts`` statistics the partition's hour bounds are used.
+    Writers call ``refresh()`` after changing files; readers use ``files()``
+    to prune by time range and device without listing directories or
+    opening footers.
+    """
+
+    def __init__(self, batches_dir, readonly: bool = False):
+        self.root = pathlib.Path(batches_dir)
+        path = self.root / CATALOG
+        if readonly:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            self.db = sqlite3.connect(path)
+            self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self):
+        """Index new or changed files and forget deleted ones; returns ``(indexed, removed)``."""
+        known = {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT path, size, mtime_ns FROM files")}
+        seen, indexed = set(), 0
+        with self.db:
+            for p in self.root.rglob("*.parquet"):
+                rel = p.relative_to(self.root).as_posix()
+                st = p.stat()
+                seen.add(rel)
+                if known.get(rel) == (st.st_size, st.st_mtime_ns):
+                    continue
+                self.db.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)",
+                                self._describe(p, rel, st))
+                indexed += 1
+            gone = [(rel,) for rel in known if rel not in seen]
+            self.db.executemany("DELETE FROM files WHERE path = ?", gone)
+        return indexed, len(gone)
+
+    def _describe(self, p: pathlib.Path, rel: str, st):
+        meta = pq.ParquetFile(p).metadata
+        partition = p.parent.relative_to(self.root).as_posix()
+        ts_lo, ts_hi = (epoch_ms(v) for v in _column_range(meta, "ts"))
+        if ts_lo is None or ts_hi is None:
+            ts_lo, ts_hi = _hour_bounds(partition)
+        dev_lo, dev_hi = _column_range(meta, "device_id")
+        if not isinstance(dev_lo, str) or not isinstance(dev_hi, str):
+            dev_lo = dev_hi = None
+        return (rel, partition, p.name.split(".", 1)[0], st.st_size, st.st_mtime_ns, meta.num_rows,
+                ts_lo, ts_hi, dev_lo, dev_hi)
+
+    def files(self, start=None, end=None, device_id=None, prefix: str = None) -> list:
+        """Paths of files that may hold rows with ``start <= ts <= end`` (aware datetimes
+        or ISO strings) and ``device_id``; files without the statistics are never pruned."""
+        sql, args = "SELECT path FROM files WHERE 1=1", []
+        if start is not None:
+            sql += " AND (max_ts IS NULL OR max_ts >= ?)"
+            args.append(epoch_ms(start))
+        if end is not None:
+            sql += " AND (min_ts IS NULL OR min_ts <= ?)"
+            args.append(epoch_ms(end))
+        if device_id is not None:
+            sql += " AND (min_device IS NULL OR (min_device <= ? AND max_device >= ?))"
+            args += [device_id, device_id]
+        if prefix is not None:
+            sql += " AND prefix = ?"
+            args.append(prefix)
+        return [self.root / row[0] for row in self.db.execute(sql + " ORDER BY path", args)]
+
+    def partitions(self) -> list:
+        """Per partition summary: files, rows and min/max ts/device_id."""
+        cur = self.db.execute(
+            "SELECT partition, COUNT(*), SUM(rows), MIN(min_ts), MAX(max_ts), MIN(min_device), MAX(max_device) "
+            "FROM files GROUP BY partition ORDER BY partition")
+        keys = ("partition", "files", "rows", "min_ts", "max_ts", "min_device_id", "max_device_id")
+        return [dict(zip(keys, row)) for row in cur]
+
+def refresh_catalog(batches_dir):
+    with Catalog(batches_dir) as cat:
+        indexed, removed = cat.refresh()
+    print(f"[catalog] {indexed} files indexed, {removed} removed")
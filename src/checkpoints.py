@@ -0,0 +1,56 @@
+# src/checkpoints.py
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+
+class CheckpointStore:
+    """Per hot file read position for the incremental batcher.
+
+    Stored as JSON ``{relative_path: {"inode": int, "offset": int}}``; saved
+    atomically (write + rename) so a crash leaves either the old or the new
+    checkpoint, never a torn one.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._data = {}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def __contains__(self, rel: str) -> bool:
+        return rel in self._data
+
+    def offset_for(self, rel: str, inode: int, size: int) -> int:
+        """Where to resume ``rel``: 0 if it was replaced (new inode) or truncated."""
+        cp = self._data.get(rel)
+        if not cp or cp.get("inode") != inode or cp.get("offset", 0) > size:
+            return 0
+        return int(cp["offset"])
+
+    def items(self):
+        """``(relative_path, {"inode", "offset"})`` of every checkpointed hot file."""
+        return self._data.items()
+
+    def update(self, rel: str, inode: int, offset: int):
+        self._data[rel] = {"inode": inode, "offset": offset}
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+@contextlib.contextmanager
+def batches_lock(batches_dir):
+    """Exclusive lock on ``batches_dir`` so batch and compaction runs never interleave."""
+    d = pathlib.Path(batches_dir)
+    d.mkdir(parents=True, exist_ok=True)
+    with (d / "_lock").open("a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
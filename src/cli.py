@@ -4,34 +4,86 @@ import json
 import sys
 from .collector import run_collector
 from .batcher import run_batcher
-from .decision_engine.engine import load_policy, decide
+from .batchd import run_batchd
+from .compactor import run_compactor
+from .query import FORMATS, run_query
+from .decision_engine.compiled import CompiledPolicy
 
 def cmd_decide(args):
-    policy = load_policy(args.policy)
+    policy = CompiledPolicy(args.policy, reload_s=0)
+    if args.jsonl:
+        # one policy parse for the whole stream, one decision per line
+        for line in sys.stdin:
+            if line.strip():
+                sys.stdout.write(json.dumps(policy.decide(json.loads(line)), separators=(",", ":")) + "\n")
+        return
     event = json.loads(args.event) if args.event else json.loads(sys.stdin.read())
-    res = decide(event, policy)
+    res = policy.decide(event)
     print(json.dumps(res, indent=2))
 
+def cmd_query(args):
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None
+    kwargs = dict(sql=args.sql, columns=columns, start=args.start, end=args.end, device_id=args.device,
+                  prefix=args.prefix or None, fmt=args.format, limit=args.limit)
+    if args.output:
+        with open(args.output, "wb") as out:
+            run_query(args.config, out=out, **kwargs)
+    else:
+        run_query(args.config, **kwargs)
+
 def main():
     p = argparse.ArgumentParser(description="Edge AI Data Collection CLI")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     pc = sub.add_parser("collect", help="Run MQTT -> JSONL collector")
     pc.add_argument("--config", required=True, help="Path to config.yaml")
+    pc.add_argument("--workers", type=int, default=1,
+                    help="Collector processes sharing the subscriptions via MQTT v5 $share (default: 1)")
 
     pb = sub.add_parser("batch", help="Convert JSONL -> Parquet")
     pb.add_argument("--config", required=True, help="Path to config.yaml")
+    pb.add_argument("--jobs", type=int, default=None,
+                    help="Parallel batch processes over files and chunks (default: batch.jobs or 1)")
+
+    pbd = sub.add_parser("batchd", help="Resident batcher: batch.frequency cadence + hot file close events")
+    pbd.add_argument("--config", required=True, help="Path to config.yaml")
+    pbd.add_argument("--jobs", type=int, default=None,
+                     help="Parallel batch processes over files and chunks (default: batch.jobs or 1)")
+
+    pk = sub.add_parser("compact", help="Merge small Parquet files per date=/hour= partition")
+    pk.add_argument("--config", required=True, help="Path to config.yaml")
+    pk.add_argument("--target-mb", type=float, default=None,
+                    help="Target output file size in MB (default: compact.target_file_mb or 128)")
+
+    pq_ = sub.add_parser("query", help="Query the Parquet batches with DuckDB (SQL or filters)")
+    pq_.add_argument("--config", required=True, help="Path to config.yaml")
+    pq_.add_argument("--sql", help="SQL over the view `batches` (filters below still prune files)")
+    pq_.add_argument("--device", help="device_id to select")
+    pq_.add_argument("--start", help="Inclusive ISO timestamp, e.g. 2025-08-19T04:00:00Z")
+    pq_.add_argument("--end", help="Exclusive ISO timestamp")
+    pq_.add_argument("--columns", help="Comma-separated columns to return (default: all)")
+    pq_.add_argument("--prefix", default="telemetry", help="Stream to query: file prefix (default: telemetry)")
+    pq_.add_argument("--limit", type=int, help="Maximum rows (filter form)")
+    pq_.add_argument("--format", choices=FORMATS, default="csv", help="Output format (default: csv)")
+    pq_.add_argument("--output", help="Write to this file instead of stdout")
 
     pd = sub.add_parser("decide", help="Run a single decision on an event JSON")
     pd.add_argument("--policy", required=True, help="Path to policies.yaml")
     pd.add_argument("--event", help='Inline JSON string (if not provided, read from stdin)')
+    pd.add_argument("--jsonl", action="store_true", help="Read JSONL events from stdin, write one decision per line")
 
     args = p.parse_args()
 
     if args.cmd == "collect":
-        run_collector(args.config)
+        run_collector(args.config, workers=args.workers)
     elif args.cmd == "batch":
-        run_batcher(args.config)
+        run_batcher(args.config, jobs=args.jobs)
+    elif args.cmd == "batchd":
+        run_batchd(args.config, jobs=args.jobs)
+    elif args.cmd == "compact":
+        run_compactor(args.config, target_mb=args.target_mb)
+    elif args.cmd == "query":
+        cmd_query(args)
     elif args.cmd == "decide":
         cmd_decide(args)
 
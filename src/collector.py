@@ -1,27 +1,373 @@
 # src/collector.py
+import functools
 import json
+import multiprocessing
 import pathlib
 import datetime
+import re
+import signal
+import threading
+import time
 import paho.mqtt.client as mqtt
 import yaml
+from common.zstd_frames import ZstdFrameWriter
+from .dedup import RecentIds, line_id
+from .hot_writer import HotFileWriter, HotWriterPool
+from .ingest_queue import IngestQueue
+from .pbstream import encode_temperature_frame
 
 def _ensure_dir(p: pathlib.Path):
     p.mkdir(parents=True, exist_ok=True)
 
-def _daily_path(hot_dir, prefix, ts_utc: datetime.datetime):
+HOT_FORMATS = ("jsonl", "jsonl.zst", "pbr")
+
+def _daily_path(hot_dir, prefix, ts_utc: datetime.datetime, shard: int = None, ext: str = "jsonl"):
     day = ts_utc.strftime("%Y-%m-%d")
-    return pathlib.Path(hot_dir) / f"{prefix}.{day}.jsonl"
+    suffix = "" if shard is None else f".w{shard}"
+    return pathlib.Path(hot_dir) / f"{prefix}.{day}{suffix}.{ext}"
+
+def _make_writer(hot_dir, prefix, st: dict, shard: int = None) -> HotFileWriter:
+    fl = st.get("flush") or {}
+    fmt = st.get("hot_format", "jsonl")
+    if fmt not in HOT_FORMATS:
+        raise ValueError(f"storage.hot_format must be one of {HOT_FORMATS}, got {fmt!r}")
+    opener = None
+    if fmt == "jsonl.zst":
+        zc = st.get("zstd") or {}
+        opener = functools.partial(
+            ZstdFrameWriter,
+            frame_bytes=zc.get("frame_bytes", 1 << 20),
+            level=zc.get("level", 3),
+            fsync=fl.get("fsync", "none") != "none",
+        )
+    return HotFileWriter(
+        functools.partial(_daily_path, hot_dir, prefix, shard=shard, ext=fmt),
+        max_bytes=fl.get("max_bytes", 1 << 20),
+        max_interval_ms=fl.get("max_interval_ms", 1000),
+        fsync=fl.get("fsync", "none"),
+        opener=opener,
+    )
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9_.-]|^\.+$")
+
+class PartitionRouter:
+    """Map a message to its ``site=<..>/device=<..>/topic=<..>`` hot partition.
+
+    ``topic_pattern`` is an MQTT topic template such as
+    ``factory/{site}/{device}/{topic}``; named levels are captured from the
+    message topic (literal levels must match). Anything not captured is
+    looked up in the payload via ``fields`` (partition name -> JSON key) with a
+    cheap byte-level scan, so the payload is never fully parsed. Missing values
+    become ``unknown``; ``topic`` defaults to the last MQTT topic level.
+    """
+
+    PARTS = ("site", "device", "topic")
+
+    def __init__(self, pcfg: dict):
+        tpl = pcfg.get("topic_pattern")
+        self._levels = tpl.split("/") if tpl else None
+        self._fields = {
+            part: re.compile(rb'"' + re.escape(key.encode("utf-8")) + rb'"\s*:\s*(?:"([^"\\]*)"|([-\w.]+))')
+            for part, key in (pcfg.get("fields") or {}).items()
+            if part in self.PARTS
+        }
+        self.max_open = int(pcfg.get("max_open_files", 64))
+        self._cache = {}
+
+    def _from_topic(self, topic: str) -> dict:
+        found = self._cache.get(topic)
+        if found is None:
+            found = {}
+            levels = topic.split("/")
+            if self._levels and len(levels) == len(self._levels):
+                for tpl, lvl in zip(self._levels, levels):
+                    if tpl.startswith("{") and tpl.endswith("}"):
+                        found[tpl[1:-1]] = lvl
+                    elif tpl not in ("+", lvl):
+                        found = {}
+                        break
+            self._cache[topic] = found
+        return found
+
+    def key_for(self, topic: str, payload: bytes = None) -> str:
+        found = self._from_topic(topic)
+        values = []
+        for part in self.PARTS:
+            v = found.get(part)
+            if v is None and payload is not None and part in self._fields:
+                m = self._fields[part].search(payload)
+                if m:
+                    v = (m.group(1) or m.group(2)).decode("utf-8", "replace")
+            if v is None:
+                v = topic.rsplit("/", 1)[-1] if part == "topic" else "unknown"
+            values.append(f"{part}={_UNSAFE_PATH_CHARS.sub('_', v) or 'unknown'}")
+        return "/".join(values)
+
+def _make_stream(hot_dir, prefix, st: dict, shard: int = None, router: PartitionRouter = None):
+    """A single daily writer, or a pool of them keyed by hot partition when partitioning is on."""
+    if router is None:
+        return _make_writer(hot_dir, prefix, st, shard=shard)
+    fl = st.get("flush") or {}
+    return HotWriterPool(
+        lambda key: _make_writer(pathlib.Path(hot_dir) / key, prefix, st, shard=shard),
+        max_open=router.max_open,
+        max_interval_ms=fl.get("max_interval_ms", 1000),
+    )
+
+def _make_queue(cc: dict, shard: int = None) -> IngestQueue:
+    qc = cc.get("queue") or {}
+    return IngestQueue(
+        maxsize=qc.get("maxsize", 10000),
+        policy=qc.get("policy", "block"),
+        spill_dir=qc.get("spill_dir"),
+        spill_name="ingest.spill" if shard is None else f"ingest.w{shard}.spill",
+    )
+
+def _encode_jsonl(payload: bytes) -> bytes:
+    obj = json.loads(payload.decode("utf-8"))
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8") + b"\n"
+
+def _encode_raw(payload: bytes) -> bytes:
+    """Passthrough for trusted publishers that already send compact single-line JSON.
+
+    Only a structural check is done (one line, a ``{...}`` object, valid UTF-8);
+    the bytes are written as received.
+    """
+    if payload.endswith(b"\n"):
+        payload = payload[:-1]
+    if not (payload.startswith(b"{") and payload.endswith(b"}")) or b"\n" in payload or b"\r" in payload:
+        raise ValueError("raw payload must be a single-line JSON object")
+    payload.decode("utf-8")
+    return payload + b"\n"
+
+ENCODERS = {
+    "json": _encode_jsonl,         # full decode + compact re-encode
+    "raw": _encode_raw,            # structural check only, bytes written as-is
+    "protobuf": encode_temperature_frame,  # TemperatureReading checked, appended as sent, length-delimited
+}
+
+SINKS = ("jsonl", "parquet", "pbr")
+
+class TopicModes:
+    """Resolve the ingest mode and sink for an MQTT topic from ``collector.topics``.
+
+    Keys may use MQTT wildcards; the first matching entry wins and topics
+    without a match use ``default`` / ``jsonl``. Lookups are cached per
+    concrete topic.
+    """
+
+    def __init__(self, topics_cfg: dict = None, default: str = "json"):
+        self.default = default
+        self._rules = []
+        for pattern, opts in (topics_cfg or {}).items():
+            mode = (opts or {}).get("mode", default)
+            # protobuf payloads can only go to the binary hot stream
+            sink = "pbr" if mode == "protobuf" else (opts or {}).get("sink", "jsonl")
+            if mode not in ENCODERS:
+                raise ValueError(f"collector.topics[{pattern!r}]: unknown mode {mode!r}, expected one of {sorted(ENCODERS)}")
+            if sink not in SINKS or (sink == "pbr") != (mode == "protobuf"):
+                raise ValueError(f"collector.topics[{pattern!r}]: unknown sink {sink!r}, expected one of {SINKS}")
+            self._rules.append((pattern, (mode, sink)))
+        if default not in ENCODERS or default == "protobuf":
+            raise ValueError(f"collector.default_mode: unknown mode {default!r}")
+        self._cache = {}
+
+    @property
+    def sinks(self) -> set:
+        return {"jsonl"} | {sink for _, (_, sink) in self._rules}
+
+    def route_for(self, topic: str):
+        route = self._cache.get(topic)
+        if route is None:
+            route = next((r for pat, r in self._rules if mqtt.topic_matches_sub(pat, topic)), (self.default, "jsonl"))
+            self._cache[topic] = route
+        return route
 
-def on_message_append_jsonl(hot_path: pathlib.Path, payload: bytes):
+    def mode_for(self, topic: str) -> str:
+        return self.route_for(topic)[0]
+
+    def sink_for(self, topic: str) -> str:
+        return self.route_for(topic)[1]
+
+    def encoder_for(self, topic: str):
+        return ENCODERS[self.mode_for(topic)]
+
+def _already_written(recent: RecentIds, data: bytes, redelivered: bool) -> bool:
+    """True for a redelivered message whose line was written before; fresh lines are only recorded."""
+    if recent is None:
+        return False
+    key = line_id(data)
+    if redelivered:
+        return recent.seen(key)
+    recent.add(key)
+    return False
+
+def _writer_loop(q: IngestQueue, writers: dict, batch_size: int, modes: TopicModes, parquet_sink=None,
+                 recent: RecentIds = None, router: PartitionRouter = None):
+    """Drain the ingest queue in batches until it is closed and empty.
+
+    ``writers`` maps hot streams (``jsonl``, and ``pbr`` when protobuf topics
+    are configured) to their HotFileWriter. Items carrying a fourth element
+    (the MQTT message id in at-least-once mode) are acknowledged through the
+    jsonl writer's ``on_commit`` once the group commit holding them is
+    durable. Every written line is recorded in ``recent``, but only
+    redeliveries (fifth element: the MQTT DUP flag) are checked against it,
+    so distinct publishes with identical bodies are all kept. With a
+    ``router`` the writers are HotWriterPools and every line is tagged with
+    its partition.
+    """
+    writer = writers["jsonl"]
+    pbr_writer = writers.get("pbr")
+    timeout = min(writer.max_interval, 1.0) or 0.1
+    while True:
+        batch = q.get_batch(batch_size, timeout=timeout)
+        if not batch:
+            if q.closed:
+                return
+            try:
+                for w in writers.values():
+                    w.flush_if_due()
+                if parquet_sink is not None:
+                    parquet_sink.flush_if_due()
+            except Exception as e:
+                print("[collector] ERROR flushing:", e)
+            continue
+        records, frames, rows, acks = [], [], [], []
+        for item in batch:
+            ts, topic, payload = item[0], item[1], item[2]
+            if len(item) > 3:
+                acks.append(item[3])
+            redelivered = len(item) > 4 and item[4]
+            try:
+                sink = modes.sink_for(topic)
+                if sink == "pbr" and pbr_writer is not None:
+                    frame = encode_temperature_frame(payload)
+                    if not _already_written(recent, frame, redelivered):
+                        frames.append((frame, ts) if router is None else (frame, ts, router.key_for(topic)))
+                elif sink == "parquet" and parquet_sink is not None:
+                    obj = json.loads(payload)
+                    if not isinstance(obj, dict):
+                        raise ValueError("parquet sink expects JSON objects")
+                    rows.append((obj, ts))
+                else:
+                    line = modes.encoder_for(topic)(payload)
+                    if _already_written(recent, line, redelivered):
+                        continue
+                    records.append((line, ts) if router is None else (line, ts, router.key_for(topic, payload)))
+            except Exception as e:
+                # undecodable messages are still acked: redelivery would fail the same way
+                print(f"[collector] ERROR decoding {topic}:", e)
+        try:
+            if frames:
+                pbr_writer.append_many(frames)
+                if acks:
+                    # acks ride on the jsonl commit below, so make the binary frames durable first
+                    pbr_writer.flush()
+            if records or acks:
+                writer.append_many(records, acks)
+            if rows:
+                parquet_sink.write_many(rows)
+                parquet_sink.flush_if_due()
+        except Exception as e:
+            # e.g. disk full: keep draining the queue. Lines not yet committed stay buffered and
+            # are retried on the next commit; messages not acked here are redelivered by the broker
+            print("[collector] ERROR writing batch:", e)
+
+def _tail_lines(path: pathlib.Path, max_bytes: int):
+    """Complete lines from the last ``max_bytes`` of a plain hot file."""
+    if not path.exists():
+        return []
+    with path.open("rb") as f:
+        size = f.seek(0, 2)
+        f.seek(max(0, size - max_bytes))
+        data = f.read()
+    lines = data.split(b"\n")
+    if size > max_bytes:
+        lines = lines[1:]  # first one is partial
+    return [ln + b"\n" for ln in lines if ln]
+
+def _subscriptions(mqtt_cfg: dict, shard: int = None) -> list:
+    """Topic filters to subscribe to; worker shards share them as ``$share/<group>/<topic>``."""
+    topics = list(mqtt_cfg["topics"])
+    if shard is None:
+        return topics
+    group = mqtt_cfg.get("shared_group", "edge-collectors")
+    return [f"$share/{group}/{t}" for t in topics]
+
+def _make_client(mqtt_cfg: dict, shard: int = None, at_least_once: bool = False):
+    kwargs = {}
+    if at_least_once:
+        # a stable client id and persistent session so the broker redelivers unacked messages
+        base = mqtt_cfg.get("client_id") or "edge-collector"
+        kwargs["client_id"] = base if shard is None else f"{base}-w{shard}"
+        kwargs["manual_ack"] = True
+    if shard is None:
+        if at_least_once:
+            kwargs["clean_session"] = False
+        return mqtt.Client(**kwargs)
+    # shared subscriptions need MQTT v5
+    return mqtt.Client(protocol=mqtt.MQTTv5, **kwargs)
+
+def _connect(client, mqtt_cfg: dict, v5: bool, at_least_once: bool):
+    if v5 and at_least_once:
+        from paho.mqtt.packettypes import PacketTypes
+        from paho.mqtt.properties import Properties
+        props = Properties(PacketTypes.CONNECT)
+        props.SessionExpiryInterval = int(mqtt_cfg.get("session_expiry_s", 3600))
+        client.connect(mqtt_cfg["host"], int(mqtt_cfg["port"]), 60, clean_start=False, properties=props)
+    else:
+        client.connect(mqtt_cfg["host"], int(mqtt_cfg["port"]), 60)
+
+def _make_parquet_sink(st: dict, prefix: str):
+    # imported lazily: pyarrow is optional on some gateways
+    from .writer_parquet import StreamingParquetWriter
+    pc = st.get("parquet_sink") or {}
+    return StreamingParquetWriter(
+        st["batches_dir"],
+        prefix=prefix,
+        row_group_rows=pc.get("row_group_rows", 50000),
+        row_group_interval_s=pc.get("row_group_interval_s", 60),
+        compression=pc.get("compression", "zstd"),
+        close_grace_s=pc.get("close_grace_s", 30),
+    )
+
+def run_collector(config_path: str, workers: int = 1):
+    """Run the collector; with ``workers > 1`` start one process per worker.
+
+    Workers share the MQTT subscriptions through MQTT v5 shared subscriptions
+    (``$share/<mqtt.shared_group>/<topic>``) so the broker load-balances
+    messages between them, and each writes its own hot file shard
+    (``{prefix}.{day}.w{N}.jsonl``).
+    """
+    workers = max(1, int(workers))
+    if workers == 1:
+        _collect(config_path)
+        return
+
+    procs = [
+        multiprocessing.Process(target=_collect, args=(config_path, i), name=f"collector-w{i}")
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    print(f"[collector] started {workers} worker processes")
+
+    def _forward_sigterm(signum, frame):
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, _forward_sigterm)
     try:
-        obj = json.loads(payload.decode("utf-8"))
-        line = json.dumps(obj, separators=(",", ":"))
-        with hot_path.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception as e:
-        print("[collector] ERROR decoding/appending:", e)
-
-def run_collector(config_path: str):
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        # the terminal delivers SIGINT to the workers too; wait for their clean shutdown
+        for p in procs:
+            p.join()
+    print("[collector] all workers stopped")
+
+def _collect(config_path: str, shard: int = None):
     with open(config_path, "r") as f:
         cfg = yaml.safe_load(f)
 
@@ -30,19 +376,62 @@ def run_collector(config_path: str):
     hot_dir = pathlib.Path(st["hot_dir"])
     _ensure_dir(hot_dir)
     prefix = st.get("file_prefix", "telemetry")
+    cc = cfg.get("collector") or {}
+    pcfg = cc.get("partitioning") or {}
+    router = PartitionRouter(pcfg) if pcfg.get("enabled") else None
+    writer = _make_stream(hot_dir, prefix, st, shard=shard, router=router)
+    q = _make_queue(cc, shard=shard)
+    batch_size = int(cc.get("batch_size", 500))
+    stats_interval = float(cc.get("stats_interval_s", 60))
+    modes = TopicModes(cc.get("topics"), default=cc.get("default_mode", "json"))
+    parquet_sink = _make_parquet_sink(st, prefix) if "parquet" in modes.sinks else None
+    writers = {"jsonl": writer}
+    if "pbr" in modes.sinks:
+        writers["pbr"] = _make_stream(hot_dir, prefix, dict(st, hot_format="pbr"), shard=shard, router=router)
+    tag = "[collector]" if shard is None else f"[collector w{shard}]"
+    dc = cfg.get("decisions") or {}
+    decisions = None
+    if dc.get("enabled"):
+        from .decision_stage import make_decision_stage
+        dprefix = dc.get("file_prefix", "decisions")
+        decisions = make_decision_stage(dc, _make_writer(hot_dir, dprefix, st, shard=shard))
+    at_least_once = bool(cc.get("at_least_once"))
+    qos = 1 if at_least_once else int(mqtt_cfg.get("qos", 0))
+    recent = None
+    if at_least_once:
+        if q.policy != "block":
+            raise ValueError("collector.at_least_once requires collector.queue.policy: block")
+        if parquet_sink is not None or st.get("hot_format", "jsonl") != "jsonl":
+            raise ValueError("collector.at_least_once requires plain jsonl hot files (no parquet sink, no jsonl.zst)")
+        dd = cc.get("dedup") or {}
+        recent = RecentIds(dd.get("capacity", 100000))
+        # redeliveries after a restart are usually what was written just before it
+        today = _daily_path(hot_dir, prefix, datetime.datetime.utcnow(), shard=shard).name
+        for path in hot_dir.rglob(today):
+            recent.warm(_tail_lines(path, int(dd.get("warm_bytes", 8 << 20))))
+        print(tag, f"at-least-once: QoS1, manual acks, dedup warmed with {len(recent)} ids")
+    topics = _subscriptions(mqtt_cfg, shard)
 
     def on_connect(client, userdata, flags, rc, properties=None):
-        print("[collector] MQTT connected, rc=", rc)
-        for t in mqtt_cfg["topics"]:
-            client.subscribe(t, qos=0)
-            print("[collector] subscribed:", t)
+        print(tag, "MQTT connected, rc=", rc)
+        for t in topics:
+            client.subscribe(t, qos=qos)
+            print(tag, "subscribed:", t)
 
     def on_message(client, userdata, msg):
-        ts = datetime.datetime.utcnow()
-        hot_path = _daily_path(hot_dir, prefix, ts)
-        on_message_append_jsonl(hot_path, msg.payload)
+        # network thread: enqueue only, decoding and disk I/O happen in writer threads
+        item = (datetime.datetime.utcnow(), msg.topic, msg.payload)
+        q.put(item + (msg.mid, bool(msg.dup)) if at_least_once else item)
+        if decisions is not None:
+            decisions.submit(item)
+
+    client = _make_client(mqtt_cfg, shard=shard, at_least_once=at_least_once)
+    if at_least_once:
+        def ack_committed(mids):
+            for mid in mids:
+                client.ack(mid, 1)
 
-    client = mqtt.Client()
+        writer.on_commit = ack_committed
     if mqtt_cfg.get("username"):
         client.username_pw_set(mqtt_cfg["username"], mqtt_cfg.get("password"))
     # TLS can be added if mqtt_cfg['tls'] is True
@@ -50,9 +439,52 @@ def run_collector(config_path: str):
     client.on_connect = on_connect
     client.on_message = on_message
 
-    client.connect(mqtt_cfg["host"], int(mqtt_cfg["port"]), 60)
-    print("[collector] running… (Ctrl+C to stop)")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    threads = [
+        threading.Thread(target=_writer_loop, args=(q, writers, batch_size, modes, parquet_sink, recent, router), name=f"collector-writer-{i}", daemon=True)
+        for i in range(max(1, int(cc.get("writer_threads", 1))))
+    ]
+    for t in threads:
+        t.start()
+    if decisions is not None:
+        decisions.start()
+
+    _connect(client, mqtt_cfg, v5=shard is not None, at_least_once=at_least_once)
+    client.loop_start()
+    print(tag, "running… (Ctrl+C to stop)")
+    next_stats = time.monotonic() + stats_interval
     try:
-        client.loop_forever()
+        while not stop.wait(1.0):
+            if not all(t.is_alive() for t in threads):
+                print(tag, "ERROR writer thread stopped, shutting down")
+                break
+            if stats_interval > 0 and time.monotonic() >= next_stats:
+                next_stats += stats_interval
+                print(tag, "queue", json.dumps(q.stats(), separators=(",", ":")))
+                if decisions is not None:
+                    print(tag, "decisions", json.dumps(decisions.stats(), separators=(",", ":")))
     except KeyboardInterrupt:
-        print("[collector] stopped")
+        pass
+    finally:
+        if not at_least_once:
+            client.disconnect()
+            client.loop_stop()
+        q.close()
+        for t in threads:
+            t.join()
+        for w in writers.values():
+            w.close()
+        if at_least_once:
+            # stay connected until the final commit has acked what it wrote
+            client.disconnect()
+            client.loop_stop()
+            print(tag, f"dedup skipped {recent.duplicates} duplicates")
+        if parquet_sink is not None:
+            parquet_sink.close()
+        print(tag, "queue", json.dumps(q.stats(), separators=(",", ":")))
+        if decisions is not None:
+            decisions.close()
+            print(tag, "decisions", json.dumps(decisions.stats(), separators=(",", ":")))
+        print(tag, f"stopped ({writer.lines_written} lines in {writer.commits} commits)")
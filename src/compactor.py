@@ -0,0 +1,219 @@
+# src/compactor.py
+import itertools
+import json
+import os
+import pathlib
+import re
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import yaml
+from .batcher import PATTERN, PBR_PATTERN
+from .catalog import refresh_catalog
+from .checkpoints import CheckpointStore, batches_lock
+
+JOURNAL = "_compaction.json"
+
+# batcher part files: {stem}.{inode:x}-{start offset:012d}[-{seq}].parquet
+_PART_RE = re.compile(r"^(?P<stem>.+)\.(?P<inode>[0-9a-f]+)-(?P<offset>\d{12})(?:-\d+)?\.parquet$")
+
+def _prefix(path: pathlib.Path) -> str:
+    # telemetry.2025-08-19..., decisions.2025-08-19...: never merge different streams
+    return path.name.split(".", 1)[0]
+
+def _hour_dirs(batches_dir: pathlib.Path):
+    """``hour=HH`` partition directories, also below site=/device=/topic= partitions."""
+    return sorted(p for p in batches_dir.rglob("hour=*") if p.is_dir())
+
+def _save_journal(hour_dir: pathlib.Path, inputs, outputs):
+    tmp = hour_dir / (JOURNAL + ".tmp")
+    tmp.write_text(json.dumps({"inputs": [p.name for p in inputs], "outputs": [p.name for p in outputs]}))
+    os.replace(tmp, hour_dir / JOURNAL)
+
+def _finish_journal(hour_dir: pathlib.Path):
+    """Roll a compaction forward: outputs into place, inputs removed, journal dropped.
+
+    The journal is only written once every output is complete on disk, so a
+    run interrupted anywhere after that is finished here (also on restart).
+    """
+    journal = hour_dir / JOURNAL
+    j = json.loads(journal.read_text())
+    for name in j["outputs"]:
+        tmp = hour_dir / (name + ".inprogress")
+        if tmp.exists():
+            os.replace(tmp, hour_dir / name)
+    for name in j["inputs"]:
+        (hour_dir / name).unlink(missing_ok=True)
+    journal.unlink()
+
+def _checkpointed(batches_dir: pathlib.Path):
+    """Predicate: is this file safe to compact with respect to the batcher's checkpoints?
+
+    A batcher part written from at or beyond its hot file's checkpoint (a
+    failed or interrupted run) is rewritten under the same name by the
+    retry, so merging it now would duplicate its rows; such parts are left
+    alone until the checkpoint has moved past them. Parts of an earlier
+    incarnation (other inode) and files not written by the batcher are fine.
+    """
+    offsets = {}  # (partition dir, part stem) -> (inode, checkpointed offset)
+    for rel, cp in CheckpointStore(batches_dir / "_checkpoints.json").items():
+        rel = pathlib.PurePosixPath(rel)
+        m = PATTERN.match(rel.name) or PBR_PATTERN.match(rel.name)
+        if m:
+            stem = m.group("stem") + (".pbr" if rel.suffix == ".pbr" else "")
+            offsets[(str(rel.parent), stem)] = (cp.get("inode"), int(cp.get("offset", 0)))
+
+    def ok(path: pathlib.Path) -> bool:
+        m = _PART_RE.match(path.name)
+        if not m:
+            return True
+        partition = pathlib.PurePosixPath(path.relative_to(batches_dir).as_posix()).parent.parent.parent
+        inode, offset = offsets.get((str(partition), m.group("stem")), (None, 0))
+        if inode is not None and inode != int(m.group("inode"), 16):
+            return True
+        return int(m.group("offset")) < offset
+
+    return ok
+
+def _sort_keys(table: pa.Table, sort_by) -> list:
+    return [(c, "ascending") for c in sort_by if c in table.column_names]
+
+def _decoded(col):
+    return col.cast(col.type.value_type) if pa.types.is_dictionary(col.type) else col
+
+def _drop_orphans(hour_dir: pathlib.Path):
+    """Remove outputs of a compaction that crashed before its journal was written.
+
+    Its inputs are all still in place, so the partial outputs are simply discarded
+    (only compactor outputs: the collector's Parquet sink writes ``*.inprogress`` too).
+    """
+    for tmp in hour_dir.glob("*.compacted.*.parquet.inprogress"):
+        tmp.unlink()
+        print("[compact] removed unfinished", tmp)
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    n = table.num_rows
+    return pa.Table.from_arrays(
+        [table[f.name].cast(f.type) if f.name in table.column_names else pa.nulls(n, f.type) for f in schema],
+        schema=schema)
+
+def _compact_group(hour_dir: pathlib.Path, prefix: str, inputs, opts: dict, seq) -> int:
+    """Merge ``inputs`` into target-sized files, each sorted; returns the number of outputs.
+
+    Inputs are streamed a record batch at a time and an output is written as
+    soon as enough rows for it are pending, so at most about one output's rows
+    (capped at ``memory_bytes`` uncompressed) are held in memory.
+    """
+    metas = [pq.read_metadata(p) for p in inputs]
+    try:
+        schema = pa.unify_schemas([m.schema.to_arrow_schema() for m in metas], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        print("[compact] skipping", hour_dir, prefix, "(incompatible schemas)")
+        return 0
+
+    # size outputs and row groups from the inputs' compressed bytes per row,
+    # and cap them by the uncompressed (in-memory) bytes per row
+    num_rows = sum(m.num_rows for m in metas)
+    bytes_per_row = max(1.0, sum(p.stat().st_size for p in inputs) / max(1, num_rows))
+    mem_per_row = max(1.0, sum(m.row_group(i).total_byte_size for m in metas for i in range(m.num_row_groups))
+                      / max(1, num_rows))
+    rows_per_file = max(1, int(min(opts["target_bytes"] / bytes_per_row, opts["memory_bytes"] / mem_per_row)))
+    row_group_rows = max(1, min(rows_per_file, int(opts["row_group_bytes"] / bytes_per_row)))
+
+    stamp = int(time.time() * 1000)
+    outputs = []
+
+    def write(table: pa.Table):
+        keys = _sort_keys(table, opts["sort_by"])
+        if keys:
+            # dictionary columns are sorted by value (Arrow cannot sort them directly)
+            key_table = pa.table({c: _decoded(table[c]) for c, _ in keys})
+            table = table.take(pc.sort_indices(key_table, sort_keys=keys))
+        final = hour_dir / f"{prefix}.compacted.{stamp}-{next(seq)}.parquet"
+        outputs.append(final)
+        pq.write_table(table, final.with_name(final.name + ".inprogress"), row_group_size=row_group_rows,
+                       compression=opts["compression"], compression_level=opts["compression_level"],
+                       use_dictionary=True, write_statistics=True)
+
+    pending, pending_rows = [], 0
+    try:
+        for p in inputs:
+            for batch in pq.ParquetFile(p).iter_batches(batch_size=min(rows_per_file, 65536)):
+                pending.append(_conform(pa.Table.from_batches([batch]), schema))
+                pending_rows += batch.num_rows
+                while pending_rows >= rows_per_file:
+                    table = pa.concat_tables(pending)
+                    write(table.slice(0, rows_per_file))
+                    rest = table.slice(rows_per_file)
+                    pending, pending_rows = [rest], rest.num_rows
+        if pending_rows or not outputs:
+            write(pa.concat_tables(pending) if pending else schema.empty_table())
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        _drop_orphans(hour_dir)
+        print("[compact] skipping", hour_dir, prefix, f"({e})")
+        return 0
+    _save_journal(hour_dir, inputs, outputs)
+    _finish_journal(hour_dir)
+    print(f"[compact] {hour_dir}: {len(inputs)} {prefix} files -> {len(outputs)} ({num_rows} rows)")
+    return len(outputs)
+
+def run_compactor(config_path: str, target_mb: float = None):
+    """Merge small Parquet files within each ``date=/hour=`` partition of ``batches_dir``.
+
+    Per partition and stream prefix, files below the target size are merged
+    when there are at least two of them into files of about
+    ``compact.target_file_mb`` (fewer rows if they would take more than
+    ``compact.memory_mb`` in memory) with row groups of about
+    ``compact.row_group_mb`` (zstd); the rows of each output are sorted by
+    ``compact.sort_by`` (``device_id``, ``ts``) for tight min/max statistics.
+    Outputs are written as ``*.inprogress``; a journal in the partition then
+    lets the swap (rename outputs, delete inputs) be completed after a crash,
+    and outputs of a run that crashed before its journal are removed, so rows
+    are never lost or left duplicated.
+    """
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    cc = cfg.get("compact", {}) or {}
+    target_mb = float(target_mb or cc.get("target_file_mb", 128))
+    opts = {
+        "target_bytes": target_mb * (1 << 20),
+        "row_group_bytes": float(cc.get("row_group_mb", 32)) * (1 << 20),
+        "memory_bytes": float(cc.get("memory_mb", 512)) * (1 << 20),
+        "compression": cc.get("compression", "zstd"),
+        "compression_level": cc.get("compression_level"),
+        "sort_by": list(cc.get("sort_by", ["device_id", "ts"])),
+    }
+    batches_dir = pathlib.Path(cfg["storage"]["batches_dir"])
+    if not batches_dir.exists():
+        print("[compact] no batches in", batches_dir)
+        return
+
+    partitions = merged = written = held = 0
+    seq = itertools.count()
+    with batches_lock(batches_dir):
+        checkpointed = _checkpointed(batches_dir)
+        for hour_dir in _hour_dirs(batches_dir):
+            if (hour_dir / JOURNAL).exists():
+                _finish_journal(hour_dir)
+            else:
+                _drop_orphans(hour_dir)
+            small = [p for p in sorted(hour_dir.glob("*.parquet")) if p.stat().st_size < opts["target_bytes"]]
+            pending = [p for p in small if not checkpointed(p)]
+            if pending:
+                held += len(pending)
+                small = [p for p in small if p not in pending]
+            groups = {}
+            for p in small:
+                groups.setdefault(_prefix(p), []).append(p)
+            for prefix, inputs in groups.items():
+                if len(inputs) < 2:
+                    continue
+                n = _compact_group(hour_dir, prefix, inputs, opts, seq)
+                if n:
+                    partitions += 1
+                    merged += len(inputs)
+                    written += n
+        refresh_catalog(batches_dir)
+    print(f"[compact] done: {partitions} partitions, {merged} files merged into {written}"
+          + (f", {held} files beyond their hot file's checkpoint left alone" if held else ""))
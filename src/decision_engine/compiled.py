@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict
+import yaml
+from .engine import DEFAULT_RISK_CUTOFFS, asset_actions, asset_rules, decide_batch, risk_level
+from .model_infer import load_model
+from .rules import LEVELS, RuleSet, _compare_level
+from .windows import WindowState
+
+class _Snapshot:
+    """One compiled policy version: ``(RuleSet, actions per level)`` per asset id, and its model."""
+    __slots__ = ('policy', 'digest', 'assets', 'default', 'model')
+
+    def __init__(self, policy: Dict, digest: str = None, model=None):
+        self.policy = policy or {}
+        self.digest = digest
+        # load_model() shares ONNX sessions per process, so an unchanged model: section reuses it
+        self.model = model or load_model(**(self.policy.get('model') or {}))
+        self.assets = {a: (asset_rules(policy, a), asset_actions(policy, a))
+                       for a in self.policy.get('assets', {}) or {}}
+        self.default = (asset_rules(policy, None), asset_actions(policy, None))
+
+    def rules(self, asset_id) -> RuleSet:
+        return self.assets.get(asset_id, self.default)[0]
+
+    def signatures(self) -> set:
+        return {sig for rules, _ in [*self.assets.values(), self.default] for sig in rules.signatures}
+
+class CompiledPolicy:
+    """``decide()`` with the policy resolved once and the model instance cached.
+
+    Thresholds, declared rules (compiled to closures and column expressions,
+    see ``rules.py``) and action lists are resolved per asset at compile time,
+    so an event costs a lookup by ``source`` plus the rule and model evaluation.
+    For stateless rules results equal ``decide(event, policy)``; windowed
+    rules (below) exist only here, so with them the results differ: ``decide()``
+    skips them. The risk model is ``model`` if
+    given, else the policy's ``model:`` section (``path`` of an ONNX file and
+    ``OnnxModel`` options; the built-in model without one).
+
+    Built from a file (``path``), the policy is reloaded when the file
+    changes: a background thread ``stat()``s it every ``reload_s`` and, if the
+    mtime or size moved and the content hash differs, parses and compiles
+    the new version and swaps it in. Evaluation never waits for a reload;
+    a file that fails to parse keeps the previous version in use.
+
+    Windowed rules keep per-asset ring buffers in ``state`` (a ``WindowState``
+    of at most ``max_assets`` assets per rule), updated by ``decide()``/
+    ``decide_many()``; ``decide_batch()`` is stateless and skips them. With
+    ``state_path`` the buffers are restored at start, and saved every
+    ``snapshot_s`` and on ``close()``, so a restart keeps its warm windows.
+    """
+
+    def __init__(self, path: str = None, policy: Dict = None, risk_cutoffs=None, model=None, reload_s: float = 1.0,
+                 state_path: str = None, snapshot_s: float = 60, max_assets: int = 4096):
+        self.path = path
+        self.risk_cutoffs = risk_cutoffs or DEFAULT_RISK_CUTOFFS
+        self._model = model
+        self.reload_s = float(reload_s)
+        self._stat = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.state = WindowState(max_assets)
+        self.state_path = state_path
+        self.snapshot_s = float(snapshot_s)
+        if state_path and os.path.exists(state_path):
+            self.state.load(state_path)
+        if path is None:
+            self._snap = _Snapshot(policy, model=model)
+        else:
+            self._snap = None
+            self.check()
+        intervals = [i for i, on in ((self.reload_s, path), (self.snapshot_s, state_path)) if on and i > 0]
+        if intervals:
+            self._thread = threading.Thread(target=self._watch, args=(min(intervals),), name="policy-reload", daemon=True)
+            self._thread.start()
+
+    @property
+    def policy(self) -> Dict:
+        return self._snap.policy
+
+    @property
+    def model(self):
+        return self._snap.model
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the policy file version in use (``None`` for an in-memory policy)."""
+        return self._snap.digest
+
+    def check(self) -> bool:
+        """Reload the policy file if it changed; True if a new version was swapped in."""
+        st = os.stat(self.path)
+        stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stat == self._stat:
+            return False
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self._stat = stat
+        digest = hashlib.sha256(data).hexdigest()
+        if self._snap is not None and digest == self._snap.digest:
+            return False  # touched, not changed
+        snap = _Snapshot(yaml.safe_load(data), digest, self._model)
+        self._snap = snap  # single reference swap: evaluations see the old or the new version
+        self.state.retain(snap.signatures())
+        return True
+
+    def _watch(self, interval: float):
+        next_snapshot = time.monotonic() + self.snapshot_s
+        while not self._stop.wait(interval):
+            if self.path and self.reload_s > 0:
+                try:
+                    if self.check():
+                        print("[policy] reloaded", self.path, self.digest[:12])
+                except Exception as e:  # keep the previous version; retried on the next change
+                    print("[policy] ERROR reloading", self.path, e)
+            if self.state_path and self.snapshot_s > 0 and time.monotonic() >= next_snapshot:
+                next_snapshot = time.monotonic() + self.snapshot_s
+                try:
+                    self.state.save(self.state_path)
+                except OSError as e:
+                    print("[policy] ERROR saving window state", self.state_path, e)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.state_path:
+            self.state.save(self.state_path)
+
+    def decide(self, event: Dict) -> Dict:
+        snap = self._snap
+        return self._decide(snap, event, snap.model.predict_proba(event))
+
+    def decide_many(self, events: list) -> list:
+        """``self.decide()`` for a list of events with one model call for all of them.
+
+        Like ``self.decide()`` (and unlike the stateless module-level ``decide()``)
+        it feeds and evaluates the windowed rules, in list order.
+
+        An event that cannot be evaluated gets its exception in place of a
+        result and the others are unaffected; every event reaches the windowed
+        rules at most once, so callers must not retry the batch through ``decide()``.
+        """
+        snap = self._snap
+        try:
+            if hasattr(snap.model, 'predict_proba_many'):
+                risks = snap.model.predict_proba_many(events)
+            else:
+                risks = [snap.model.predict_proba(e) for e in events]
+        except Exception:  # find the event(s) the model cannot score; nothing has touched the state yet
+            risks = [self._try(snap.model.predict_proba, e) for e in events]
+        return [r if isinstance(r, Exception) else self._try(self._decide, snap, e, r) for e, r in zip(events, risks)]
+
+    @staticmethod
+    def _try(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            return e
+
+    def _decide(self, snap: _Snapshot, event: Dict, risk: float) -> Dict:
+        rules, actions = snap.assets.get(event.get('source'), snap.default)
+        level, reasons = rules.evaluate(event, self.state)
+        final_level = _compare_level(level, risk_level(risk, self.risk_cutoffs))
+        return {'level': final_level, 'risk': float(risk), 'reasons': reasons,
+                'actions': actions[LEVELS.index(final_level)]}
+
+    def decide_batch(self, table):
+        """``decide_batch()`` with this policy version and the cached model."""
+        snap = self._snap
+        return decide_batch(table, snap.policy, self.risk_cutoffs, snap.model, rules=snap.rules)
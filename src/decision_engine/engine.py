@@ -1,49 +1,175 @@
 import yaml
+import numpy as np
 from typing import Dict
-from .rules import evaluate_rule, _compare_level
+from .rules import LEVELS, ExprRule, RuleSet, model_inputs, threshold_rules, _compare_level
 from .model_infer import load_model
+from .windows import WindowRule
 
-def decide(event: Dict, policy: Dict, risk_cutoffs=None) -> Dict:
-    risk_cutoffs = risk_cutoffs or {'warn':0.5,'alert':0.7,'shutdown':0.9}
+DEFAULT_RISK_CUTOFFS = {'warn':0.5,'alert':0.7,'shutdown':0.9}
+DEFAULT_ACTIONS = {
+    'shutdown': ['notify:maintenance','trigger:plc_shutdown'],
+    'alert': ['notify:maintenance'],
+    'warn': ['notify:operator'],
+    'none': [],
+}
+
+def asset_thresholds(policy: Dict, asset_id) -> Dict:
+    """Global thresholds with the asset's overrides merged in per field (the policy is not modified)."""
     global_cfg = (policy or {}).get('global', {})
-    default_action = global_cfg.get('default_action', 'NONE')
-    thresholds = dict(global_cfg.get('thresholds', {}))
+    thresholds = {k: dict(v) for k, v in global_cfg.get('thresholds', {}).items()}
+    asset_cfg = (policy or {}).get('assets', {}).get(asset_id, {})
+    for k, v in asset_cfg.get('thresholds', {}).items():
+        thresholds.setdefault(k, {}).update(v)
+    return thresholds
 
-    asset_id = event.get('source')
+def asset_rules(policy: Dict, asset_id) -> RuleSet:
+    """The asset's ``thresholds`` plus declared ``rules``.
+
+    ``global.rules`` is a list of ``{id, when, level}`` or, for windowed
+    rules, ``{id, field, stat, window_s, above|below, ...}`` (``WindowRule``);
+    an asset's ``rules`` entry with the same ``id`` overrides its keys
+    (``enabled: false`` drops the rule), other ids are added.
+    """
+    declared = {}
     asset_cfg = (policy or {}).get('assets', {}).get(asset_id, {})
-    if 'thresholds' in asset_cfg:
-        for k, v in asset_cfg['thresholds'].items():
-            base = thresholds.get(k, {})
-            base.update(v)
-            thresholds[k] = base
+    for spec in ((policy or {}).get('global', {}).get('rules') or []) + (asset_cfg.get('rules') or []):
+        if 'id' not in spec:
+            raise ValueError(f"rule without an id: {spec!r}")
+        declared[spec['id']] = {**declared.get(spec['id'], {}), **spec}
+    rules = threshold_rules(asset_thresholds(policy, asset_id))
+    for rule_id, spec in declared.items():
+        if spec.get('enabled', True) is False:
+            continue
+        if 'stat' in spec:
+            params = {k: v for k, v in spec.items() if k not in ('id', 'enabled')}
+            try:
+                rules.append(WindowRule(rule_id, **params))
+            except TypeError as e:
+                raise ValueError(f"rule {rule_id!r}: {e}") from None
+            continue
+        if 'when' not in spec:
+            raise ValueError(f"rule {rule_id!r} has no 'when' expression")
+        rules.append(ExprRule(rule_id, spec['when'], spec.get('level', 'ALERT')))
+    return RuleSet(rules)
+
+def asset_actions(policy: Dict, asset_id) -> list:
+    """Action list per level (index into ``LEVELS``) for an asset, defaults applied."""
+    default_action = (policy or {}).get('global', {}).get('default_action', 'NONE')
+    actions = (policy or {}).get('assets', {}).get(asset_id, {}).get('actions', {})
+    return [actions.get(level.lower(), DEFAULT_ACTIONS[level.lower()]) or [default_action] for level in LEVELS]
 
-    level, reasons = evaluate_rule(event, thresholds)
+def risk_level(risk: float, risk_cutoffs: Dict) -> str:
+    if risk >= risk_cutoffs['shutdown']:
+        return 'SHUTDOWN'
+    if risk >= risk_cutoffs['alert']:
+        return 'ALERT'
+    if risk >= risk_cutoffs['warn']:
+        return 'WARN'
+    return 'NONE'
+
+def decide(event: Dict, policy: Dict, risk_cutoffs=None, model=None) -> Dict:
+    risk_cutoffs = risk_cutoffs or DEFAULT_RISK_CUTOFFS
+    asset_id = event.get('source')
+    level, reasons = asset_rules(policy, asset_id).evaluate(event)
 
-    model = load_model()
+    model = model or load_model()
     risk = model.predict_proba(event)
 
-    level_ml = 'NONE'
-    if risk >= risk_cutoffs['shutdown']:
-        level_ml = 'SHUTDOWN'
-    elif risk >= risk_cutoffs['alert']:
-        level_ml = 'ALERT'
-    elif risk >= risk_cutoffs['warn']:
-        level_ml = 'WARN'
-
-    final_level = _compare_level(level, level_ml)
-
-    actions = []
-    asset_actions = asset_cfg.get('actions', {})
-    if final_level == 'SHUTDOWN':
-        actions = asset_actions.get('shutdown', ['notify:maintenance','trigger:plc_shutdown'])
-    elif final_level == 'ALERT':
-        actions = asset_actions.get('alert', ['notify:maintenance'])
-    elif final_level == 'WARN':
-        actions = asset_actions.get('warn', ['notify:operator'])
+    final_level = _compare_level(level, risk_level(risk, risk_cutoffs))
+    actions = asset_actions(policy, asset_id)[LEVELS.index(final_level)]
+    return {'level': final_level, 'risk': float(risk), 'reasons': reasons, 'actions': actions}
+
+def _reasons_column(fired: list, n: int):
+    """``list<struct<rule, level, value, threshold>>`` per row: the ``reasons`` of ``decide()``
+    as (rule id, level, value, threshold) entries in rule order.
+
+    ``fired`` holds ``(row indices, position, rule id, level, value, threshold)``
+    per rule and asset; positions order the rules within a row.
+    """
+    import pyarrow as pa
+
+    rows, order, ids, levels, vals, ths = [], [], [], [], [], []
+    names = {}
+    for row_idx, pos, rule_id, hit, value, threshold in fired:
+        r = np.nonzero(hit)[0]
+        rows.append(row_idx[r])
+        order.append(np.full(len(r), pos))
+        ids.append(np.full(len(r), names.setdefault(rule_id, len(names)), dtype=np.int32))
+        levels.append(hit[r])
+        vals.append(value[r])
+        ths.append(np.full(len(r), np.nan) if threshold is None else threshold[r])
+    if not rows:
+        rows = order = ids = levels = vals = ths = [np.zeros(0, dtype=np.int8)]
+    rows, order = np.concatenate(rows), np.concatenate(order)
+    idx = np.lexsort((order, rows))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(rows.astype(np.int64), minlength=n))]).astype(np.int32)
+    entries = pa.StructArray.from_arrays(
+        [pa.DictionaryArray.from_arrays(np.concatenate(ids)[idx].astype(np.int32), pa.array(list(names), pa.string())),
+         pa.DictionaryArray.from_arrays(np.concatenate(levels)[idx].astype(np.int8), LEVELS),
+         pa.array(np.concatenate(vals)[idx].astype(np.float64), pa.float64(), from_pandas=True),
+         pa.array(np.concatenate(ths)[idx].astype(np.float64), pa.float64(), from_pandas=True)],
+        names=['rule', 'level', 'value', 'threshold'])
+    return pa.ListArray.from_arrays(pa.array(offsets), entries)
+
+def decide_batch(table, policy: Dict, risk_cutoffs=None, model=None, rules=None):
+    """``decide()`` over a whole Arrow table (or a dict of NumPy arrays) at once.
+
+    Returns a table with one row per event: ``level`` (dictionary-encoded),
+    ``risk``, ``actions`` and ``reasons`` (as ``rule``/``level``/``value``/
+    ``threshold`` entries; NaN values and missing thresholds are null).
+    Rules and action lists are resolved once per distinct ``source`` (or
+    taken from ``rules``, a callable ``asset_id -> RuleSet``), each asset's
+    rules run as column expressions over its rows, and the model over all
+    rows. Results equal ``decide()`` on each row as a dict, with nulls
+    treated as absent keys.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not isinstance(table, pa.Table):
+        table = pa.table(table)
+    n = table.num_rows
+    risk_cutoffs = risk_cutoffs or DEFAULT_RISK_CUTOFFS
+    model = model or load_model()
+    rules = rules or (lambda a: asset_rules(policy, a))
+
+    # per distinct asset (the last one stands for a null/missing source)
+    if 'source' in table.column_names and n:
+        enc = pc.dictionary_encode(table['source']).combine_chunks()
+        assets = enc.dictionary.to_pylist() + [None]
+        asset_idx = pc.fill_null(enc.indices, len(assets) - 1).to_numpy().astype(np.int64)
+    else:
+        assets, asset_idx = [None], np.zeros(n, dtype=np.int64)
+
+    level = np.zeros(n, dtype=np.int8)
+    fired = []
+    groups = np.bincount(asset_idx, minlength=len(assets))
+    for a in np.nonzero(groups)[0]:
+        if groups[a] == n:
+            rows, sub = np.arange(n), table
+        else:
+            rows = np.nonzero(asset_idx == a)[0]
+            sub = table.take(pa.array(rows))
+        sub_level, sub_fired = rules(assets[a]).evaluate_batch(sub)
+        level[rows] = sub_level
+        fired.extend((rows, *f) for f in sub_fired)
+
+    if hasattr(model, 'predict_proba_batch'):
+        inputs = {f: model_inputs(table, f) for f in model.features}
+        risk = np.asarray(model.predict_proba_batch(inputs), dtype=np.float64)
     else:
-        actions = asset_actions.get('none', [])
+        risk = np.array([float(model.predict_proba(e)) for e in table.to_pylist()], dtype=np.float64)
+    level_ml = np.select(
+        [risk >= risk_cutoffs['shutdown'], risk >= risk_cutoffs['alert'], risk >= risk_cutoffs['warn']], [3, 2, 1], 0)
+    final = np.maximum(level, level_ml)
 
-    return {'level': final_level, 'risk': float(risk), 'reasons': reasons, 'actions': actions or [default_action]}
+    actions = pa.array([acts for a in assets for acts in asset_actions(policy, a)], pa.list_(pa.string()))
+    return pa.table({
+        'level': pa.DictionaryArray.from_arrays(final.astype(np.int8), LEVELS),
+        'risk': pa.array(risk, pa.float64()),
+        'actions': actions.take(pa.array(asset_idx * len(LEVELS) + final)),
+        'reasons': _reasons_column(fired, n),
+    })
 
 def load_policy(path: str) -> Dict:
     with open(path, 'r') as f:
@@ -0,0 +1,194 @@
+import ast
+import functools
+import operator
+import numpy as np
+
+# Rule expressions are a small subset of Python syntax:
+#   temperature >= 85                      comparisons: < <= > >= == !=
+#   1.5 <= pressure <= 6.0                 chained comparisons (ranges)
+#   status in ["fault", "trip"]            membership in a literal list
+#   celsius > 90 and not (vibration < 0.1) and / or / not, parentheses
+#   anomaly                                a bare field is true if it is the boolean true
+# A comparison involving a missing/null value, or a number and a non-number,
+# is false (``!=`` included). Both compiled forms follow these rules, so the
+# per-event closure and the column evaluator agree on every row.
+
+_CMP = {
+    ast.Lt: (operator.lt, "less"),
+    ast.LtE: (operator.le, "less_equal"),
+    ast.Gt: (operator.gt, "greater"),
+    ast.GtE: (operator.ge, "greater_equal"),
+    ast.Eq: (operator.eq, "equal"),
+    ast.NotEq: (operator.ne, "not_equal"),
+}
+
+class Expr:
+    """A compiled rule expression.
+
+    ``fn(event) -> bool`` is the per-event closure, ``vec(table) -> np.ndarray``
+    (bool per row) the column form. ``fields`` are the fields it reads, in
+    order of appearance; ``required`` those that must be present for it to
+    be true (empty if it can be true without any, e.g. under ``not``).
+    """
+    __slots__ = ("source", "fn", "vec", "fields", "required")
+
+    def __init__(self, source, fn, vec, fields, required):
+        self.source = source
+        self.fn = fn
+        self.vec = vec
+        self.fields = fields
+        self.required = required
+
+def _is_num(v) -> bool:
+    return isinstance(v, (int, float))
+
+def _py_compare(op, a, b) -> bool:
+    if a is None or b is None or _is_num(a) != _is_num(b):
+        return False
+    try:
+        return bool(op(a, b))
+    except TypeError:
+        return False
+
+# --- column side -----------------------------------------------------------------
+
+def _kind(t) -> str:
+    import pyarrow as pa
+
+    if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t):
+        return "num"
+    if pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_dictionary(t):
+        return "str"
+    return "other"
+
+def _operand(table, node):
+    """``(array or scalar, kind)`` for a field or literal operand."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if isinstance(node, str):  # field name
+        if node not in table.column_names:
+            return None, "other"
+        col = table[node]
+        kind = _kind(col.type)
+        if kind == "num" and not pa.types.is_floating(col.type):
+            col = pc.cast(col, pa.float64())  # bool/int compare like Python numbers
+        elif pa.types.is_dictionary(col.type):
+            col = pc.cast(col, col.type.value_type)
+        return col, kind
+    value = node[0]
+    if _is_num(value):
+        return pa.scalar(float(value)), "num"
+    if isinstance(value, str):
+        return pa.scalar(value), "str"
+    return None, "other"
+
+def _vec_compare(table, fname: str, left, right) -> np.ndarray:
+    import pyarrow.compute as pc
+
+    n = table.num_rows
+    a, ka = _operand(table, left)
+    b, kb = _operand(table, right)
+    if a is None or b is None or ka != kb or ka == "other":
+        return np.zeros(n, dtype=bool)
+    res = pc.fill_null(getattr(pc, fname)(a, b), False)
+    if not hasattr(res, "to_numpy"):  # literal vs literal
+        return np.full(n, bool(res.as_py()))
+    return np.asarray(res.to_numpy(zero_copy_only=False), dtype=bool)
+
+def _vec_in(table, field: str, values) -> np.ndarray:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    n = table.num_rows
+    col, kind = _operand(table, field)
+    nums = [float(v) for v in values if _is_num(v)]
+    strs = [v for v in values if isinstance(v, str)]
+    if col is None or kind == "other" or not (nums if kind == "num" else strs):
+        return np.zeros(n, dtype=bool)
+    value_set = pa.array(nums, pa.float64()) if kind == "num" else pa.array(strs, pa.string())
+    res = pc.fill_null(pc.is_in(col, value_set=value_set), False)
+    return np.asarray(res.to_numpy(zero_copy_only=False), dtype=bool)
+
+def _vec_true(table, field: str) -> np.ndarray:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if field not in table.column_names or not pa.types.is_boolean(table[field].type):
+        return np.zeros(table.num_rows, dtype=bool)
+    return np.asarray(pc.fill_null(table[field], False).to_numpy(zero_copy_only=False), dtype=bool)
+
+# --- compiler -------------------------------------------------------------------
+
+def _operand_node(node, source):
+    """A field name (str) or a literal wrapped in a 1-tuple."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+        return (node.value,)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant) \
+            and _is_num(node.operand.value):
+        return (-node.operand.value,)
+    raise ValueError(f"unsupported operand in rule expression {source!r}: {ast.dump(node)}")
+
+def _getter(operand):
+    if isinstance(operand, str):
+        return lambda e: e.get(operand)
+    value = operand[0]
+    return lambda e: value
+
+def _compile(node, source):
+    """``(fn, vec, fields, required)`` for an AST node."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, source) for v in node.values]
+        fns = [p[0] for p in parts]
+        vecs = [p[1] for p in parts]
+        fields = [f for p in parts for f in p[2]]
+        if isinstance(node.op, ast.And):
+            required = set().union(*(p[3] for p in parts))
+            return (lambda e: all(f(e) for f in fns),
+                    lambda t: np.logical_and.reduce([v(t) for v in vecs]), fields, required)
+        required = set.intersection(*(p[3] for p in parts))
+        return (lambda e: any(f(e) for f in fns),
+                lambda t: np.logical_or.reduce([v(t) for v in vecs]), fields, required)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        fn, vec, fields, _ = _compile(node.operand, source)
+        return (lambda e: not fn(e)), (lambda t: ~vec(t)), fields, set()
+    if isinstance(node, ast.Compare):
+        if len(node.ops) == 1 and isinstance(node.ops[0], ast.In):
+            if not isinstance(node.left, ast.Name) or not isinstance(node.comparators[0], (ast.List, ast.Tuple, ast.Set)):
+                raise ValueError(f"'in' needs a field and a literal list in {source!r}")
+            values = [_operand_node(v, source)[0] for v in node.comparators[0].elts]
+            field, members = node.left.id, frozenset(values)
+            fields = [field]
+
+            def fn(e):
+                v = e.get(field)
+                return v is not None and not isinstance(v, (list, dict)) and v in members
+            return fn, (lambda t: _vec_in(t, field, values)), fields, set(fields)
+        operands = [_operand_node(node.left, source)] + [_operand_node(c, source) for c in node.comparators]
+        fields = [o for o in operands if isinstance(o, str)]
+        steps = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            if type(op) not in _CMP:
+                raise ValueError(f"unsupported comparison in rule expression {source!r}")
+            steps.append((_CMP[type(op)], left, right))
+        py = [(op, _getter(a), _getter(b)) for (op, _), a, b in steps]
+        return (lambda e: all(_py_compare(op, ga(e), gb(e)) for op, ga, gb in py),
+                lambda t: np.logical_and.reduce([_vec_compare(t, fname, a, b) for (_, fname), a, b in steps]),
+                fields, set(fields))
+    if isinstance(node, ast.Name):
+        field = node.id
+        return (lambda e: e.get(field) is True), (lambda t: _vec_true(t, field)), [field], {field}
+    raise ValueError(f"unsupported rule expression {source!r}")
+
+@functools.lru_cache(maxsize=None)
+def compile_expr(source: str) -> Expr:
+    """Parse and compile a rule expression (cached per source string)."""
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid rule expression {source!r}: {e.msg}") from None
+    fn, vec, fields, required = _compile(tree.body, source)
+    return Expr(source, fn, vec, tuple(dict.fromkeys(fields)), frozenset(required))
+
@@ -1,6 +1,26 @@
+import collections
+import threading
+import time
 from typing import Dict
+import numpy as np
+
+# Optional dependency: onnxruntime (only needed for *.onnx models)
+try:
+    import onnxruntime as ort  # type: ignore
+    HAS_ORT = True
+except Exception:
+    HAS_ORT = False
+
+DEFAULT_FEATURES = ("temperature", "vibration")
+
+def _clip01(score: np.ndarray) -> np.ndarray:
+    # max(0.0, min(1.0, s)) per element, including NaN -> 1.0
+    score = np.where(score < 1.0, score, 1.0)
+    return np.where(score > 0.0, score, 0.0)
 
 class DummyModel:
+    features = DEFAULT_FEATURES
+
     def __init__(self, w_temp=0.015, w_vib=1.8, bias=0.0):
         self.w_temp = w_temp
         self.w_vib = w_vib
@@ -12,5 +32,123 @@ class DummyModel:
         score = self.w_temp * t + self.w_vib * v + self.bias
         return max(0.0, min(1.0, score))
 
-def load_model(path: str = None) -> DummyModel:
-    return DummyModel()
+    def predict_proba_many(self, events) -> list:
+        return [self.predict_proba(e) for e in events]
+
+    def predict_proba_batch(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """``predict_proba`` over float64 ``features`` columns (absent values as 0.0); same results per row."""
+        return _clip01(self.w_temp * columns["temperature"] + self.w_vib * columns["vibration"] + self.bias)
+
+class OnnxModel:
+    """Risk model served by ONNX Runtime (CPU provider).
+
+    The first model input gets one row per event: ``float(event[f])`` for
+    each of ``features`` (0.0 when absent). The risk is the ``output`` tensor
+    (default: the first output), its last column for a 2-D output
+    (the positive class of a classifier), clipped to [0, 1].
+
+    ``predict_proba()`` may be called from many threads: requests are queued
+    and a single worker thread runs one session call per micro-batch of up
+    to ``max_batch`` rows, collected for at most ``max_delay_us`` after the
+    first one. ``predict_proba_many()``/``predict_proba_batch()`` run their
+    rows directly, ``max_rows`` per call. ``intra_op_threads``/
+    ``inter_op_threads`` go to the session options (0 = ONNX Runtime's default).
+    """
+
+    def __init__(self, path: str, features=DEFAULT_FEATURES, output: str = None, max_batch: int = 64,
+                 max_delay_us: float = 200, intra_op_threads: int = 1, inter_op_threads: int = 1,
+                 max_rows: int = 65536):
+        if not HAS_ORT:
+            raise RuntimeError("onnxruntime is required for ONNX models")
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = int(intra_op_threads)
+        so.inter_op_num_threads = int(inter_op_threads)
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), so, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self._input = inp.name
+        self._dtype = np.float64 if inp.type == "tensor(double)" else np.float32
+        self._output = output or self.session.get_outputs()[0].name
+        self.path = str(path)
+        self.features = tuple(features)
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0.0, float(max_delay_us)) / 1e6
+        self.max_rows = max(1, int(max_rows))
+        self._pending = collections.deque()
+        self._cv = threading.Condition()
+        self._worker = None
+
+    def _run(self, x: np.ndarray) -> np.ndarray:
+        out = np.asarray(self.session.run([self._output], {self._input: x})[0], dtype=np.float64)
+        if out.ndim == 2:
+            out = out[:, -1]
+        return _clip01(out.reshape(len(x)))
+
+    def _row(self, event: Dict) -> list:
+        return [float(event.get(f, 0.0)) for f in self.features]
+
+    def predict_proba(self, event: Dict) -> float:
+        req = [self._row(event), None, threading.Event()]
+        with self._cv:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._serve, name="onnx-batcher", daemon=True)
+                self._worker.start()
+            self._pending.append(req)
+            self._cv.notify()
+        req[2].wait()
+        if isinstance(req[1], BaseException):
+            raise req[1]
+        return req[1]
+
+    def _serve(self):
+        while True:
+            with self._cv:
+                while not self._pending:
+                    self._cv.wait()
+                deadline = time.monotonic() + self.max_delay
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cv.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            try:
+                risks = self._run(np.array([r[0] for r in batch], dtype=self._dtype)).tolist()
+                for req, risk in zip(batch, risks):
+                    req[1] = risk
+            except Exception as e:  # every caller of the batch sees the error
+                for req in batch:
+                    req[1] = e
+            for req in batch:
+                req[2].set()
+
+    def predict_proba_many(self, events) -> list:
+        rows = [self._row(e) for e in events]
+        if not rows:
+            return []
+        out = []
+        for i in range(0, len(rows), self.max_rows):
+            out.extend(self._run(np.array(rows[i:i + self.max_rows], dtype=self._dtype)).tolist())
+        return out
+
+    def predict_proba_batch(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        x = np.column_stack([columns[f] for f in self.features]).astype(self._dtype, copy=False)
+        if not len(x):
+            return np.zeros(0)
+        return np.concatenate([self._run(x[i:i + self.max_rows]) for i in range(0, len(x), self.max_rows)])
+
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+def load_model(path: str = None, **options):
+    """Risk model: an ``OnnxModel`` for the ``*.onnx`` file at ``path`` (``options`` as in
+    its constructor), the built-in ``DummyModel`` without one. ONNX models are loaded
+    once per process and shared by every caller with the same path and options."""
+    if not path:
+        return DummyModel()
+    key = (str(path), tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items())))
+    with _MODELS_LOCK:
+        if key not in _MODELS:
+            _MODELS[key] = OnnxModel(path, **options)
+        return _MODELS[key]
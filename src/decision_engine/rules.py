@@ -1,35 +1,171 @@
 from typing import Dict, Tuple
+import numpy as np
+from .expr import compile_expr
 
 LEVELS = ["NONE", "WARN", "ALERT", "SHUTDOWN"]
+_LEVEL_INDEX = {level: i for i, level in enumerate(LEVELS)}
 
 def _compare_level(a: str, b: str) -> str:
     return a if LEVELS.index(a) >= LEVELS.index(b) else b
 
+def _is_numeric(t) -> bool:
+    import pyarrow as pa
+
+    return pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t)
+
+def rule_values(table, name: str) -> np.ndarray:
+    """A field as float64 for the rules: numeric (incl. boolean) values, NaN elsewhere."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if name not in table.column_names or not _is_numeric(table[name].type):
+        return np.full(table.num_rows, np.nan)
+    return pc.cast(table[name], pa.float64()).to_numpy()
+
+def model_inputs(table, name: str) -> np.ndarray:
+    """A field as float64 for the model: ``float()`` of the value, 0.0 where it is null or missing."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if name not in table.column_names or pa.types.is_null(table[name].type):
+        return np.zeros(table.num_rows)
+    # e.g. numeric strings: decide() feeds them to the model too (float() raising on bad ones)
+    return pc.fill_null(pc.cast(table[name], pa.float64()), 0.0).to_numpy()
+
+class ThresholdRule:
+    """``thresholds:`` entry: a numeric ``field`` at or above ``alert`` is ALERT, else at
+    or above ``warn`` WARN. Reported in ``reasons[field]`` as ``(level, value, threshold)``."""
+    __slots__ = ("id", "field", "warn", "alert", "fields", "required")
+    stateful = False
+
+    def __init__(self, field: str, warn=None, alert=None):
+        self.id = self.field = field
+        self.warn = warn
+        self.alert = alert
+        self.fields = (field,)
+        self.required = frozenset(self.fields)
+
+    def check(self, event: Dict):
+        v = event.get(self.field)
+        if not isinstance(v, (int, float)):
+            return None
+        if self.alert is not None and v >= self.alert:
+            return 2, ("ALERT", v, self.alert)
+        if self.warn is not None and v >= self.warn:
+            return 1, ("WARN", v, self.warn)
+        return None
+
+    def check_batch(self, table):
+        """``(level per row, value, threshold)`` arrays; level 0 where the rule does not fire."""
+        v = rule_values(table, self.field)
+        alert = np.nan if self.alert is None else self.alert
+        warn = np.nan if self.warn is None else self.warn
+        with np.errstate(invalid="ignore"):
+            is_alert = v >= alert
+            hit = np.where(is_alert, 2, np.where(v >= warn, 1, 0)).astype(np.int8)
+        return hit, v, np.where(is_alert, alert, warn)
+
+class ExprRule:
+    """Declared rule: ``id``, ``when`` (see ``expr.py``) and the ``level`` it raises.
+    Reported in ``reasons[id]`` as ``(level, value of its first field, None)``."""
+    __slots__ = ("id", "level", "expr", "fields", "required")
+    stateful = False
+
+    def __init__(self, rule_id: str, when: str, level: str = "ALERT"):
+        if level not in _LEVEL_INDEX or level == "NONE":
+            raise ValueError(f"rule {rule_id!r}: level must be one of {LEVELS[1:]}, got {level!r}")
+        self.id = rule_id
+        self.level = level
+        self.expr = compile_expr(str(when))
+        self.fields = self.expr.fields
+        self.required = self.expr.required
+
+    def check(self, event: Dict):
+        if not self.expr.fn(event):
+            return None
+        v = event.get(self.fields[0]) if self.fields else None
+        return _LEVEL_INDEX[self.level], (self.level, v if isinstance(v, (int, float)) else None, None)
+
+    def check_batch(self, table):
+        hit = np.where(self.expr.vec(table), _LEVEL_INDEX[self.level], 0).astype(np.int8)
+        v = rule_values(table, self.fields[0]) if self.fields else np.full(table.num_rows, np.nan)
+        return hit, v, None
+
+class RuleSet:
+    """Rules of one asset, indexed by field.
+
+    A rule that needs a field to be present to fire is filed under one such
+    field, so an event only evaluates the rules filed under its non-null
+    fields (plus those that can fire without any); rules on signals the event
+    does not carry cost nothing. Reasons keep the rules' declaration order.
+    Windowed rules (``windows.py``) are evaluated only when a ``WindowState``
+    is passed, i.e. on the streaming path of ``CompiledPolicy``.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._index = {}
+        self._always = []
+        for i, rule in enumerate(self.rules):
+            anchor = next((f for f in rule.fields if f in rule.required), None)
+            if anchor is None:
+                self._always.append(i)
+            else:
+                self._index.setdefault(anchor, []).append(i)
+
+    @property
+    def signatures(self) -> list:
+        return [r.signature for r in self.rules if r.stateful]
+
+    def evaluate(self, event: Dict, state=None) -> Tuple[str, Dict]:
+        index = self._index
+        candidates = list(self._always)
+        keys = event if len(event) < len(index) else index
+        for k in keys:
+            if k in index and k in event and event[k] is not None:
+                candidates.extend(index[k])
+        candidates.sort()
+        level = 0
+        reasons = {}
+        rules = self.rules
+        for i in candidates:
+            rule = rules[i]
+            if rule.stateful:
+                hit = rule.check_window(event, state) if state is not None else None
+            else:
+                hit = rule.check(event)
+            if hit is not None:
+                level = max(level, hit[0])
+                reasons.setdefault(rules[i].id, []).append(hit[1])
+        if event.get("anomaly") is True:
+            level = max(level, 2)
+        return LEVELS[level], reasons
+
+    def evaluate_batch(self, table):
+        """Column form of ``evaluate``: level (index into ``LEVELS``) per row and the
+        ``(position, rule id, level per row, value, threshold)`` of every rule that fired.
+        Windowed rules are skipped, as in ``evaluate()`` without a state."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        n = table.num_rows
+        level = np.zeros(n, dtype=np.int8)
+        fired = []
+        columns = set(table.column_names)
+        for i, rule in enumerate(self.rules):
+            if rule.stateful or not rule.required <= columns:
+                continue  # a field it needs is absent from every row
+            hit, value, threshold = rule.check_batch(table)
+            if hit.any():
+                level = np.maximum(level, hit)
+                fired.append((i, rule.id, hit, value, threshold))
+        if "anomaly" in columns and pa.types.is_boolean(table["anomaly"].type):
+            anomaly = pc.fill_null(table["anomaly"], False).to_numpy(zero_copy_only=False)
+            level = np.where(anomaly, np.maximum(level, 2), level).astype(np.int8)
+        return level, fired
+
+def threshold_rules(thresholds: Dict) -> list:
+    return [ThresholdRule(field, th.get("warn"), th.get("alert")) for field, th in (thresholds or {}).items()]
+
 def evaluate_rule(event: Dict, thresholds: Dict) -> Tuple[str, Dict]:
-    level = "NONE"
-    reasons = {}
-    t = event.get("temperature")
-    if isinstance(t, (int, float)) and "temperature" in thresholds:
-        th = thresholds["temperature"]
-        w = th.get("warn")
-        a = th.get("alert")
-        if a is not None and t >= a:
-            level = _compare_level(level, "ALERT")
-            reasons.setdefault("temperature", []).append(("ALERT", t, a))
-        elif w is not None and t >= w:
-            level = _compare_level(level, "WARN")
-            reasons.setdefault("temperature", []).append(("WARN", t, w))
-    v = event.get("vibration")
-    if isinstance(v, (int, float)) and "vibration" in thresholds:
-        th = thresholds["vibration"]
-        w = th.get("warn")
-        a = th.get("alert")
-        if a is not None and v >= a:
-            level = _compare_level(level, "ALERT")
-            reasons.setdefault("vibration", []).append(("ALERT", v, a))
-        elif w is not None and v >= w:
-            level = _compare_level(level, "WARN")
-            reasons.setdefault("vibration", []).append(("WARN", v, w))
-    if event.get("anomaly") is True:
-        level = _compare_level(level, "ALERT")
-    return level, reasons
+    return RuleSet(threshold_rules(thresholds)).evaluate(event)
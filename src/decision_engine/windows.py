@@ -0,0 +1,242 @@
+import array
+import collections
+import datetime
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict
+import numpy as np
+
+# Stateful rules over a sliding time window of one field per asset:
+#   value  the current value (with for_n/clear: consecutive violations, hysteresis)
+#   mean   rolling mean          rms   rolling root mean square
+#   max    rolling maximum       rate  (newest - oldest) / seconds between them
+WINDOW_STATS = ("value", "mean", "max", "rms", "rate")
+
+def event_time(event: Dict) -> float:
+    """Event time in epoch seconds from ``ts`` (ISO string, epoch s or ms); now if absent."""
+    ts = event.get("ts")
+    if isinstance(ts, str):
+        try:
+            dt = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return time.time()
+        return (dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)).timestamp()
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        return ts / 1000.0 if ts > 1e11 else float(ts)
+    return time.time()
+
+class _Ring:
+    """Ring buffers of one window rule for all assets: row ``r`` is one asset.
+
+    Each row keeps up to ``capacity`` ``(time, value)`` samples (flat typed
+    arrays, row-major) plus running sums (mean/RMS), a monotonic queue of
+    sample sequence numbers (max) and the rule's streak/active flags, so a
+    push and every statistic are O(1) (amortized for evictions). Rows are
+    added by doubling up to ``max_assets``; past that the row of the least
+    recently updated asset is reused (``slots`` is kept in LRU order, so
+    that is O(1) too). Memory is at most ``max_assets * capacity * 24``
+    bytes plus ~50 bytes per row.
+    """
+
+    _SAMPLES = (("ts", "d"), ("val", "d"), ("mq", "q"))
+    _ROWS = (("seq", "q"), ("count", "i"), ("sum", "d"), ("sumsq", "d"), ("mq_head", "i"), ("mq_len", "i"),
+             ("streak", "i"), ("active", "b"))
+
+    def __init__(self, capacity: int, max_assets: int, rows: int = 16):
+        self.capacity = max(2, int(capacity))
+        self.max_assets = max(1, int(max_assets))
+        self.slots = collections.OrderedDict()  # asset id -> row, least recently updated first
+        self.rows = 0
+        for name, code in self._SAMPLES + self._ROWS:
+            setattr(self, name, array.array(code))
+        self._grow(min(rows, self.max_assets))
+
+    def _grow(self, rows: int):
+        add = rows - self.rows
+        for name, code in self._SAMPLES:
+            getattr(self, name).extend(array.array(code, bytes(array.array(code).itemsize * add * self.capacity)))
+        for name, code in self._ROWS:
+            getattr(self, name).extend(array.array(code, bytes(array.array(code).itemsize * add)))
+        self.rows = rows
+
+    def row(self, asset) -> int:
+        r = self.slots.get(asset)
+        if r is not None:
+            self.slots.move_to_end(asset)
+            return r
+        if len(self.slots) == self.rows:
+            if self.rows < self.max_assets:
+                self._grow(min(self.max_assets, 2 * self.rows))
+            else:  # full: recycle the row of the asset updated least recently
+                _, r = self.slots.popitem(last=False)
+                for name, _ in self._ROWS:
+                    getattr(self, name)[r] = 0
+                self.slots[asset] = r
+                return r
+        r = self.slots[asset] = len(self.slots)
+        return r
+
+    def _pop_oldest(self, r: int):
+        c, base = self.capacity, r * self.capacity
+        old_seq = self.seq[r] - self.count[r]
+        v = self.val[base + old_seq % c]
+        self.sum[r] -= v
+        self.sumsq[r] -= v * v
+        self.count[r] -= 1
+        if self.mq_len[r] and self.mq[base + self.mq_head[r]] == old_seq:
+            self.mq_head[r] = (self.mq_head[r] + 1) % c
+            self.mq_len[r] -= 1
+
+    def push(self, r: int, t: float, v: float, window_s: float):
+        c, base = self.capacity, r * self.capacity
+        ts, val, mq = self.ts, self.val, self.mq
+        s = self.seq[r]
+        if self.count[r]:
+            t = max(t, ts[base + (s - 1) % c])  # late events count as "now"
+        while self.count[r] and ts[base + (s - self.count[r]) % c] < t - window_s:
+            self._pop_oldest(r)
+        if self.count[r] == c:
+            self._pop_oldest(r)
+        ts[base + s % c] = t
+        val[base + s % c] = v
+        self.seq[r] = s + 1
+        self.count[r] += 1
+        self.sum[r] += v
+        self.sumsq[r] += v * v
+        head, n = self.mq_head[r], self.mq_len[r]
+        while n and val[base + mq[base + (head + n - 1) % c] % c] <= v:
+            n -= 1
+        mq[base + (head + n) % c] = s
+        self.mq_len[r] = n + 1
+
+    def stat(self, r: int, stat: str):
+        c, base, n = self.capacity, r * self.capacity, self.count[r]
+        newest = base + (self.seq[r] - 1) % c
+        if stat == "value":
+            return self.val[newest]
+        if stat == "mean":
+            return self.sum[r] / n
+        if stat == "rms":
+            return math.sqrt(max(0.0, self.sumsq[r] / n))
+        if stat == "max":
+            return self.val[base + self.mq[base + self.mq_head[r]] % c]
+        oldest = base + (self.seq[r] - n) % c  # rate
+        dt = self.ts[newest] - self.ts[oldest]
+        return (self.val[newest] - self.val[oldest]) / dt if n > 1 and dt > 0 else None
+
+    def arrays(self) -> Dict:
+        return {name: np.frombuffer(getattr(self, name), dtype=code) for name, code in self._SAMPLES + self._ROWS}
+
+    def restore(self, arrays: Dict, rows: int):
+        """Fill the first ``rows`` rows from ``arrays()`` output of a ring with the same capacity."""
+        self._grow(max(self.rows, rows))
+        for name, code in self._SAMPLES + self._ROWS:
+            n = rows * (self.capacity if (name, code) in self._SAMPLES else 1)
+            getattr(self, name)[:n] = array.array(code, np.ascontiguousarray(arrays[name][:n], dtype=code).tobytes())
+
+class WindowRule:
+    """Declared windowed rule: ``stat`` of ``field`` over the last ``window_s`` seconds
+    (at most ``capacity`` samples) against ``above`` (stat >= above) or ``below``
+    (stat <= below).
+
+    ``for_n`` consecutive violating events are needed to fire (debounce);
+    with ``clear`` the rule stays fired until the stat is back past it
+    (hysteresis). Reported in ``reasons[id]`` as ``(level, stat, threshold)``.
+    Needs a ``WindowState`` (``CompiledPolicy``); stateless evaluation skips it.
+    """
+    stateful = True
+
+    def __init__(self, rule_id: str, field: str, stat: str = "value", window_s: float = 60, above=None, below=None,
+                 clear=None, for_n: int = 1, level: str = "ALERT", capacity: int = 128, min_samples: int = 1):
+        if stat not in WINDOW_STATS:
+            raise ValueError(f"rule {rule_id!r}: stat must be one of {WINDOW_STATS}, got {stat!r}")
+        if (above is None) == (below is None):
+            raise ValueError(f"rule {rule_id!r}: set exactly one of 'above' or 'below'")
+        from .rules import LEVELS
+        if level not in LEVELS[1:]:
+            raise ValueError(f"rule {rule_id!r}: level must be one of {LEVELS[1:]}, got {level!r}")
+        self.id = rule_id
+        self.field = field
+        self.stat = stat
+        self.window_s = float(window_s)
+        self.above, self.below, self.clear = above, below, clear
+        self.for_n = max(1, int(for_n))
+        self.level = level
+        self.level_index = LEVELS.index(level)
+        self.capacity = int(capacity)
+        self.min_samples = max(2 if stat == "rate" else 1, int(min_samples))
+        self.fields = (field,)
+        self.required = frozenset(self.fields)
+        # state is kept per signature: changing the window drops it, other edits keep it warm
+        self.signature = f"{rule_id}|{field}|{stat}|{self.window_s:g}|{self.capacity}"
+
+    def check_window(self, event: Dict, state: "WindowState"):
+        v = event.get(self.field)
+        if not isinstance(v, (int, float)):
+            return None
+        with state.lock:
+            ring = state.ring(self)
+            r = ring.row(event.get("source"))
+            ring.push(r, event_time(event), float(v), self.window_s)
+            s = ring.stat(r, self.stat) if ring.count[r] >= self.min_samples else None
+            if s is None:
+                return None
+            limit = self.above if self.above is not None else self.below
+            violating = s >= limit if self.above is not None else s <= limit
+            ring.streak[r] = ring.streak[r] + 1 if violating else 0
+            if ring.active[r] and self.clear is not None:
+                ring.active[r] = s >= self.clear if self.above is not None else s <= self.clear
+            else:
+                ring.active[r] = ring.streak[r] >= self.for_n
+            if not ring.active[r]:
+                return None
+        return self.level_index, (self.level, s, limit)
+
+class WindowState:
+    """Per-asset window buffers of all windowed rules, snapshotted to an ``.npz`` file."""
+
+    def __init__(self, max_assets: int = 4096):
+        self.max_assets = max(1, int(max_assets))
+        self.rings = {}  # rule signature -> _Ring
+        self.lock = threading.Lock()
+
+    def ring(self, rule: WindowRule) -> _Ring:
+        ring = self.rings.get(rule.signature)
+        if ring is None:
+            ring = self.rings[rule.signature] = _Ring(rule.capacity, self.max_assets)
+        return ring
+
+    def retain(self, signatures):
+        """Drop the buffers of rules that no longer exist (after a policy reload)."""
+        with self.lock:
+            for sig in set(self.rings) - set(signatures):
+                del self.rings[sig]
+
+    def save(self, path: str):
+        """Write a snapshot atomically (``path`` via ``.tmp`` + rename)."""
+        with self.lock:
+            meta = {sig: {"capacity": ring.capacity, "slots": list(ring.slots.items())} for sig, ring in self.rings.items()}
+            arrays = {f"{i}.{name}": arr.copy() for i, ring in enumerate(self.rings.values())
+                      for name, arr in ring.arrays().items()}
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, _meta=np.array(json.dumps(list(meta.items()))), **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        """Restore a snapshot written by ``save()``; rows beyond ``max_assets`` are dropped."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["_meta"]))
+            rings = {}
+            for i, (sig, m) in enumerate(meta):
+                slots = collections.OrderedDict((a, r) for a, r in m["slots"] if r < self.max_assets)
+                ring = _Ring(m["capacity"], self.max_assets)
+                rows = min(self.max_assets, len(data[f"{i}.seq"]))
+                ring.restore({name: data[f"{i}.{name}"] for name in ring.arrays()}, rows)
+                ring.slots = slots
+                rings[sig] = ring
+        with self.lock:
+            self.rings = rings
@@ -0,0 +1,132 @@
+# src/decision_stage.py
+import collections
+import datetime
+import json
+import threading
+import time
+import paho.mqtt.client as mqtt
+from .decision_engine.compiled import CompiledPolicy
+from .hot_writer import HotFileWriter
+from .ingest_queue import IngestQueue
+
+class DecisionStage:
+    """Evaluate incoming events inline and append results to a decisions hot stream.
+
+    ``submit()`` is cheap enough for the MQTT network thread: it only enqueues
+    into a bounded drop-oldest queue (newest events matter most for alerting).
+    A single thread drains it in micro-batches of up to ``batch_size`` events
+    or ``max_delay_ms`` after the first event of a batch, evaluates them with
+    a ``CompiledPolicy`` (resolved once, model cached, hot-reloaded when built
+    from a file) and group-commits the decisions.
+    Ingest→decision latency is recorded per event (``latency_ms``) and
+    summarised by ``stats()``.
+    """
+
+    def __init__(self, policy, writer: HotFileWriter, batch_size: int = 100, max_delay_ms: float = 5,
+                 topics=None, maxsize: int = 10000, model=None):
+        self.policy = policy if isinstance(policy, CompiledPolicy) else CompiledPolicy(policy=policy, model=model)
+        self.writer = writer
+        self.batch_size = max(1, int(batch_size))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self.topics = list(topics or [])
+        self.q = IngestQueue(maxsize=maxsize, policy="drop_oldest")
+        self._latencies = collections.deque(maxlen=4096)
+        self.decided = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="decision-stage", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, item):
+        """Enqueue a ``(ts, topic, payload)`` tuple if its topic is selected."""
+        if self.topics and not any(mqtt.topic_matches_sub(t, item[1]) for t in self.topics):
+            return
+        self.q.put(item)
+
+    def close(self):
+        self.q.close()
+        self._thread.join()
+        self.writer.close()
+        self.policy.close()
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        out = {"decided": self.decided, "errors": self.errors, "dropped": self.q.dropped, "depth": len(self.q)}
+        if lat:
+            out.update({
+                "latency_ms_p50": round(lat[len(lat) // 2], 3),
+                "latency_ms_p99": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))], 3),
+                "latency_ms_max": round(lat[-1], 3),
+            })
+        return out
+
+    def _next_batch(self) -> list:
+        batch = self.q.get_batch(self.batch_size, timeout=min(self.writer.max_interval, 1.0) or 0.1)
+        if not batch:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = self.q.get_batch(self.batch_size - len(batch), timeout=remaining)
+            if not more:
+                break
+            batch.extend(more)
+        return batch
+
+    def _decide_batch(self, batch: list) -> list:
+        """``(ts, topic, event, result)`` per decodable event, the model run once per batch."""
+        items = []
+        for ts, topic, payload in batch:
+            try:
+                items.append((ts, topic, json.loads(payload)))
+            except Exception as e:
+                self.errors += 1
+                print(f"[decisions] ERROR evaluating {topic}:", e)
+        out = []
+        for (ts, topic, event), res in zip(items, self.policy.decide_many([event for _, _, event in items])):
+            if isinstance(res, Exception):
+                self.errors += 1
+                print(f"[decisions] ERROR evaluating {topic}:", res)
+            else:
+                out.append((ts, topic, event, res))
+        return out
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self.q.closed:
+                    return
+                self.writer.flush_if_due()
+                continue
+            out = []
+            for ts, topic, event, res in self._decide_batch(batch):
+                now = datetime.datetime.utcnow()
+                latency_ms = (now - ts).total_seconds() * 1000.0
+                self._latencies.append(latency_ms)
+                rec = {
+                    "ts": event.get("ts"),
+                    "decided_at": now.isoformat() + "Z",
+                    "source": event.get("source"),
+                    "topic": topic,
+                    **res,
+                    "latency_ms": round(latency_ms, 3),
+                }
+                out.append((json.dumps(rec, separators=(",", ":")).encode("utf-8") + b"\n", now))
+            self.decided += len(out)
+            self.writer.append_many(out)
+
+def make_decision_stage(dc: dict, writer: HotFileWriter) -> DecisionStage:
+    return DecisionStage(
+        CompiledPolicy(dc.get("policy", "src/decision_engine/policies.yaml"), reload_s=dc.get("reload_s", 1.0),
+                       state_path=dc.get("state_path"), snapshot_s=dc.get("snapshot_s", 60),
+                       max_assets=dc.get("max_assets", 4096)),
+        writer,
+        batch_size=dc.get("batch_size", 100),
+        max_delay_ms=dc.get("max_delay_ms", 5),
+        topics=dc.get("topics"),
+        maxsize=dc.get("queue_maxsize", 10000),
+    )
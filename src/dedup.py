@@ -0,0 +1,54 @@
+# src/dedup.py
+import collections
+import hashlib
+import threading
+
+def line_id(line: bytes) -> int:
+    """Compact 64-bit id of an encoded hot-file line (what redeliveries will reproduce)."""
+    return int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little")
+
+class RecentIds:
+    """Bounded LRU of recently written message ids for at-least-once de-duplication.
+
+    Fresh messages are only recorded (``add``); redeliveries are looked up
+    (``seen``), since identical bodies may well be distinct publishes.
+
+    Holds at most ``capacity`` 64-bit ids, so memory stays fixed (roughly
+    100 bytes per entry) however long the collector runs.
+    """
+
+    def __init__(self, capacity: int = 100000):
+        self.capacity = max(1, int(capacity))
+        self._ids = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, key: int):
+        """Record ``key`` (a freshly written line) without checking it."""
+        with self._lock:
+            self._ids[key] = None
+            self._ids.move_to_end(key)
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+    def seen(self, key: int) -> bool:
+        """Record ``key``; return True if it was already present."""
+        with self._lock:
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                self.duplicates += 1
+                return True
+            self._ids[key] = None
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+            return False
+
+    def warm(self, lines):
+        """Seed from lines already on disk (e.g. the tail of today's hot file after a restart)."""
+        for line in lines:
+            if line.strip():
+                self.seen(line_id(line if line.endswith(b"\n") else line + b"\n"))
+        self.duplicates = 0
@@ -0,0 +1,210 @@
+# src/hot_writer.py
+import collections
+import datetime
+import os
+import pathlib
+import threading
+import time
+
+FSYNC_POLICIES = ("none", "commit")
+
+def _next_utc_midnight(ts_utc: datetime.datetime) -> datetime.datetime:
+    day = datetime.datetime(ts_utc.year, ts_utc.month, ts_utc.day)
+    return day + datetime.timedelta(days=1)
+
+class HotFileWriter:
+    """Long-lived append handle for a daily hot file with group commit.
+
+    Lines are buffered in memory and written in one ``write()`` once
+    ``max_bytes`` are pending or ``max_interval_ms`` has passed since the last
+    commit. ``fsync="commit"`` additionally fsyncs after every group commit.
+    The handle is rolled over when ``ts`` crosses UTC midnight; the path for the
+    new day comes from ``path_for(ts)``. ``opener(path)`` returns the binary
+    append handle (default: a plain file; see ``common.zstd_frames`` for the
+    compressed format). ``on_commit(acks)`` is called after each group commit
+    (and its fsync) with the ack tokens passed to ``append_many`` for the
+    lines it contained, so callers can acknowledge only durable writes.
+    """
+
+    def __init__(self, path_for, max_bytes: int = 1 << 20, max_interval_ms: int = 1000, fsync: str = "none",
+                 opener=None, on_commit=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self._path_for = path_for
+        self._opener = opener or (lambda p: p.open("ab"))
+        self.on_commit = on_commit
+        self._acks = []
+        self.max_bytes = int(max_bytes)
+        self.max_interval = max(0, int(max_interval_ms)) / 1000.0
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._fh = None
+        self._path = None
+        self._roll_at = None
+        self._buf = []
+        self._buf_bytes = 0
+        self._last_commit = time.monotonic()
+        self.lines_written = 0
+        self.commits = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    def append(self, data: bytes, ts_utc: datetime.datetime):
+        """Buffer one record (``data`` must include its trailing newline)."""
+        with self._lock:
+            if self._fh is None or ts_utc >= self._roll_at:
+                self._roll_locked(ts_utc)
+            self._buf.append(data)
+            self._buf_bytes += len(data)
+            if self._buf_bytes >= self.max_bytes or time.monotonic() - self._last_commit >= self.max_interval:
+                self._commit_locked()
+
+    def append_many(self, records, acks=None):
+        """Buffer ``(data, ts)`` pairs under a single lock acquisition.
+
+        ``acks`` are handed to ``on_commit`` once everything buffered so far is
+        committed.
+        """
+        with self._lock:
+            for data, ts_utc in records:
+                if self._fh is None or ts_utc >= self._roll_at:
+                    self._roll_locked(ts_utc)
+                self._buf.append(data)
+                self._buf_bytes += len(data)
+                if self._buf_bytes >= self.max_bytes:
+                    self._commit_locked()
+            # registered last so that a commit triggered above never acks lines still buffered
+            if acks:
+                self._acks.extend(acks)
+            if (self._buf or self._acks) and time.monotonic() - self._last_commit >= self.max_interval:
+                self._commit_locked()
+
+    def flush_if_due(self):
+        """Commit pending lines if the time threshold has passed (call from an idle loop)."""
+        with self._lock:
+            if (self._buf or self._acks) and time.monotonic() - self._last_commit >= self.max_interval:
+                self._commit_locked()
+
+    def flush(self):
+        with self._lock:
+            self._commit_locked()
+
+    def close(self):
+        with self._lock:
+            self._commit_locked()
+            self._close_locked()
+
+    def _roll_locked(self, ts_utc: datetime.datetime):
+        path = pathlib.Path(self._path_for(ts_utc))
+        self._roll_at = _next_utc_midnight(ts_utc)
+        if path == self._path and self._fh is not None:
+            return
+        self._commit_locked()
+        self._close_locked()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self._opener(path)
+        self._path = path
+
+    def _commit_locked(self):
+        self._last_commit = time.monotonic()
+        if self._buf and self._fh is not None:
+            self._fh.write(b"".join(self._buf))
+            self._fh.flush()
+            if self.fsync == "commit":
+                os.fsync(self._fh.fileno())
+            self.lines_written += len(self._buf)
+            self.commits += 1
+            self._buf = []
+            self._buf_bytes = 0
+        if self._acks and not self._buf:
+            acks, self._acks = self._acks, []
+            if self.on_commit is not None:
+                self.on_commit(acks)
+
+    def _close_locked(self):
+        if self._fh is not None:
+            if self.fsync != "none":
+                os.fsync(self._fh.fileno())
+            self._fh.close()
+        self._fh = None
+
+class HotWriterPool:
+    """HotFileWriters keyed by partition, with a bounded LRU of open handles.
+
+    ``append_many`` takes ``(data, ts, key)`` triples; ``make_writer(key)``
+    builds the writer for a partition on first use. When more than
+    ``max_open`` partitions are open, the least recently used one is committed
+    and closed (it is reopened in append mode if it shows up again). Acks are
+    handed to ``on_commit`` after every writer holding lines of that batch has
+    committed.
+    """
+
+    def __init__(self, make_writer, max_open: int = 64, max_interval_ms: int = 1000, on_commit=None):
+        self._make_writer = make_writer
+        self.max_open = max(1, int(max_open))
+        self.max_interval = max(0, int(max_interval_ms)) / 1000.0
+        self.on_commit = on_commit
+        self._lock = threading.Lock()
+        self._open = collections.OrderedDict()
+        self._closed_lines = 0
+        self._closed_commits = 0
+        self.evictions = 0
+
+    @property
+    def lines_written(self) -> int:
+        return self._closed_lines + sum(w.lines_written for w in list(self._open.values()))
+
+    @property
+    def commits(self) -> int:
+        return self._closed_commits + sum(w.commits for w in list(self._open.values()))
+
+    def append_many(self, records, acks=None):
+        groups = collections.defaultdict(list)
+        for data, ts_utc, key in records:
+            groups[key].append((data, ts_utc))
+        with self._lock:
+            touched = []
+            for key, recs in groups.items():
+                # append before the next lookup: opening a partition may evict (close) this one
+                w = self._writer_locked(key)
+                w.append_many(recs)
+                touched.append(w)
+            if acks:
+                for w in touched:
+                    w.flush()  # no-op for writers already evicted (closed = committed)
+                if self.on_commit is not None:
+                    self.on_commit(list(acks))
+
+    def flush_if_due(self):
+        with self._lock:
+            for w in self._open.values():
+                w.flush_if_due()
+
+    def flush(self):
+        with self._lock:
+            for w in self._open.values():
+                w.flush()
+
+    def close(self):
+        with self._lock:
+            while self._open:
+                self._evict_locked()
+
+    def _writer_locked(self, key) -> HotFileWriter:
+        w = self._open.get(key)
+        if w is None:
+            w = self._open[key] = self._make_writer(key)
+            while len(self._open) > self.max_open:
+                self._evict_locked()
+                self.evictions += 1
+        else:
+            self._open.move_to_end(key)
+        return w
+
+    def _evict_locked(self):
+        _, w = self._open.popitem(last=False)
+        w.close()
+        self._closed_lines += w.lines_written
+        self._closed_commits += w.commits
@@ -0,0 +1,147 @@
+# src/ingest_queue.py
+import collections
+import datetime
+import pathlib
+import struct
+import threading
+import time
+
+POLICIES = ("block", "drop_oldest", "spill")
+
+# spill record: epoch seconds (float64), topic length, payload length
+_SPILL_HDR = struct.Struct("<dHI")
+
+class IngestQueue:
+    """Bounded hand-off between the MQTT network thread and writer threads.
+
+    Items are ``(ts, topic, payload)`` tuples. When the queue is full the
+    configured policy applies:
+
+    - ``block``: the producer waits (TCP backpressure towards the broker)
+    - ``drop_oldest``: the oldest queued item is discarded
+    - ``spill``: items overflow to an append-only file in ``spill_dir`` and are
+      replayed in order once the in-memory queue has drained
+    """
+
+    def __init__(self, maxsize: int = 10000, policy: str = "block", spill_dir=None, spill_name: str = "ingest.spill"):
+        if policy not in POLICIES:
+            raise ValueError(f"queue policy must be one of {POLICIES}, got {policy!r}")
+        if policy == "spill" and not spill_dir:
+            raise ValueError("queue policy 'spill' requires spill_dir")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._dq = collections.deque()
+        self._cv = threading.Condition()
+        self._closed = False
+        self._spill_path = None
+        self._spill_w = None
+        self._spill_r = None
+        self._spill_pending = 0
+        if policy == "spill":
+            d = pathlib.Path(spill_dir)
+            d.mkdir(parents=True, exist_ok=True)
+            self._spill_path = d / spill_name
+        self.enqueued = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._dq)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, item):
+        with self._cv:
+            if self._closed:
+                self.dropped += 1
+                return
+            if self._spill_pending:
+                # keep FIFO order: everything goes to disk until the spill is replayed
+                self._spill_locked(item)
+            elif len(self._dq) >= self.maxsize:
+                if self.policy == "block":
+                    while len(self._dq) >= self.maxsize and not self._closed:
+                        self._cv.wait()
+                    self._dq.append(item)
+                elif self.policy == "drop_oldest":
+                    self._dq.popleft()
+                    self.dropped += 1
+                    self._dq.append(item)
+                else:
+                    self._spill_locked(item)
+            else:
+                self._dq.append(item)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._dq))
+            self._cv.notify_all()
+
+    def get_batch(self, max_items: int, timeout: float = None) -> list:
+        """Return up to ``max_items`` items, waiting at most ``timeout`` seconds for the first.
+
+        Returns an empty list on timeout, or once the queue is closed and drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while not self._dq and not self._spill_pending and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._cv.wait(remaining)
+            if self._dq:
+                n = min(max_items, len(self._dq))
+                batch = [self._dq.popleft() for _ in range(n)]
+            elif self._spill_pending:
+                batch = self._unspill_locked(max_items)
+            else:
+                batch = []
+            self._cv.notify_all()
+            return batch
+
+    def close(self):
+        """Stop accepting items and wake all waiters; queued items can still be drained."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {
+                "depth": len(self._dq),
+                "max_depth": self.max_depth,
+                "spill_pending": self._spill_pending,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+            }
+
+    def _spill_locked(self, item):
+        ts, topic, payload = item
+        if self._spill_w is None:
+            self._spill_w = self._spill_path.open("wb")
+            self._spill_r = self._spill_path.open("rb")
+        t = topic.encode("utf-8")
+        epoch = ts.replace(tzinfo=datetime.timezone.utc).timestamp()
+        self._spill_w.write(_SPILL_HDR.pack(epoch, len(t), len(payload)) + t + payload)
+        self._spill_pending += 1
+        self.spilled += 1
+
+    def _unspill_locked(self, max_items: int) -> list:
+        self._spill_w.flush()
+        out = []
+        while self._spill_pending and len(out) < max_items:
+            epoch, tlen, plen = _SPILL_HDR.unpack(self._spill_r.read(_SPILL_HDR.size))
+            topic = self._spill_r.read(tlen).decode("utf-8")
+            payload = self._spill_r.read(plen)
+            ts = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).replace(tzinfo=None)
+            out.append((ts, topic, payload))
+            self._spill_pending -= 1
+        if not self._spill_pending:
+            # caught up with the producer: start a fresh spill file next time
+            self._spill_w.close()
+            self._spill_r.close()
+            self._spill_w = self._spill_r = None
+            self._spill_path.unlink(missing_ok=True)
+        return out
@@ -0,0 +1,126 @@
+# src/pbstream.py
+import functools
+
+@functools.lru_cache(maxsize=None)
+def temperature_reading_class():
+    """Message class for ``edgeai.TemperatureReading``.
+
+    Mirrors proto/temperature.proto; built at runtime so no protoc/generated
+    code (and no gencode/runtime version pinning) is needed on the gateway.
+    """
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+    fdp = descriptor_pb2.FileDescriptorProto(name="temperature.proto", package="edgeai", syntax="proto3")
+    msg = fdp.message_type.add(name="TemperatureReading")
+    F = descriptor_pb2.FieldDescriptorProto
+    for name, number, ftype in (
+        ("device_id", 1, F.TYPE_STRING),
+        ("site", 2, F.TYPE_STRING),
+        ("ts_ms", 3, F.TYPE_INT64),
+        ("celsius", 4, F.TYPE_DOUBLE),
+        ("status", 5, F.TYPE_STRING),
+    ):
+        msg.field.add(name=name, number=number, type=ftype, label=F.LABEL_OPTIONAL)
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(fdp)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("edgeai.TemperatureReading"))
+
+def encode_varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def encode_delimited(payload: bytes) -> bytes:
+    """Frame one serialized message as ``varint(len) + payload`` (writeDelimitedTo layout)."""
+    return encode_varint(len(payload)) + payload
+
+def encode_temperature_frame(payload: bytes) -> bytes:
+    """Frame a serialized TemperatureReading after checking that it parses (``ValueError`` if not)."""
+    from google.protobuf.message import DecodeError
+
+    try:
+        temperature_reading_class().FromString(payload)
+    except DecodeError as e:
+        raise ValueError(f"not a TemperatureReading: {e}") from None
+    return encode_delimited(payload)
+
+def read_delimited(path, offset: int = 0, max_bytes: int = -1):
+    """Return ``(messages, end_offset)`` for the complete frames of a ``*.pbr`` file after ``offset``.
+
+    A truncated final frame (still being written, or torn by a crash) is not
+    returned and ``end_offset`` stops before it, so the next read resumes there.
+    With ``max_bytes`` only that much is read (keep it well above the largest
+    frame); call again from ``end_offset`` for the rest.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    frames = []
+    pos, end = 0, len(data)
+    while pos < end:
+        n = shift = 0
+        p = pos
+        complete = False
+        while p < end:
+            b = data[p]
+            p += 1
+            n |= (b & 0x7F) << shift
+            if not b & 0x80:
+                complete = True
+                break
+            shift += 7
+        if not complete or p + n > end:
+            break
+        frames.append(data[p:p + n])
+        pos = p + n
+    return frames, offset + pos
+
+def iter_delimited(path):
+    """Yield the serialized messages of a length-delimited ``*.pbr`` file."""
+    yield from read_delimited(path)[0]
+
+def decode_temperature_columns(frames, bad: list = None) -> dict:
+    """Decode TemperatureReading frames into column lists (no per-record dicts).
+
+    Frames that do not parse are skipped; their positions are appended to ``bad``.
+    """
+    from google.protobuf.message import DecodeError
+
+    device_id, site, ts_ms, celsius, status = [], [], [], [], []
+    msg = temperature_reading_class()()
+    for i, raw in enumerate(frames):
+        try:
+            msg.ParseFromString(raw)
+        except DecodeError:
+            if bad is not None:
+                bad.append(i)
+            continue
+        device_id.append(msg.device_id)
+        site.append(msg.site)
+        ts_ms.append(msg.ts_ms)
+        celsius.append(msg.celsius)
+        status.append(msg.status or None)
+    return {"device_id": device_id, "site": site, "ts_ms": ts_ms, "celsius": celsius, "status": status}
+
+def read_temperature_table(path):
+    """Read a ``*.pbr`` TemperatureReading stream into an Arrow table with a UTC ``ts`` column."""
+    return temperature_table(iter_delimited(path))
+
+def temperature_table(frames, bad: list = None):
+    """Arrow table for serialized TemperatureReading ``frames`` (undecodable ones skipped, see above)."""
+    import pyarrow as pa
+
+    cols = decode_temperature_columns(frames, bad)
+    return pa.table({
+        "device_id": pa.array(cols["device_id"], pa.string()),
+        "site": pa.array(cols["site"], pa.string()),
+        "ts": pa.array(cols["ts_ms"], pa.int64()).cast(pa.timestamp("ms", tz="UTC")),
+        "celsius": pa.array(cols["celsius"], pa.float64()),
+        "status": pa.array(cols["status"], pa.string()),
+    })
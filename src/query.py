@@ -0,0 +1,110 @@
+# src/query.py
+import json
+import pathlib
+import sys
+import yaml
+from .catalog import CATALOG, Catalog, epoch_ms
+
+FORMATS = ("csv", "jsonl", "arrow")
+
+def _files(batches_dir: pathlib.Path, prefix, start, end, device_id) -> list:
+    """Candidate Parquet files: pruned through the catalog when there is one."""
+    if (batches_dir / CATALOG).exists():
+        with Catalog(batches_dir, readonly=True) as cat:
+            return cat.files(start=start, end=end, device_id=device_id, prefix=prefix)
+    return sorted(batches_dir.rglob(f"{prefix}.*.parquet" if prefix else "*.parquet"))
+
+def _hive_keys(batches_dir: pathlib.Path, path: pathlib.Path) -> tuple:
+    return tuple(seg.split("=", 1)[0] for seg in path.parent.relative_to(batches_dir).parts if "=" in seg)
+
+def _sql_list(values) -> str:
+    return "[" + ", ".join("'" + v.replace("'", "''") + "'" for v in values) + "]"
+
+def _source_sql(batches_dir: pathlib.Path, files: list) -> str:
+    """``read_parquet`` over ``files``; one scan per hive layout (DuckDB rejects mixed
+    key sets, e.g. date=/hour= next to site=/device=/.../date=/hour=), unioned by name."""
+    groups = {}
+    for p in files:
+        groups.setdefault(_hive_keys(batches_dir, p), []).append(str(p))
+    scans = [f"SELECT * FROM read_parquet({_sql_list(g)}, hive_partitioning = true, union_by_name = true)"
+             for g in groups.values()]
+    return " UNION ALL BY NAME ".join(scans)
+
+def build_query(columns=None, start=None, end=None, device_id=None, limit=None):
+    """``(sql, params)`` for the filter form over the ``batches`` view.
+
+    Time bounds are also applied to the hive ``date`` column, so DuckDB skips
+    whole partitions; ``ts`` may be a timestamp or an ISO string column.
+    """
+    cols = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    where, params = [], []
+    if start is not None:
+        where += ["CAST(ts AS TIMESTAMPTZ) >= CAST(? AS TIMESTAMPTZ)", "date >= CAST(CAST(? AS TIMESTAMPTZ) AS DATE)"]
+        params += [start, start]
+    if end is not None:
+        where += ["CAST(ts AS TIMESTAMPTZ) < CAST(? AS TIMESTAMPTZ)", "date <= CAST(CAST(? AS TIMESTAMPTZ) AS DATE)"]
+        params += [end, end]
+    if device_id is not None:
+        where.append("device_id = ?")
+        params.append(device_id)
+    sql = f"SELECT {cols} FROM batches"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ts" if not columns or "ts" in columns else ""
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return sql, params
+
+def write_batches(reader, fmt: str, out):
+    """Stream Arrow record batches from ``reader`` to the binary stream ``out``."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    if fmt == "arrow":
+        with pa.ipc.new_stream(out, reader.schema) as w:
+            for batch in reader:
+                w.write_batch(batch)
+    elif fmt == "csv":
+        with pa_csv.CSVWriter(out, reader.schema) as w:
+            for batch in reader:
+                w.write_batch(batch)
+    elif fmt == "jsonl":
+        for batch in reader:
+            out.write("".join(json.dumps(row, default=str) + "\n" for row in batch.to_pylist()).encode("utf-8"))
+    else:
+        raise ValueError(f"format must be one of {FORMATS}, got {fmt!r}")
+
+def run_query(config_path: str, sql: str = None, columns=None, start=None, end=None, device_id=None,
+              prefix: str = "telemetry", fmt: str = "csv", limit: int = None, out=None, batch_rows: int = 65536):
+    """Query ``batches_dir`` with DuckDB and stream the result as CSV, JSONL or Arrow IPC.
+
+    The files are pruned by time range and device through the catalog
+    (``_catalog.sqlite``; without it all ``{prefix}.*.parquet`` files are
+    scanned) and exposed as the view ``batches`` with hive columns (``date``,
+    ``hour``, ...). ``sql`` runs as given against that view; otherwise a
+    projection/filter query is built from ``columns``/``start``/``end``/``device_id``.
+    """
+    import duckdb
+
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    batches_dir = pathlib.Path(cfg["storage"]["batches_dir"])
+    for name, v in (("start", start), ("end", end)):
+        if v is not None and epoch_ms(v) is None:
+            raise ValueError(f"{name} must be an ISO timestamp, got {v!r}")
+    files = _files(batches_dir, prefix, start, end, device_id)
+    if not files:
+        print("[query] no matching batch files in", batches_dir, file=sys.stderr)
+        return
+
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+    con.execute(f"CREATE VIEW batches AS {_source_sql(batches_dir, files)}")
+    if sql is None:
+        sql, params = build_query(columns, start, end, device_id, limit)
+    else:
+        params = []
+    res = con.execute(sql, params)
+    # to_arrow_reader() replaces fetch_record_batch() in newer DuckDB releases
+    reader = res.to_arrow_reader(batch_rows) if hasattr(res, "to_arrow_reader") else res.fetch_record_batch(batch_rows)
+    write_batches(reader, fmt, out if out is not None else sys.stdout.buffer)
@@ -0,0 +1,148 @@
+# src/rollups.py
+import os
+import pathlib
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .arrow_schema import cast_column
+from .sketch import bucket_keys, quantile
+
+GRAINS = {"1m": "minute", "1h": "hour"}
+DEFAULT_METRICS = ("celsius", "temperature", "vibration")
+DEFAULT_DEVICE_KEYS = ("device_id", "source")  # first column present names the device
+_KEYS = ["device_id", "bucket", "metric"]
+_PER_KEY = ["count", "sum", "min", "max"]
+
+def _collapse(per_key: pa.Table) -> pa.Table:
+    """Rollup rows from per sketch-key rows (``_KEYS``, ``k``, count/sum/min/max).
+
+    Stats and the sketch (parallel ``sketch_keys``/``sketch_counts`` lists) come
+    from one group-by, so list elements stay aligned.
+    """
+    per_key = per_key.group_by(_KEYS + ["k"]).aggregate([("count", "sum"), ("sum", "sum"), ("min", "min"), ("max", "max")])
+    per_key = per_key.rename_columns([{"count_sum": "count", "sum_sum": "sum", "min_min": "min", "max_max": "max"}.get(c, c)
+                                      for c in per_key.column_names])
+    out = per_key.group_by(_KEYS).aggregate([
+        ("count", "sum"), ("sum", "sum"), ("min", "min"), ("max", "max"), ("k", "list"), ("count", "list"),
+    ])
+    out = out.select(_KEYS + ["count_sum", "sum_sum", "min_min", "max_max", "k_list", "count_list"])
+    out = out.rename_columns(_KEYS + ["count", "sum", "min", "max", "sketch_keys", "sketch_counts"])
+    return out.sort_by([(k, "ascending") for k in _KEYS])
+
+def _device_column(names, device_keys=DEFAULT_DEVICE_KEYS):
+    """First of ``device_keys`` present in ``names`` (``None`` if there is none)."""
+    return next((k for k in device_keys if k in names), None)
+
+def aggregate(table: pa.Table, metrics, grain: str, device_keys=DEFAULT_DEVICE_KEYS):
+    """Partial rollup rows of raw ``table`` per device, ``grain`` bucket and metric.
+
+    The device is the first of ``device_keys`` found in ``table``; rollups
+    always call it ``device_id``. Long format: one row per metric with count,
+    sum, min, max and a quantile sketch. ``None`` if there is nothing to roll up.
+    """
+    key = _device_column(table.column_names, device_keys)
+    if "ts" not in table.column_names or key is None:
+        return None
+    device = cast_column(table[key], pa.string())
+    bucket = pc.floor_temporal(cast_column(table["ts"], pa.timestamp("ms", tz="UTC")), unit=GRAINS[grain])
+    parts = []
+    for m in metrics:
+        if m not in table.column_names:
+            continue
+        col = table[m]
+        if not (pa.types.is_integer(col.type) or pa.types.is_floating(col.type)):
+            continue
+        t = pa.table({"device_id": device, "bucket": bucket, "v": pc.cast(col, pa.float64())})
+        t = t.filter(pc.and_(pc.and_(pc.is_valid(t["v"]), pc.is_valid(t["bucket"])), pc.is_valid(t["device_id"])))
+        if not t.num_rows:
+            continue
+        v = t["v"]
+        parts.append(pa.table({
+            "device_id": t["device_id"], "bucket": t["bucket"], "metric": pa.array([m] * t.num_rows, pa.string()),
+            "k": bucket_keys(v), "count": pa.array([1] * t.num_rows, pa.int64()), "sum": v, "min": v, "max": v,
+        }))
+    if not parts:
+        return None
+    return _collapse(pa.concat_tables(parts))
+
+def write_rollups(part: pathlib.Path, batches_dir: pathlib.Path, rollups_dir: pathlib.Path, metrics=DEFAULT_METRICS,
+                  device_keys=DEFAULT_DEVICE_KEYS):
+    """Roll up one finished batch file into ``{rollups_dir}/{1m,1h}/<same relative path>``.
+
+    Rollup files mirror the raw part they come from, so re-writing a part
+    (a batch rerun) re-writes its rollups instead of double counting.
+    """
+    names = pq.read_schema(part).names
+    key = _device_column(names, device_keys)
+    if "ts" not in names or key is None:
+        print(f"[rollups] skipped {part.name}: no ts or device ({'/'.join(device_keys)}) column")
+        return
+    if not any(m in names for m in metrics):
+        print(f"[rollups] skipped {part.name}: none of the metrics {', '.join(metrics)}")
+        return
+    table = pq.read_table(part, columns=[c for c in ("ts", key, *metrics) if c in names])
+    rel = part.relative_to(batches_dir)
+    for grain in GRAINS:
+        agg = aggregate(table, metrics, grain, device_keys)
+        if agg is None:
+            continue
+        out = rollups_dir / grain / rel
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(out.name + ".inprogress")
+        pq.write_table(agg, tmp, compression="zstd")
+        os.replace(tmp, out)
+
+def merge_partials(table: pa.Table) -> pa.Table:
+    """Combine partial rollup rows per ``device_id``/``bucket``/``metric``; sketches merge exactly."""
+    if not table.num_rows:
+        return table
+    lengths = pc.list_value_length(table["sketch_keys"])
+    starts = pc.subtract(pc.cumulative_sum(lengths), lengths)
+    parents = pc.list_parent_indices(table["sketch_keys"])
+    n = len(parents)
+    # a row's sum is carried by its first sketch key only, so it is added once
+    first = pc.equal(pa.array(range(n), pa.int64()), pc.cast(starts.take(parents), pa.int64()))
+    per_key = pa.table({
+        "device_id": table["device_id"].take(parents),
+        "bucket": table["bucket"].take(parents),
+        "metric": table["metric"].take(parents),
+        "k": pc.list_flatten(table["sketch_keys"]),
+        "count": pc.list_flatten(table["sketch_counts"]),
+        "sum": pc.if_else(first, table["sum"].take(parents), 0.0),
+        "min": table["min"].take(parents),
+        "max": table["max"].take(parents),
+    })
+    return _collapse(per_key)
+
+def read_rollups(rollups_dir, grain: str = "1m", metrics=None, start=None, end=None,
+                 device_id=None, quantiles=(0.95,)) -> pa.Table:
+    """Merged rollups: ``device_id``, ``bucket``, ``metric``, ``count``, ``min``, ``max``,
+    ``mean`` and ``p95`` (one column per entry of ``quantiles``).
+
+    ``start``/``end`` (aware datetimes) select buckets in ``[start, end)``.
+    Only rollup files are read: no raw rows are scanned.
+    """
+    root = pathlib.Path(rollups_dir) / grain
+    cols = _KEYS + ["count", "min", "max", "mean"] + [f"p{round(q * 100):d}" for q in quantiles]
+    if not root.exists():
+        return pa.table({c: pa.array([]) for c in cols})
+    dataset = ds.dataset(root, format="parquet")  # bucket/device_id are columns; partition dirs only mirror batches
+    flt = None
+    ts_type = pa.timestamp("ms", tz="UTC")
+    for cond in (
+        ds.field("bucket") >= pa.scalar(start, ts_type) if start is not None else None,
+        ds.field("bucket") < pa.scalar(end, ts_type) if end is not None else None,
+        ds.field("device_id") == device_id if device_id is not None else None,
+        ds.field("metric").isin(list(metrics)) if metrics else None,
+    ):
+        if cond is not None:
+            flt = cond if flt is None else flt & cond
+    merged = merge_partials(dataset.to_table(columns=_KEYS + _PER_KEY + ["sketch_keys", "sketch_counts"], filter=flt))
+
+    out = merged.select(_KEYS + ["count", "min", "max"])
+    out = out.append_column("mean", pc.divide(merged["sum"], pc.cast(merged["count"], pa.float64())))
+    keys, counts = merged["sketch_keys"].to_pylist(), merged["sketch_counts"].to_pylist()
+    for q in quantiles:
+        out = out.append_column(f"p{round(q * 100):d}", pa.array([quantile(k, c, q) for k, c in zip(keys, counts)], pa.float64()))
+    return out
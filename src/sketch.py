@@ -0,0 +1,46 @@
+# src/sketch.py
+import math
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Log-bucketed quantile sketch (DDSketch-style): a value x > 0 falls into bucket
+# ceil(log_gamma(x)), so any quantile estimate is within ALPHA relative error.
+# A sketch is a bag of (bucket key, count) pairs; merging sketches is adding
+# counts per key, so partial sketches from different files combine exactly.
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(GAMMA)
+_MIN_ABS = 1e-9          # |x| below this counts as zero
+NEG_OFFSET = 100_000     # keys of negative values: NEG_OFFSET + bucket of -x
+ZERO_KEY = 200_000
+
+def bucket_keys(values: pa.Array) -> pa.Array:
+    """Sketch key (int32) per non-null value, vectorized."""
+    values = pc.cast(values, pa.float64())
+    mag = pc.abs(values)
+    bucket = pc.cast(pc.ceil(pc.divide(pc.ln(pc.max_element_wise(mag, _MIN_ABS)), _LOG_GAMMA)), pa.int32())
+    keys = pc.if_else(pc.less(values, 0), pc.add(bucket, NEG_OFFSET), bucket)
+    return pc.if_else(pc.less(mag, _MIN_ABS), pa.scalar(ZERO_KEY, pa.int32()), keys)
+
+def key_value(key: int) -> float:
+    """Representative value of a bucket (its relative-error midpoint)."""
+    if key == ZERO_KEY:
+        return 0.0
+    neg = key > NEG_OFFSET // 2
+    b = key - NEG_OFFSET if neg else key
+    v = 2 * GAMMA ** b / (GAMMA + 1)
+    return -v if neg else v
+
+def quantile(keys, counts, q: float):
+    """``q``-quantile of a sketch given as parallel key/count lists; ``None`` if empty."""
+    if not keys:
+        return None
+    pairs = sorted(zip((key_value(k) for k in keys), counts))
+    total = sum(c for _, c in pairs)
+    rank = q * (total - 1)
+    seen = 0
+    for v, c in pairs:
+        seen += c
+        if seen > rank:
+            return v
+    return pairs[-1][0]
@@ -1 +1,154 @@
-# placeholder for future streaming parquet helpers
+# src/writer_parquet.py
+import datetime
+import itertools
+import os
+import pathlib
+import threading
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .arrow_schema import type_runs
+
+def _hour_key(rec: dict, ts_utc: datetime.datetime):
+    """(date, hour) from the record's ``ts``, falling back to the receive time."""
+    ts = rec.get("ts")
+    if isinstance(ts, str):
+        try:
+            dt = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(datetime.timezone.utc)
+            return dt.strftime("%Y-%m-%d"), dt.strftime("%H")
+        except ValueError:
+            pass
+    return ts_utc.strftime("%Y-%m-%d"), ts_utc.strftime("%H")
+
+class _Partition:
+    def __init__(self, key, final_path: pathlib.Path):
+        self.key = key
+        self.set_path(final_path)
+        self.writer = None
+        self.schema = None
+        self.rows = []
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+
+    def set_path(self, final_path: pathlib.Path):
+        self.final_path = final_path
+        self.tmp_path = final_path.with_name(final_path.name + ".inprogress")
+
+class StreamingParquetWriter:
+    """Write collector records straight into ``date=/hour=`` Parquet partitions.
+
+    Records are buffered per hour and appended as one row group to an open
+    ``ParquetWriter`` once ``row_group_rows`` are pending or
+    ``row_group_interval_s`` has passed. Files are written as ``*.inprogress``
+    and renamed into place when the hour is closed, so readers never see a
+    file without a footer. An hour is closed ``close_grace_s`` after it ends
+    (late records after that start a new file in the same partition).
+    """
+
+    def __init__(self, root, prefix: str = "telemetry", row_group_rows: int = 50000,
+                 row_group_interval_s: float = 60, compression: str = "zstd", close_grace_s: float = 30):
+        self.root = pathlib.Path(root)
+        self.prefix = prefix
+        self.row_group_rows = max(1, int(row_group_rows))
+        self.row_group_interval = float(row_group_interval_s)
+        self.compression = compression
+        self.close_grace = datetime.timedelta(seconds=float(close_grace_s))
+        self._lock = threading.Lock()
+        self._parts = {}
+        self._seq = itertools.count()
+        self.files_written = 0
+        self.rows_dropped = 0
+
+    def write_many(self, records):
+        """Buffer ``(record_dict, receive_ts)`` pairs."""
+        with self._lock:
+            for rec, ts_utc in records:
+                key = _hour_key(rec, ts_utc)
+                part = self._parts.get(key)
+                if part is None:
+                    part = self._parts[key] = _Partition(key, self._new_path(key))
+                part.rows.append(rec)
+                if len(part.rows) >= self.row_group_rows:
+                    self._flush_part_locked(part)
+
+    def flush_if_due(self, now_utc: datetime.datetime = None):
+        """Write due row groups and finalise hours that have ended."""
+        now_utc = now_utc or datetime.datetime.utcnow()
+        mono = time.monotonic()
+        with self._lock:
+            for key, part in list(self._parts.items()):
+                hour_end = datetime.datetime.strptime(f"{key[0]} {key[1]}", "%Y-%m-%d %H") + datetime.timedelta(hours=1)
+                if now_utc >= hour_end + self.close_grace:
+                    self._close_part_locked(key)
+                elif part.rows and mono - part.last_flush >= self.row_group_interval:
+                    self._flush_part_locked(part)
+
+    def close(self):
+        with self._lock:
+            for key in list(self._parts):
+                self._close_part_locked(key)
+
+    def _new_path(self, key) -> pathlib.Path:
+        d, h = key
+        part_dir = self.root / f"date={d}" / f"hour={h}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        # unique per open so restarts and late data never clobber finalised files
+        stamp = int(time.time() * 1000)
+        return part_dir / f"{self.prefix}.{d}T{h}.{stamp}-{os.getpid()}-{next(self._seq)}.parquet"
+
+    def _flush_part_locked(self, part: _Partition):
+        part.last_flush = time.monotonic()
+        rows, part.rows = part.rows, []  # drained up front: a bad batch is never retried forever
+        if not rows:
+            return
+        try:
+            runs = [(rows, pa.Table.from_pylist(rows))]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # a key changing type within the buffer: write each type-consistent run on its own
+            runs = []
+            for run in type_runs(rows):
+                try:
+                    runs.append((run, pa.Table.from_pylist(run)))
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    self.rows_dropped += len(run)
+                    print("[parquet-sink] ERROR dropping", len(run), "rows for", part.final_path.parent, e)
+        for run, table in runs:
+            self._write_table_locked(part, run, table)
+
+    def _write_table_locked(self, part: _Partition, rows: list, table: pa.Table):
+        if part.writer is not None and not table.schema.equals(part.schema):
+            fits = False
+            try:
+                # records missing some columns (or with nulls) still fit the open file
+                if pa.unify_schemas([part.schema, table.schema]).equals(part.schema):
+                    table = pa.Table.from_pylist(rows, schema=part.schema)
+                    fits = True
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+            if not fits:
+                # schema drift: finish this file and continue in a new one
+                self._finish_file_locked(part)
+                part.set_path(self._new_path(part.key))
+        if part.writer is None:
+            part.schema = table.schema
+            part.writer = pq.ParquetWriter(part.tmp_path, part.schema, compression=self.compression)
+        part.writer.write_table(table, row_group_size=table.num_rows)
+        part.rows_written += table.num_rows
+
+    def _finish_file_locked(self, part: _Partition):
+        if part.writer is None:
+            return
+        part.writer.close()
+        os.replace(part.tmp_path, part.final_path)
+        part.writer = None
+        part.schema = None
+        self.files_written += 1
+        print("[parquet-sink] wrote", part.final_path, f"({part.rows_written} rows)")
+        part.rows_written = 0
+
+    def _close_part_locked(self, key):
+        part = self._parts.pop(key)
+        self._flush_part_locked(part)
+        self._finish_file_locked(part)
@@ -0,0 +1,41 @@
+import datetime
+import json
+import zoneinfo
+
+import pytest
+import yaml
+
+from src.batchd import next_run
+
+UTC = datetime.timezone.utc
+
+
+def test_next_run_waits_for_the_boundary_plus_grace():
+    grace = datetime.timedelta(seconds=60)
+    now = datetime.datetime(2025, 8, 19, 4, 30, tzinfo=UTC)
+    assert next_run(now, "hourly", UTC, grace) == datetime.datetime(2025, 8, 19, 5, 1, tzinfo=UTC)
+    assert next_run(now.replace(minute=0, second=30), "hourly", UTC, grace) == datetime.datetime(2025, 8, 19, 4, 1, tzinfo=UTC)
+    berlin = zoneinfo.ZoneInfo("Europe/Berlin")
+    assert next_run(now, "daily", berlin, grace) == datetime.datetime(2025, 8, 20, 0, 1, tzinfo=berlin)
+    assert next_run(now, "manual", UTC, grace) is None
+
+
+def test_batcher_until_leaves_the_open_hour_in_the_hot_file(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+
+    from src.batcher import run_batcher
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    lines = [{"ts": f"2025-08-19T{h:02d}:59:00Z", "device_id": "d1"} for h in (3, 4, 5, 5)]
+    (hot / "telemetry.2025-08-19.jsonl").write_text("".join(json.dumps(r) + "\n" for r in lines))
+
+    run_batcher(str(cfg), until="2025-08-19T05:00:00Z")
+    hours = sorted(p.parent.name for p in (tmp_path / "batches").rglob("*.parquet"))
+    assert hours == ["hour=03", "hour=04"]
+
+    run_batcher(str(cfg), until="2025-08-19T06:00:00Z")
+    assert ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").count_rows() == 4
@@ -0,0 +1,193 @@
+import json
+
+import pytest
+import yaml
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset as ds
+
+from src.batcher import run_batcher
+
+
+def _lines(hour, n, start=0):
+    return "".join(json.dumps({"ts": f"2025-08-19T{hour:02d}:00:{i:02d}Z", "device_id": "d1", "celsius": 20.0 + i}) + "\n"
+                   for i in range(start, start + n))
+
+
+def test_incremental_runs_only_batch_new_complete_lines(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    hf = hot / "telemetry.2025-08-19.jsonl"
+    hf.write_text(_lines(4, 10) + '{"ts":"2025-08-19T05:00')  # last line still being written
+
+    run_batcher(str(cfg))
+    run_batcher(str(cfg))  # nothing new: no extra part files
+    with hf.open("a") as f:
+        f.write(':00Z","device_id":"d1","celsius":1.0}\n' + _lines(5, 5, start=1))
+    run_batcher(str(cfg))
+
+    parts = sorted(p.relative_to(tmp_path / "batches").as_posix() for p in (tmp_path / "batches").rglob("*.parquet"))
+    assert len(parts) == 2 and parts[0].startswith("date=2025-08-19/hour=04/") and parts[1].startswith("date=2025-08-19/hour=05/")
+    table = ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").to_table()
+    assert table.num_rows == 16
+
+
+def test_parallel_chunks_match_sequential_output(tmp_path):
+    parts = {}
+    for jobs in (1, 3):
+        root = tmp_path / f"j{jobs}"
+        hot = root / "hot"
+        hot.mkdir(parents=True)
+        (hot / "telemetry.2025-08-19.jsonl").write_text(_lines(4, 30) + _lines(5, 20))
+        (hot / "telemetry.2025-08-20.jsonl").write_text(_lines(6, 10))
+        cfg = root / "config.yaml"
+        cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(root / "batches")},
+                                       "batch": {"chunk_bytes": 1000}}))
+        run_batcher(str(cfg), jobs=jobs)
+        out = root / "batches"
+        # part names are {stem}.{inode}-{offset}.parquet; inodes differ between the two trees
+        parts[jobs] = {(p.parent.relative_to(out).as_posix(), p.name.split(".")[1], p.name.split("-")[-1]):
+                       ds.dataset(p).to_table().num_rows for p in out.rglob("*.parquet")}
+    assert parts[1] == parts[3]
+    assert len(parts[1]) > 3 and sum(parts[1].values()) == 60
+
+
+def test_malformed_line_falls_back_to_per_line_parsing(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    (hot / "telemetry.2025-08-19.jsonl").write_text(_lines(4, 3) + "{not json\n" + '{"ts":"2025-08-19T07:30:00","device_id":"d2"}\n')
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    run_batcher(str(cfg))
+    hours = sorted(p.parent.name for p in (tmp_path / "batches").rglob("*.parquet"))
+    assert hours == ["hour=04", "hour=07"]
+    assert ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").to_table().num_rows == 4
+
+
+def test_streams_bounded_row_groups_and_splits_on_schema_drift(tmp_path):
+    import pyarrow.parquet as pq
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    drift = "".join(json.dumps({"ts": f"2025-08-19T04:30:{i:02d}Z", "device_id": 7}) + "\n" for i in range(5))
+    (hot / "telemetry.2025-08-19.jsonl").write_text(_lines(4, 25) + drift)
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+                                   "batch": {"read_block_bytes": 500, "row_group_rows": 10}}))
+    run_batcher(str(cfg))
+    files = sorted((tmp_path / "batches" / "date=2025-08-19" / "hour=04").glob("*.parquet"), key=lambda p: len(p.name))
+    assert len(files) == 2  # device_id turned from string to int: second file (-1 suffix)
+    first = pq.ParquetFile(files[0])
+    assert first.metadata.num_rows == 25 and first.metadata.num_row_groups > 1
+    assert pq.ParquetFile(files[1]).metadata.num_rows == 5
+
+
+@pytest.mark.parametrize("values", [[1, "n/a"] * 3, [1, 2, 3, "n/a", "x", "y"]])
+def test_schema_drift_within_the_first_block_keeps_every_row(tmp_path, values):
+    import pyarrow.parquet as pq
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    (hot / "telemetry.2025-08-19.jsonl").write_text(
+        "".join(json.dumps({"ts": f"2025-08-19T04:00:{i:02d}Z", "value": v}) + "\n" for i, v in enumerate(values)))
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    run_batcher(str(cfg))
+    run_batcher(str(cfg))  # nothing new
+    files = sorted((tmp_path / "batches" / "date=2025-08-19" / "hour=04").glob("*.parquet"))
+    assert len(files) == len({f.name for f in files}) > 1
+    assert sum(pq.read_metadata(f).num_rows for f in files) == 6
+    assert sorted(str(v) for f in files for v in pq.read_table(f).column("value").to_pylist()) == sorted(map(str, values))
+
+
+def test_declared_schema_casts_columns(tmp_path):
+    import pathlib
+
+    import pyarrow as pa
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    rows = [{"ts": "2025-08-19T04:00:00Z", "device_id": "d1", "site": "s1", "celsius": 21, "status": "OK"},
+            {"ts": "2025-08-19T04:00:01.5Z", "device_id": "d1", "site": "s1", "celsius": 21.5, "extra": 1}]
+    (hot / "telemetry.2025-08-19.jsonl").write_text("".join(json.dumps(r) + "\n" for r in rows))
+    avsc = pathlib.Path(__file__).resolve().parents[1] / "schema" / "temperature.avsc"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+                                   "batch": {"schemas": {"telemetry": str(avsc)}, "dictionary_columns": ["device_id", "site"]}}))
+    run_batcher(str(cfg))
+    [part] = (tmp_path / "batches").rglob("*.parquet")
+    table = ds.dataset(part).to_table()
+    assert table.schema.names == ["device_id", "site", "ts", "celsius", "status", "extra"]
+    assert table.schema.field("ts").type == pa.timestamp("ms", tz="UTC")
+    assert table.schema.field("celsius").type == pa.float64()
+    for name in ("device_id", "site", "status"):
+        assert pa.types.is_dictionary(table.schema.field(name).type)
+
+
+def test_conform_warns_once_about_missing_declared_columns(capsys):
+    import pyarrow as pa
+
+    from src.arrow_schema import conform_table
+
+    schema = pa.schema([("site_code", pa.string()), ("temperature", pa.float64())])
+    for _ in range(3):
+        table = conform_table(pa.table({"temperature": [20.5]}), schema)
+    assert table.column("site_code").null_count == 1
+    assert capsys.readouterr().out.count("'site_code' is missing") == 1
+
+
+def test_batches_collector_worker_shards(tmp_path):
+    import datetime
+
+    from src.collector import TopicModes, _make_writer, _writer_loop
+    from src.ingest_queue import IngestQueue
+
+    hot = tmp_path / "hot"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    ts = datetime.datetime(2025, 8, 19, 4, 0, 0)
+    for shard in (0, 1):
+        q = IngestQueue(maxsize=100)
+        for i in range(3):
+            q.put((ts, "factory/sensor/event", json.dumps({"ts": f"2025-08-19T04:00:0{i}Z", "w": shard}).encode()))
+        q.close()
+        writer = _make_writer(hot, "telemetry", {}, shard=shard)
+        _writer_loop(q, {"jsonl": writer}, 10, TopicModes())
+        writer.close()
+    assert sorted(p.name for p in hot.iterdir()) == ["telemetry.2025-08-19.w0.jsonl", "telemetry.2025-08-19.w1.jsonl"]
+
+    run_batcher(str(cfg))
+    parts = sorted(p.name for p in (tmp_path / "batches" / "date=2025-08-19" / "hour=04").glob("*.parquet"))
+    assert [p.split(".")[2] for p in parts] == ["w0", "w1"]
+    table = ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").to_table()
+    assert sorted(table.column("w").to_pylist()) == [0, 0, 0, 1, 1, 1]
+
+
+def test_failing_file_keeps_checkpoint_and_others_advance(tmp_path, monkeypatch):
+    import src.batcher as batcher
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    (hot / "telemetry.2025-08-19.jsonl").write_text(_lines(4, 5))
+    (hot / "telemetry.2025-08-20.jsonl").write_text(_lines(4, 5))
+    batch_jsonl = batcher._batch_jsonl
+
+    def flaky(jfile, *args):
+        if jfile.name == "telemetry.2025-08-19.jsonl":
+            raise OSError("corrupt")
+        return batch_jsonl(jfile, *args)
+
+    monkeypatch.setitem(batcher._BATCH_FNS, "jsonl", flaky)
+    run_batcher(str(cfg))
+    checkpoints = json.loads((tmp_path / "batches" / "_checkpoints.json").read_text())
+    assert list(checkpoints) == ["telemetry.2025-08-20.jsonl"]
+
+    monkeypatch.setitem(batcher._BATCH_FNS, "jsonl", batch_jsonl)
+    run_batcher(str(cfg))  # retried, the other file is unchanged
+    table = ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").to_table()
+    assert table.num_rows == 10
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+import yaml
+
+pytest.importorskip("pyarrow")
+
+from src.batcher import run_batcher
+from src.catalog import Catalog
+from src.compactor import run_compactor
+
+
+def test_catalog_prunes_by_time_and_device_and_follows_compaction(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    batches = tmp_path / "batches"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(batches)}}))
+    hf = hot / "telemetry.2025-08-19.jsonl"
+    for hour, dev in ((4, "d1"), (5, "d2"), (5, "d3")):
+        with hf.open("a") as f:
+            f.write(json.dumps({"ts": f"2025-08-19T{hour:02d}:10:00Z", "device_id": dev}) + "\n")
+        run_batcher(str(cfg))
+
+    with Catalog(batches, readonly=True) as cat:
+        assert [p["rows"] for p in cat.partitions()] == [1, 2]
+        assert len(cat.files()) == 3
+        assert len(cat.files(start="2025-08-19T05:00:00Z")) == 2
+        assert len(cat.files(start="2025-08-19T05:00:00Z", device_id="d2")) == 1
+        assert cat.files(end="2025-08-19T04:00:00Z") == []
+
+    run_compactor(str(cfg))
+    with Catalog(batches, readonly=True) as cat:
+        [p5] = cat.files(start="2025-08-19T05:00:00Z")
+        assert p5.exists() and ".compacted." in p5.name
+        assert cat.partitions()[1] == {"partition": "date=2025-08-19/hour=05", "files": 1, "rows": 2,
+                                       "min_ts": 1755580200000, "max_ts": 1755580200000,
+                                       "min_device_id": "d2", "max_device_id": "d3"}
@@ -0,0 +1,127 @@
+import pytest
+
+from src.collector import TopicModes
+
+
+def test_topic_modes_raw_passthrough():
+    modes = TopicModes({"factory/+/raw": {"mode": "raw"}})
+    assert modes.mode_for("factory/a/raw") == "raw"
+    assert modes.mode_for("factory/a/event") == "json"
+    assert modes.encoder_for("factory/a/raw")(b'{"ts":"x", "v":1}') == b'{"ts":"x", "v":1}\n'
+    assert modes.encoder_for("factory/a/event")(b'{"ts":"x", "v":1}') == b'{"ts":"x","v":1}\n'
+    with pytest.raises(ValueError):
+        modes.encoder_for("factory/a/raw")(b'{"a":1}\n{"b":2}')
+    with pytest.raises(UnicodeDecodeError):
+        modes.encoder_for("factory/a/raw")(b'{"a":"\xff"}')
+
+
+def test_writer_loop_acks_after_commit_and_skips_duplicates(tmp_path):
+    import datetime
+
+    from src.collector import _make_writer, _writer_loop
+    from src.dedup import RecentIds
+    from src.ingest_queue import IngestQueue
+
+    acked = []
+    writer = _make_writer(tmp_path, "telemetry", {"flush": {"max_interval_ms": 60_000}})
+    writer.on_commit = acked.extend
+    q = IngestQueue(maxsize=100)
+    ts = datetime.datetime(2025, 8, 19, 4, 0, 0)
+    # mid 3 has the same body as mid 1 but is a fresh publish; mid 5 redelivers mid 2
+    for mid, payload in enumerate([b'{"v":1}', b'{"v":2}', b'{"v": 1}', b"not json"], 1):
+        q.put((ts, "factory/sensor/event", payload, mid, False))
+    q.put((ts, "factory/sensor/event", b'{"v":2}', 5, True))
+    q.close()
+    recent = RecentIds(10)
+    _writer_loop(q, {"jsonl": writer}, 10, TopicModes(), recent=recent)
+    assert acked == []  # nothing durable yet
+    writer.close()
+    assert acked == [1, 2, 3, 4, 5]
+    assert (tmp_path / "telemetry.2025-08-19.jsonl").read_bytes() == b'{"v":1}\n{"v":2}\n{"v":1}\n'
+    assert recent.duplicates == 1
+
+
+def test_writer_loop_survives_write_errors(tmp_path):
+    import datetime
+    import threading
+    import time
+
+    from src.collector import _make_writer, _writer_loop
+    from src.ingest_queue import IngestQueue
+
+    writer = _make_writer(tmp_path, "telemetry", {"flush": {"max_interval_ms": 0}})
+    calls = []
+    append_many = writer.append_many
+
+    def flaky(records, acks=None):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise OSError(28, "No space left on device")
+        append_many(records, acks)
+
+    writer.append_many = flaky
+    q = IngestQueue(maxsize=100)
+    ts = datetime.datetime(2025, 8, 19, 4, 0, 0)
+    q.put((ts, "factory/sensor/event", b'{"v":1}'))
+    t = threading.Thread(target=_writer_loop, args=(q, {"jsonl": writer}, 10, TopicModes()))
+    t.start()
+    while not calls:
+        time.sleep(0.01)
+    q.put((ts, "factory/sensor/event", b'{"v":2}'))
+    q.close()
+    t.join(5)
+    writer.close()
+    assert not t.is_alive() and calls == [1, 1]
+    assert (tmp_path / "telemetry.2025-08-19.jsonl").read_bytes() == b'{"v":2}\n'
+
+
+def test_shared_subscriptions_and_shard_file_names(tmp_path):
+    import datetime
+
+    from src.collector import _make_writer, _subscriptions
+
+    cfg = {"topics": ["factory/+/event", "factory/+/raw"], "shared_group": "g1"}
+    assert _subscriptions(cfg) == ["factory/+/event", "factory/+/raw"]
+    assert _subscriptions(cfg, shard=2) == ["$share/g1/factory/+/event", "$share/g1/factory/+/raw"]
+    assert _subscriptions({"topics": ["a/b"]}, shard=0) == ["$share/edge-collectors/a/b"]
+
+    w = _make_writer(tmp_path, "telemetry", {}, shard=2)
+    w.append(b'{"v":1}\n', datetime.datetime(2025, 8, 19, 4, 0, 0))
+    w.close()
+    assert [p.name for p in tmp_path.iterdir()] == ["telemetry.2025-08-19.w2.jsonl"]
+
+
+def test_decision_stage_micro_batches_and_isolates_bad_payloads(tmp_path):
+    import datetime
+    import json
+    import time
+
+    from src.collector import _make_writer
+    from src.decision_engine.model_infer import DummyModel
+    from src.decision_stage import DecisionStage
+
+    policy = {"global": {"thresholds": {"temperature": {"warn": 75, "alert": 85}}}}
+    writer = _make_writer(tmp_path, "decisions", {})
+    stage = DecisionStage(policy, writer, batch_size=2, max_delay_ms=20, topics=["factory/+/event"],
+                          model=DummyModel(w_temp=0.0, w_vib=0.0))  # levels from the rules only
+    stage.start()
+    now = datetime.datetime.utcnow()
+    payloads = [{"ts": "2025-08-19T04:00:00Z", "source": "m1", "temperature": t} for t in (20, 80, 90, 30)]
+    for p in payloads[:2]:
+        stage.submit((now, "factory/a/event", json.dumps(p).encode()))
+    stage.submit((now, "factory/a/event", b"not json"))
+    stage.submit((now, "factory/a/other", json.dumps(payloads[2]).encode()))  # topic not selected
+    for p in payloads[2:]:
+        stage.submit((now, "factory/a/event", json.dumps(p).encode()))
+    deadline = time.monotonic() + 5
+    while stage.decided + stage.errors < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)  # the last, single-event batch goes out after max_delay_ms
+    stats = stage.stats()
+    stage.close()
+
+    assert (stats["decided"], stats["errors"], stats["dropped"]) == (4, 1, 0)
+    assert stats["latency_ms_p50"] <= stats["latency_ms_p99"] <= stats["latency_ms_max"]
+    (out,) = tmp_path.glob("decisions.*.jsonl")
+    recs = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["level"] for r in recs] == ["NONE", "WARN", "ALERT", "NONE"]
+    assert all(r["source"] == "m1" and r["topic"] == "factory/a/event" and r["latency_ms"] >= 0 for r in recs)
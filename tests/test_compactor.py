@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import yaml
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.batcher import run_batcher
+from src.compactor import run_compactor
+
+
+def test_compaction_merges_sorts_and_keeps_rows(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    hf = hot / "telemetry.2025-08-19.jsonl"
+    for i in range(3):  # three incremental runs -> three part files in hour=04
+        with hf.open("a") as f:
+            for dev in ("d2", "d1"):
+                f.write(json.dumps({"ts": f"2025-08-19T04:0{i}:00Z", "device_id": dev, "celsius": i}) + "\n")
+        run_batcher(str(cfg))
+    (hot / "decisions.2025-08-19.jsonl").write_text(json.dumps({"ts": "2025-08-19T04:00:00Z", "action": "noop"}) + "\n")
+    run_batcher(str(cfg))
+    hour = tmp_path / "batches" / "date=2025-08-19" / "hour=04"
+    assert len(list(hour.glob("telemetry.*.parquet"))) == 3
+
+    run_compactor(str(cfg))
+
+    [merged] = hour.glob("telemetry.*.parquet")
+    assert len(list(hour.glob("decisions.*.parquet"))) == 1  # streams are never mixed
+    table = pq.read_table(merged)
+    assert table.column("device_id").to_pylist() == ["d1"] * 3 + ["d2"] * 3
+    assert table.column("ts").to_pylist() == sorted(table.column("ts").to_pylist()[:3]) * 2
+    assert not list(hour.glob("*.inprogress")) and not (hour / "_compaction.json").exists()
+    assert ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").count_rows() == 7
+
+
+def test_compaction_bounds_memory_and_drops_unjournaled_outputs(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+                                   "compact": {"memory_mb": 0.0005}}))
+    hf = hot / "telemetry.2025-08-19.jsonl"
+    for i in range(4):
+        with hf.open("a") as f:
+            for dev in range(10):
+                f.write(json.dumps({"ts": f"2025-08-19T04:0{i}:00Z", "device_id": f"d{9 - dev}", "celsius": i}) + "\n")
+        run_batcher(str(cfg))
+    hour = tmp_path / "batches" / "date=2025-08-19" / "hour=04"
+    (hour / "telemetry.compacted.1-0.parquet.inprogress").write_bytes(b"partial")  # crash before the journal
+    (hour / "telemetry.sink.parquet.inprogress").write_bytes(b"open")  # the collector's Parquet sink
+
+    run_compactor(str(cfg))
+
+    outputs = sorted(hour.glob("telemetry.compacted.*.parquet"))
+    assert len(outputs) > 1  # capped by compact.memory_mb
+    for out in outputs:
+        devices = pq.read_table(out).column("device_id").to_pylist()
+        assert devices == sorted(devices)
+    assert sorted(p.name for p in hour.glob("*.inprogress")) == ["telemetry.sink.parquet.inprogress"]
+    assert sum(pq.read_metadata(p).num_rows for p in outputs) == 40
+
+
+def test_parts_beyond_the_checkpoint_are_not_compacted(tmp_path, monkeypatch):
+    import src.batcher as batcher
+
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+                                   "batch": {"chunk_bytes": 400}}))
+    hf = hot / "telemetry.2025-08-19.jsonl"
+
+    def append(n, start):
+        with hf.open("a") as f:
+            for i in range(start, start + n):
+                f.write(json.dumps({"ts": f"2025-08-19T04:{i // 60:02d}:{i % 60:02d}Z", "device_id": "d1", "n": i}) + "\n")
+
+    append(6, 0)
+    run_batcher(str(cfg))
+    append(6, 6)
+    run_batcher(str(cfg))
+    committed = hf.stat().st_size
+    append(12, 12)
+    batch_jsonl = batcher._batch_jsonl
+
+    def later_chunks_fail(jfile, stem, date, start, *args):
+        if start > committed:
+            raise OSError("read error")
+        return batch_jsonl(jfile, stem, date, start, *args)
+
+    monkeypatch.setitem(batcher._BATCH_FNS, "jsonl", later_chunks_fail)
+    run_batcher(str(cfg))  # the first new chunk is written, the file's checkpoint stays put
+    run_compactor(str(cfg))
+    monkeypatch.setitem(batcher._BATCH_FNS, "jsonl", batch_jsonl)
+    run_batcher(str(cfg))  # retry: rewrites the part it had already written
+    run_compactor(str(cfg))
+
+    table = ds.dataset(tmp_path / "batches", format="parquet", partitioning="hive").to_table()
+    assert sorted(table.column("n").to_pylist()) == list(range(24))
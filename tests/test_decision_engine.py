@@ -0,0 +1,246 @@
+import random
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow as pa
+
+from src.decision_engine.engine import decide, decide_batch, load_policy
+
+POLICY = "src/decision_engine/policies.yaml"
+
+
+def _as_decide(row):
+    reasons = {}
+    for r in row["reasons"]:
+        reasons.setdefault(r["rule"], []).append((r["level"], r["value"], r["threshold"]))
+    return {"level": row["level"], "risk": row["risk"], "reasons": reasons, "actions": row["actions"]}
+
+
+def test_decide_batch_matches_decide():
+    policy = load_policy(POLICY)
+    rng = random.Random(5)
+    events = [{
+        "source": rng.choice(["lineA-press01", "lineB-mill02", None]),
+        "temperature": rng.choice([rng.uniform(50, 95), None]),
+        "vibration": rng.uniform(0, 0.6),
+        "anomaly": rng.random() < 0.05,
+    } for _ in range(5000)]
+    out = decide_batch(pa.Table.from_pylist(events), policy)
+    for event, row in zip(events, out.to_pylist()):
+        event = {k: v for k, v in event.items() if v is not None}  # nulls are absent keys
+        assert _as_decide(row) == decide(event, policy)
+
+
+def test_decide_does_not_leak_asset_thresholds():
+    policy = load_policy(POLICY)
+    decide({"source": "lineA-press01", "temperature": 80}, policy)
+    assert decide({"source": "other", "temperature": 80}, policy)["reasons"] == {"temperature": [("WARN", 80, 75)]}
+
+
+def test_compiled_policy_matches_decide_and_reloads(tmp_path):
+    from src.decision_engine.compiled import CompiledPolicy
+
+    path = tmp_path / "policies.yaml"
+    path.write_text(open(POLICY).read())
+    compiled = CompiledPolicy(str(path), reload_s=0)  # reload checked by hand below
+    policy = load_policy(POLICY)
+    for source in ("lineA-press01", "other", None):
+        for t, v in ((40, 0.05), (73, 0.1), (83, 0.15), (90, 0.3)):
+            event = {"source": source, "temperature": t, "vibration": v}
+            assert compiled.decide(event) == decide(event, policy)
+
+    digest = compiled.digest
+    assert not compiled.check()
+    path.write_text(open(POLICY).read().replace("warn: 72", "warn: 60.0"))
+    assert compiled.check() and compiled.digest != digest
+    assert compiled.decide({"source": "lineA-press01", "temperature": 65})["reasons"] == {"temperature": [("WARN", 65, 60.0)]}
+
+
+def _linear_onnx(path, weights, bias):
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper
+
+    graph = helper.make_graph(
+        [helper.make_node("MatMul", ["x", "w"], ["xw"]), helper.make_node("Add", ["xw", "b"], ["risk"])],
+        "risk",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, [None, len(weights)])],
+        [helper.make_tensor_value_info("risk", TensorProto.FLOAT, [None, 1])],
+        [helper.make_tensor("w", TensorProto.FLOAT, [len(weights), 1], weights),
+         helper.make_tensor("b", TensorProto.FLOAT, [1], [bias])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+
+def test_onnx_model_micro_batches_concurrent_calls(tmp_path):
+    pytest.importorskip("onnxruntime")
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.decision_engine.model_infer import load_model
+
+    path = tmp_path / "risk.onnx"
+    _linear_onnx(path, [0.01, 1.0], 0.0)
+    model = load_model(str(path), features=["temperature", "vibration"], max_batch=16, max_delay_us=2000)
+    assert load_model(str(path), features=["temperature", "vibration"], max_batch=16, max_delay_us=2000) is model
+    events = [{"temperature": 10 + i % 50, "vibration": (i % 7) / 10} for i in range(200)]
+    with ThreadPoolExecutor(8) as pool:
+        risks = list(pool.map(model.predict_proba, events))
+    expected = [min(1.0, 0.01 * e["temperature"] + e["vibration"]) for e in events]
+    assert risks == pytest.approx(expected, abs=1e-6)
+    assert model.predict_proba_many(events) == pytest.approx(expected, abs=1e-6)
+
+    policy = load_policy(POLICY)
+    out = decide_batch(pa.Table.from_pylist(events), policy, model=model)
+    assert out["risk"].to_pylist() == pytest.approx(expected, abs=1e-6)
+
+
+def test_declared_rules_single_and_batch_agree():
+    from src.decision_engine.compiled import CompiledPolicy
+
+    policy = load_policy(POLICY)
+    policy["global"]["rules"] = [
+        {"id": "pressure_range", "when": "pressure < 1.5 or pressure > 6", "level": "WARN"},
+        {"id": "hot", "when": "celsius >= 90 and vibration > 0.3", "level": "SHUTDOWN"},
+        {"id": "fault", "when": "status in ['fault', 'trip']"},
+        {"id": "current_out", "when": "not (1 <= current <= 10)", "level": "WARN"},
+    ]
+    policy["assets"]["lineA-press01"]["rules"] = [
+        {"id": "pressure_range", "when": "pressure > 5", "level": "ALERT"},
+        {"id": "fault", "enabled": False},
+    ]
+    rng = random.Random(9)
+    events = []
+    for _ in range(1000):
+        e = {"source": rng.choice(["lineA-press01", "lineB-mill02"]), "temperature": rng.uniform(20, 60),
+             "vibration": rng.uniform(0, 0.2)}
+        for field, value in (("pressure", rng.uniform(0, 8)), ("celsius", rng.uniform(60, 100)),
+                             ("status", rng.choice(["ok", "fault", "trip"])), ("current", rng.uniform(0, 12))):
+            if rng.random() < 0.6:
+                e[field] = value
+        events.append(e)
+    compiled = CompiledPolicy(policy=policy)
+    keys = sorted({k for e in events for k in e})
+    out = compiled.decide_batch(pa.table({k: [e.get(k) for e in events] for k in keys}))
+    for event, row in zip(events, out.to_pylist()):
+        expected = decide(event, policy)
+        assert compiled.decide(event) == expected
+        assert _as_decide(row) == expected
+
+    fired = decide({"source": "lineA-press01", "pressure": 5.5, "status": "fault", "current": 5}, policy)
+    assert fired["reasons"] == {"pressure_range": [("ALERT", 5.5, None)]}
+    fired = decide({"source": "lineB-mill02", "status": "trip"}, policy)
+    assert set(fired["reasons"]) == {"fault", "current_out"}  # a missing current is outside 1..10
+
+
+def test_window_stats_match_brute_force():
+    from src.decision_engine.windows import WindowRule, WindowState
+
+    rng = random.Random(11)
+    state = WindowState(max_assets=8)
+    rules = {stat: WindowRule(stat, "vibration", stat=stat, window_s=10, above=1e9, capacity=32)
+             for stat in ("mean", "max", "rms", "rate")}
+    history = {}
+    t = 0.0
+    for _ in range(2000):
+        t += rng.uniform(0.1, 2.0)
+        asset = f"a{rng.randrange(12)}"  # more assets than max_assets: rows get recycled
+        v = rng.uniform(-1, 1)
+        for rule in rules.values():
+            rule.check_window({"source": asset, "ts": t, "vibration": v}, state)
+        h = history.setdefault(asset, [])
+        h.append((t, v))
+        window = [(ts, x) for ts, x in h if ts >= t - 10][-32:]
+        ring = state.ring(rules["max"])
+        r = ring.slots[asset]
+        n = int(ring.count[r])
+        window = window[-n:]  # a recycled row restarted its window
+        assert ring.stat(r, "max") == max(x for _, x in window)
+        assert ring.stat(r, "mean") == pytest.approx(sum(x for _, x in window) / n, abs=1e-9)
+        assert ring.stat(r, "rms") == pytest.approx((sum(x * x for _, x in window) / n) ** 0.5, abs=1e-9)
+    assert len(state.ring(rules["max"]).seq) == 8
+
+
+def test_window_rows_recycle_least_recently_updated_asset(tmp_path):
+    from src.decision_engine.windows import WindowRule, WindowState
+
+    state = WindowState(max_assets=2)
+    rule = WindowRule("m", "vibration", stat="max", above=1e9)
+    for ts, asset in enumerate(["a", "b", "a", "c"]):
+        rule.check_window({"source": asset, "ts": ts, "vibration": 1.0}, state)
+    ring = state.ring(rule)
+    assert list(ring.slots) == ["a", "c"] and ring.slots["c"] == 1  # b's row went to c
+    state.save(str(tmp_path / "state.npz"))
+    restored = WindowState(max_assets=2)
+    restored.load(str(tmp_path / "state.npz"))
+    rule.check_window({"source": "d", "ts": 5, "vibration": 1.0}, restored)
+    assert list(restored.ring(rule).slots) == ["c", "d"]
+
+
+def test_windowed_rules_debounce_hysteresis_and_snapshot(tmp_path):
+    from src.decision_engine.compiled import CompiledPolicy
+
+    policy = load_policy(POLICY)
+    policy["global"]["rules"] = [
+        {"id": "rise", "field": "temperature", "stat": "rate", "window_s": 60, "above": 0.5, "level": "WARN"},
+        {"id": "overcurrent", "field": "current", "stat": "value", "above": 1.5, "clear": 1.0, "for_n": 3},
+    ]
+    state = tmp_path / "state.npz"
+    compiled = CompiledPolicy(policy=policy, model=_ZeroModel(), state_path=str(state), snapshot_s=0)
+    temps = [20, 20, 21, 30]  # +10 over 30 s: 0.33/s
+    assert [compiled.decide({"source": "p1", "ts": 10 * i, "temperature": t})["level"] for i, t in enumerate(temps)] \
+        == ["NONE", "NONE", "NONE", "NONE"]
+    assert compiled.decide({"source": "p1", "ts": 40, "temperature": 45})["reasons"]["rise"][0][0] == "WARN"
+
+    levels = [compiled.decide({"source": "p2", "ts": 100 + i, "current": v})["level"]
+              for i, v in enumerate([2, 2, 2, 1.2, 1.2, 0.5, 2, 0.5])]
+    # fires on the 3rd violation, holds down to clear (1.0), then needs 3 violations again
+    assert levels == ["NONE", "NONE", "ALERT", "ALERT", "ALERT", "NONE", "NONE", "NONE"]
+    assert compiled.decide({"source": "p1", "ts": 41, "temperature": 45})["level"] == "WARN"
+    assert "rise" not in decide({"source": "p1", "ts": 41, "temperature": 45}, policy)["reasons"]  # stateless
+
+    compiled.close()
+    restarted = CompiledPolicy(policy=policy, model=_ZeroModel(), state_path=str(state), snapshot_s=0)
+    assert restarted.decide({"source": "p1", "ts": 50, "temperature": 50})["reasons"]["rise"][0][0] == "WARN"
+
+
+def test_decide_many_isolates_failing_events_without_double_counting_windows():
+    from src.decision_engine.compiled import CompiledPolicy
+    from src.decision_engine.model_infer import DummyModel
+
+    policy = {"global": {"rules": [{"id": "oc", "field": "current", "stat": "value", "above": 50, "for_n": 2}]}}
+    compiled = CompiledPolicy(policy=policy, model=DummyModel(w_temp=0.0, w_vib=0.0))
+    first, unhashable, unscorable = compiled.decide_many([
+        {"source": "m1", "ts": 1, "current": 60},
+        {"source": ["m1"], "ts": 2, "current": 60},
+        {"source": "m1", "ts": 3, "current": 60, "temperature": "hot"},  # the model cannot read it
+    ])
+    assert first["level"] == "NONE"  # one violation so far: pushed once, not again by a retry
+    assert isinstance(unhashable, TypeError) and isinstance(unscorable, ValueError)
+    assert compiled.decide({"source": "m1", "ts": 4, "current": 60})["level"] == "ALERT"
+
+
+def test_compiled_policy_differs_from_decide_only_by_windowed_rules():
+    from src.decision_engine.compiled import CompiledPolicy
+
+    policy = load_policy(POLICY)
+    policy["global"]["rules"] = [{"id": "oc", "field": "current", "stat": "value", "above": 50, "for_n": 2}]
+    compiled = CompiledPolicy(policy=policy, model=_ZeroModel())
+    events = [{"source": "m1", "ts": i, "current": 60, "temperature": 80} for i in range(3)]
+    many = compiled.decide_many(events[:2])
+    single = compiled.decide(events[2])
+    stateless = [decide(e, policy, model=_ZeroModel()) for e in events]
+
+    assert [r["level"] for r in many + [single]] == ["WARN", "ALERT", "ALERT"]  # oc fires from the 2nd event on
+    assert [r["level"] for r in stateless] == ["WARN"] * 3 and all("oc" not in r["reasons"] for r in stateless)
+    for got, want in zip(many + [single], stateless):  # the stateless rules still agree
+        assert {k: v for k, v in got["reasons"].items() if k != "oc"} == want["reasons"]
+
+
+class _ZeroModel:
+    features = ()
+
+    def predict_proba(self, event):
+        return 0.0
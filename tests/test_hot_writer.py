@@ -0,0 +1,38 @@
+import datetime
+import functools
+
+from src.collector import _daily_path
+from src.hot_writer import HotFileWriter
+
+
+def test_group_commit_and_midnight_rollover(tmp_path):
+    w = HotFileWriter(functools.partial(_daily_path, tmp_path, "telemetry"), max_bytes=1 << 20, max_interval_ms=60_000)
+    d1 = datetime.datetime(2025, 8, 19, 23, 59, 59)
+    d2 = datetime.datetime(2025, 8, 20, 0, 0, 1)
+    w.append(b'{"a":1}\n', d1)
+    w.append(b'{"a":2}\n', d1)
+    # nothing committed yet: below both thresholds
+    assert (tmp_path / "telemetry.2025-08-19.jsonl").read_bytes() == b""
+    w.append(b'{"a":3}\n', d2)
+    assert (tmp_path / "telemetry.2025-08-19.jsonl").read_bytes() == b'{"a":1}\n{"a":2}\n'
+    w.close()
+    assert (tmp_path / "telemetry.2025-08-20.jsonl").read_bytes() == b'{"a":3}\n'
+    assert w.lines_written == 3
+
+
+def test_pool_evicts_lru_partition_without_losing_lines(tmp_path):
+    from src.hot_writer import HotWriterPool
+
+    def make(key):
+        return HotFileWriter(functools.partial(_daily_path, tmp_path / key, "telemetry"), max_interval_ms=60_000)
+
+    acked = []
+    pool = HotWriterPool(make, max_open=2, on_commit=acked.extend)
+    ts = datetime.datetime(2025, 8, 19, 4, 0, 0)
+    for i in range(30):
+        pool.append_many([(b'{"i":%d}\n' % i, ts, f"device=D{i % 3}")], acks=[i])
+    assert acked == list(range(30))
+    pool.close()
+    assert pool.evictions > 0 and pool.lines_written == 30
+    for dev in range(3):
+        assert len((tmp_path / f"device=D{dev}" / "telemetry.2025-08-19.jsonl").read_bytes().splitlines()) == 10
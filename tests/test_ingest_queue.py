@@ -0,0 +1,29 @@
+import datetime
+
+from src.ingest_queue import IngestQueue
+
+TS = datetime.datetime(2025, 8, 19, 4, 0, 0)
+
+
+def test_drop_oldest_counts_drops():
+    q = IngestQueue(maxsize=2, policy="drop_oldest")
+    for i in range(5):
+        q.put((TS, "t", b"%d" % i))
+    assert [p for _, _, p in q.get_batch(10, timeout=0)] == [b"3", b"4"]
+    assert q.stats()["dropped"] == 3
+
+
+def test_spill_replays_in_order(tmp_path):
+    q = IngestQueue(maxsize=2, policy="spill", spill_dir=tmp_path)
+    for i in range(6):
+        q.put((TS, "factory/a", b"%d" % i))
+    assert q.stats()["spilled"] == 4
+    out = []
+    while True:
+        batch = q.get_batch(3, timeout=0)
+        if not batch:
+            break
+        out.extend(batch)
+    assert [p for _, _, p in out] == [b"%d" % i for i in range(6)]
+    assert out[-1][0] == TS and out[-1][1] == "factory/a"
+    assert not (tmp_path / "ingest.spill").exists()
@@ -0,0 +1,31 @@
+import io
+import json
+
+import pytest
+import yaml
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+from src.batcher import run_batcher
+from src.query import run_query
+
+
+def test_query_filters_and_sql_over_batches(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")}}))
+    rows = [{"ts": f"2025-08-19T{h:02d}:15:00Z", "device_id": d, "celsius": h + 0.5} for h in (3, 4, 5) for d in ("d1", "d2")]
+    (hot / "telemetry.2025-08-19.jsonl").write_text("".join(json.dumps(r) + "\n" for r in rows))
+    run_batcher(str(cfg))
+
+    out = io.BytesIO()
+    run_query(str(cfg), columns=["ts", "celsius"], device_id="d2", start="2025-08-19T04:00:00Z",
+              end="2025-08-19T06:00:00Z", fmt="jsonl", out=out)
+    got = [json.loads(line) for line in out.getvalue().decode().splitlines()]
+    assert [r["celsius"] for r in got] == [4.5, 5.5]
+
+    out = io.BytesIO()
+    run_query(str(cfg), sql="SELECT hour, count(*) AS n FROM batches GROUP BY hour ORDER BY hour", out=out)
+    assert out.getvalue().decode().splitlines() == ['"hour","n"', '"03",2', '"04",2', '"05",2']
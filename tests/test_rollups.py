@@ -0,0 +1,63 @@
+import json
+import random
+
+import pytest
+import yaml
+
+pytest.importorskip("pyarrow")
+
+from src.batcher import run_batcher
+from src.rollups import read_rollups
+
+
+def test_rollups_merge_across_incremental_parts(tmp_path):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    rollups = tmp_path / "rollups"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({
+        "storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+        "batch": {"rollups": {"enabled": True, "dir": str(rollups), "metrics": ["celsius"]}},
+    }))
+    rng = random.Random(7)
+    values = [rng.gauss(20, 5) for _ in range(4000)]
+    hf = hot / "telemetry.2025-08-19.jsonl"
+    for half in (values[:2000], values[2000:]):  # two runs -> two part files per hour
+        with hf.open("a") as f:
+            for i, v in enumerate(half):
+                f.write(json.dumps({"ts": f"2025-08-19T04:{i % 60:02d}:00Z", "device_id": "d1", "celsius": v}) + "\n")
+        run_batcher(str(cfg))
+
+    [row] = read_rollups(rollups, grain="1h").to_pylist()
+    assert (row["device_id"], row["metric"], row["count"]) == ("d1", "celsius", 4000)
+    assert (row["min"], row["max"]) == (min(values), max(values))
+    assert row["mean"] == pytest.approx(sum(values) / len(values))
+    exact = sorted(values)[int(0.95 * (len(values) - 1))]
+    assert row["p95"] == pytest.approx(exact, rel=0.02)
+
+    minutes = read_rollups(rollups, grain="1m").to_pylist()
+    assert len(minutes) == 60 and sum(r["count"] for r in minutes) == 4000
+
+
+def test_rollups_key_mock_events_by_source(tmp_path, capsys):
+    hot = tmp_path / "hot"
+    hot.mkdir()
+    rollups = tmp_path / "rollups"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({
+        "storage": {"hot_dir": str(hot), "batches_dir": str(tmp_path / "batches")},
+        "batch": {"rollups": {"enabled": True, "dir": str(rollups), "metrics": ["temperature", "vibration"]}},
+    }))
+    with (hot / "telemetry.2025-08-19.jsonl").open("w") as f:  # the shape examples/publish_mock.py publishes
+        for i in range(10):
+            f.write(json.dumps({"ts": f"2025-08-19T04:00:{i:02d}Z", "source": "lineA-press01",
+                                "temperature": 70.0 + i, "vibration": 0.1, "anomaly": False}) + "\n")
+    with (hot / "status.2025-08-19.jsonl").open("w") as f:
+        f.write(json.dumps({"ts": "2025-08-19T04:00:00Z", "status": "ok"}) + "\n")
+    run_batcher(str(cfg))
+
+    rows = {r["metric"]: r for r in read_rollups(rollups, grain="1h").to_pylist()}
+    assert {(m, r["device_id"], r["count"]) for m, r in rows.items()} == {
+        ("temperature", "lineA-press01", 10), ("vibration", "lineA-press01", 10)}
+    assert rows["temperature"]["max"] == 79.0
+    assert "[rollups] skipped status." in capsys.readouterr().out
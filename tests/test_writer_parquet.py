@@ -0,0 +1,32 @@
+import datetime
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from src.writer_parquet import StreamingParquetWriter
+
+
+def test_row_groups_and_hour_finalisation(tmp_path):
+    w = StreamingParquetWriter(tmp_path, row_group_rows=2, close_grace_s=0)
+    recv = datetime.datetime(2025, 8, 19, 4, 30)
+    w.write_many([({"ts": "2025-08-19T04:00:0%dZ" % i, "celsius": 20.0 + i}, recv) for i in range(5)])
+    w.flush_if_due(datetime.datetime(2025, 8, 19, 4, 59))
+    part = tmp_path / "date=2025-08-19" / "hour=04"
+    assert not list(part.glob("*.parquet"))  # still open as *.inprogress
+    w.flush_if_due(datetime.datetime(2025, 8, 19, 5, 0))
+    (out,) = part.glob("*.parquet")
+    md = pq.ParquetFile(out).metadata
+    assert (md.num_rows, md.num_row_groups) == (5, 3)
+    assert not list(part.glob("*.inprogress"))
+
+
+def test_mixed_types_are_split_not_stuck(tmp_path):
+    w = StreamingParquetWriter(tmp_path, row_group_rows=3, close_grace_s=0)
+    recv = datetime.datetime(2025, 8, 19, 4, 30)
+    w.write_many([({"ts": "2025-08-19T04:00:00Z", "v": 1}, recv), ({"ts": "2025-08-19T04:00:01Z", "v": "a"}, recv),
+                  ({"ts": "2025-08-19T04:00:02Z", "v": 2}, recv)])
+    w.write_many([({"ts": "2025-08-19T04:00:03Z", "v": 3}, recv)])  # the buffer was drained
+    w.close()
+    files = sorted((tmp_path / "date=2025-08-19" / "hour=04").glob("*.parquet"))
+    assert sum(pq.read_metadata(f).num_rows for f in files) == 4 and w.rows_dropped == 0
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from common.zstd_frames import ZstdFrameWriter, iter_text_lines, read_index
+
+
+def test_frames_are_indexed_and_time_range_skips_frames(tmp_path):
+    path = tmp_path / "telemetry.2025-08-19.jsonl.zst"
+    with ZstdFrameWriter(path, frame_bytes=1000) as w:
+        for h in range(6):
+            lines = [json.dumps({"ts": f"2025-08-19T{h:02d}:{m:02d}:00Z", "celsius": 20.0}) + "\n" for m in range(60)]
+            w.write("".join(lines).encode("utf-8"))
+    idx = read_index(path)
+    assert len(idx) == 6
+    assert idx[2]["min_ts"] == "2025-08-19T02:00:00Z" and idx[2]["max_ts"] == "2025-08-19T02:59:00Z"
+    assert sum(1 for _ in iter_text_lines(path)) == 360
+    hour3 = [json.loads(s) for s in iter_text_lines(path, start="2025-08-19T03:10:00Z", end="2025-08-19T03:20:00Z")]
+    assert len(hour3) == 60 and all(r["ts"].startswith("2025-08-19T03") for r in hour3)
+
+
+def test_index_bounds_are_chronological_across_offsets(tmp_path):
+    path = tmp_path / "telemetry.2025-08-19.jsonl.zst"
+    stamps = ["2025-08-19T05:30:00+02:00", "2025-08-19T04:00:00Z", "2025-08-19T04:00:00.5+00:00", "bogus"]
+    with ZstdFrameWriter(path) as w:
+        w.write("".join(json.dumps({"ts": t}) + "\n" for t in stamps).encode("utf-8"))
+    (entry,) = read_index(path)
+    assert (entry["min_ts"], entry["max_ts"]) == ("2025-08-19T03:30:00Z", "2025-08-19T04:00:00.500000Z")
+
+
+def test_flush_cuts_a_readable_frame(tmp_path):
+    path = tmp_path / "telemetry.2025-08-19.jsonl.zst"
+    w = ZstdFrameWriter(path, frame_bytes=1 << 20)
+    w.write(b'{"ts":"2025-08-19T04:00:00Z","v":1}\n')
+    w.flush()  # far below frame_bytes: still committed as its own frame
+    assert [e["lines"] for e in read_index(path)] == [1]
+    assert [json.loads(s)["v"] for s in iter_text_lines(path)] == [1]
+    w.flush()  # nothing new: no empty frame
+    w.write(b'{"ts":"2025-08-19T04:00:01Z","v":2}\n')
+    w.close()
+    assert [e["lines"] for e in read_index(path)] == [1, 1]
+    assert [json.loads(s)["v"] for s in iter_text_lines(path)] == [1, 2]
@@ -7,6 +7,13 @@ import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    from common.zstd_frames import iter_text_lines
+except Exception:
+    # running as a script (PYTHONPATH not set): make the repo root (parent of tools/) importable
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from common.zstd_frames import iter_text_lines  # type: ignore
+
 # Optional dependency: jsonschema
 try:
     import jsonschema  # type: ignore
@@ -98,24 +105,28 @@ def validate_one_object(obj, schema):
     return errors
 
 
-def validate_file(schema, path):
+def validate_file(schema, path, start=None, end=None):
+    """Validate each line of a *.jsonl or *.jsonl.zst file.
+
+    For *.jsonl.zst, start/end (ISO-8601) skip frames outside the time range;
+    line numbers are then relative to the frames read.
+    """
     errs = []
-    with open(path, "r", encoding="utf-8") as f:
-        for i, line in enumerate(f, 1):
-            ln = line.strip()
-            if not ln:
-                continue
-            try:
-                obj = json.loads(ln)
-                if HAS_JSONSCHEMA:
-                    jsonschema.validate(instance=obj, schema=schema)  # type: ignore
-                else:
-                    for e in validate_one_object(obj, schema):
-                        errs.append(f"{path}:{i}: {e}")
-            except json.JSONDecodeError as e:
-                errs.append(f"{path}:{i}: invalid JSON ({e})")
-            except Exception as e:
-                errs.append(f"{path}:{i}: schema validation error ({e})")
+    for i, line in enumerate(iter_text_lines(path, start=start, end=end), 1):
+        ln = line.strip()
+        if not ln:
+            continue
+        try:
+            obj = json.loads(ln)
+            if HAS_JSONSCHEMA:
+                jsonschema.validate(instance=obj, schema=schema)  # type: ignore
+            else:
+                for e in validate_one_object(obj, schema):
+                    errs.append(f"{path}:{i}: {e}")
+        except json.JSONDecodeError as e:
+            errs.append(f"{path}:{i}: invalid JSON ({e})")
+        except Exception as e:
+            errs.append(f"{path}:{i}: schema validation error ({e})")
     return errs
 
 
@@ -151,6 +162,8 @@ def main():
     ap.add_argument("--schema", required=True, help="Path to schema JSON file")
     ap.add_argument("--input", required=True, help="Path/Glob with optional {date_str}/{hour_str}")
     ap.add_argument("--strict", action="store_true", help="Disable auto-latest fallback (fail if no match)")
+    ap.add_argument("--start", help="ISO-8601 lower bound; *.jsonl.zst frames ending before it are skipped")
+    ap.add_argument("--end", help="ISO-8601 upper bound; *.jsonl.zst frames starting after it are skipped")
     args = ap.parse_args()
 
     # Load schema
@@ -168,7 +181,7 @@ def main():
 
     all_errs = []
     for fp in files:
-        all_errs.extend(validate_file(schema, fp))
+        all_errs.extend(validate_file(schema, fp, start=args.start, end=args.end))
 
     if all_errs:
         for e in all_errs: